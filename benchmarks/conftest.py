@@ -0,0 +1,47 @@
+import sys
+
+sys.path.insert(0, "../")
+
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from supermark.synthetic import SiteSpec, generate_site
+
+pytest.importorskip("pytest_benchmark")
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("supermark", "synthetic site of the benchmarks")
+    group.addoption("--site-pages", type=int, default=100, help="Number of pages.")
+    group.addoption(
+        "--site-depth", type=int, default=2, help="Number of nested folders."
+    )
+    group.addoption(
+        "--site-chunks", type=int, default=10, help="Number of chunks per page."
+    )
+    group.addoption(
+        "--site-mix", default=None, help="Weights of chunks, like markdown=4,table=1."
+    )
+
+
+@pytest.fixture(scope="session")
+def site(request, tmp_path_factory) -> Path:
+    """The folder of pages of a synthetic site, created once per run."""
+    options = request.config.option
+    spec = SiteSpec(
+        pages=options.site_pages, depth=options.site_depth, chunks=options.site_chunks
+    )
+    if options.site_mix is not None:
+        spec.mix = SiteSpec.parse_mix(options.site_mix)
+    return generate_site(tmp_path_factory.mktemp("site"), spec)
+
+
+@pytest.fixture(scope="session")
+def site_lines(site: Path) -> List[Tuple[Path, List[str]]]:
+    pages: List[Tuple[Path, List[str]]] = []
+    for page in sorted(site.glob("**/*.md")):
+        with open(page, encoding="utf-8") as file:
+            pages.append((page, file.readlines()))
+    return pages
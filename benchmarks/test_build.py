@@ -0,0 +1,45 @@
+from pathlib import Path
+from shutil import rmtree
+
+from supermark import Core, HTMLBuilder, Report
+from supermark.cache import CACHE_FOLDER
+
+
+def _build(site: Path, output_path: Path) -> HTMLBuilder:
+    report = Report()
+    builder = HTMLBuilder(
+        site,
+        output_path,
+        site.parent,
+        site.parent / "templates/page.html",
+        report,
+    )
+    builder.set_core(Core(report=report))
+    builder.build()
+    return builder
+
+
+def _clear(site: Path, output_path: Path) -> None:
+    rmtree(output_path, ignore_errors=True)
+    rmtree(site.parent / CACHE_FOLDER, ignore_errors=True)
+
+
+def test_build_cold(benchmark, site: Path, tmp_path: Path):
+    output_path = tmp_path / "out"
+    builder = benchmark.pedantic(
+        _build,
+        args=(site, output_path),
+        setup=lambda: _clear(site, output_path),
+        rounds=3,
+    )
+    # chunks that repeat on several pages are rendered once
+    assert builder.render_cache.misses > 0
+
+
+def test_build_warm(benchmark, site: Path, tmp_path: Path):
+    # all pages are built again, but their chunks come from the render cache
+    output_path = tmp_path / "out"
+    _clear(site, output_path)
+    _build(site, output_path)
+    builder = benchmark.pedantic(_build, args=(site, output_path), rounds=3)
+    assert builder.render_cache.misses < builder.render_cache.hits
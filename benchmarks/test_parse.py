@@ -0,0 +1,32 @@
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+from supermark import Core, Report
+from supermark.parse import ReferenceCache, parse
+from supermark.chunks import RawChunk
+
+
+def _parse_all(
+    site: Path, site_lines: List[Tuple[Path, List[str]]], references: ReferenceCache
+) -> List[Sequence[RawChunk]]:
+    report = Report()
+    return [parse(lines, page, site, report, references) for page, lines in site_lines]
+
+
+def test_parse(benchmark, site: Path, site_lines: List[Tuple[Path, List[str]]]):
+    # a new cache each time, so that referenced files are parsed as well
+    pages = benchmark(lambda: _parse_all(site, site_lines, ReferenceCache()))
+    assert len(pages) == len(site_lines)
+
+
+def test_cast(benchmark, site: Path, site_lines: List[Tuple[Path, List[str]]]):
+    report = Report()
+    core = Core(report=report)
+    pages = _parse_all(site, site_lines, ReferenceCache())
+    core.load_all_extensions()
+
+    def cast_all():
+        return [core.cast(raw_chunks, report, set()) for raw_chunks in pages]
+
+    chunks = benchmark(cast_all)
+    assert sum(len(page) for page in chunks) > 0
@@ -0,0 +1,42 @@
+from pathlib import Path
+from typing import List, Sequence
+
+import pytest
+
+from supermark import Core, HTMLBuilder, Report
+from supermark.chunks import Chunk
+from supermark.pandoc import ConversionBroker
+from supermark.synthetic import EXTENSIONS_FOLDER
+
+PACKAGES = sorted(
+    {example.parent.name for example in EXTENSIONS_FOLDER.glob("*/example-*.md")}
+)
+
+
+def _render(builder: HTMLBuilder, chunks: Sequence[Chunk], target: Path) -> str:
+    # like the pages of a build, with the Pandoc conversions of all chunks together
+    broker = ConversionBroker()
+    builder.set_broker(broker)
+    try:
+        html: List[str] = []
+        for chunk in chunks:
+            html.append(chunk.to_html(builder, target))
+            html.extend(aside.to_html(builder, target) for aside in chunk.asides)
+    finally:
+        builder.set_broker(None)
+    return broker.resolve("\n".join(filter(None, html)))
+
+
+@pytest.mark.parametrize("package", PACKAGES)
+def test_render_extension(benchmark, tmp_path: Path, package: str):
+    folder = EXTENSIONS_FOLDER / package
+    report = Report()
+    core = Core(report=report)
+    core.load_all_extensions()
+    builder = HTMLBuilder(
+        folder, tmp_path / "out", tmp_path, tmp_path / "page.html", report
+    )
+    builder.set_core(core)
+    chunks = core.parse_examples(core.extension_packages[package], folder, set())
+    html = benchmark(_render, builder, chunks, tmp_path / "out/example.html")
+    assert len(html) > 0
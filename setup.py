@@ -76,7 +76,7 @@ setup(
         "markdown-it-py",
     ],
     package_data={
-        "": ["*.tex", "*.pdf", "*.css", "*.md", "*.js", "*.svg"],
+        "": ["*.tex", "*.pdf", "*.css", "*.md", "*.js", "*.svg", "*.json"],
     },
     include_package_data=True,
     author="Frank Alexander Kraemer",
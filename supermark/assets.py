@@ -0,0 +1,93 @@
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Dict, Iterable, List, Set, Tuple
+
+from .cache import digest, write_atomic
+
+if TYPE_CHECKING:
+    from .base import Extension
+
+
+class ExtensionAssets:
+    """The CSS and JavaScript files of extensions, read once and kept in memory.
+
+    Several extensions can share a folder, and their assets are those of the
+    folder. `clear` forgets everything, so that a new build sees changes.
+    """
+
+    def __init__(self) -> None:
+        # folder -> (files, css, js)
+        self.folders: Dict[Path, Tuple[List[Path], str, str]] = {}
+        self.lock = Lock()
+
+    def clear(self) -> None:
+        with self.lock:
+            self.folders = {}
+
+    def _get(self, extension: "Extension") -> Tuple[List[Path], str, str]:
+        with self.lock:
+            if extension.folder in self.folders:
+                return self.folders[extension.folder]
+        css_files = extension._find_files("*.css")
+        js_files = extension._find_files("*.js")
+        assets = (
+            css_files + js_files,
+            extension.files_to_string(css_files),
+            extension.files_to_string(js_files),
+        )
+        with self.lock:
+            self.folders[extension.folder] = assets
+        return assets
+
+    def _get_all(self, extensions: Iterable["Extension"]) -> List[Tuple[str, str]]:
+        """Returns css and js of the extensions, once per folder, ordered by folder."""
+        assets: List[Tuple[str, str]] = []
+        folders: Set[str] = set()
+        for extension in sorted(list(extensions), key=lambda e: e.folder):
+            if extension.folder.name not in folders:
+                folders.add(extension.folder.name)
+                _, css, js = self._get(extension)
+                assets.append((extension.folder.name, css, js))
+        return assets
+
+    def get_css(self, extensions: Iterable["Extension"]) -> str:
+        all_css: str = ""
+        for name, css, _ in self._get_all(extensions):
+            if css:
+                all_css += f"/* === {name} === */\n"
+                all_css += css + "\n\n"
+        return all_css
+
+    def get_js(self, extensions: Iterable["Extension"]) -> str:
+        return "".join(js + "\n" for _, _, js in self._get_all(extensions))
+
+    def get_files(self, extensions: Iterable["Extension"]) -> Set[Path]:
+        files: Set[Path] = set()
+        for extension in extensions:
+            files.update(self._get(extension)[0])
+        return files
+
+
+class AssetBundler:
+    """Writes CSS and JavaScript into files named by the hash of their content.
+
+    Each distinct combination of extensions gets one file per type, which
+    browsers cache across all pages that use the same extensions.
+    """
+
+    def __init__(self, output_path: Path) -> None:
+        self.output_path = output_path
+        self.written: Set[str] = set()
+        self.lock = Lock()
+
+    def get_bundle(self, content: str, suffix: str) -> str:
+        """Returns the name of the file with the content, relative to the output folder."""
+        name = f"supermark.{digest(content)[:16]}{suffix}"
+        with self.lock:
+            if name in self.written:
+                return name
+            self.written.add(name)
+        target = self.output_path / name
+        if not target.exists():
+            write_atomic(content, target)
+        return name
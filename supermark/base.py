@@ -1,6 +1,6 @@
 from abc import abstractmethod
 from pathlib import Path
-from typing import TYPE_CHECKING, Optional, Sequence, List
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence
 
 from .write_html import HTMLTable
 
@@ -13,6 +13,24 @@ class ExtensionPoint:
 
     def __init__(self, name: str):
         self.name = name
+        self.extensions: Dict[str, "Extension"] = {}
+        # names of extensions that are not imported yet -> their module
+        self.lazy_extensions: Dict[str, str] = {}
+        self.loader: Optional[Callable[[str], None]] = None
+
+    def add_lazy_extension(self, name: str, module: str) -> None:
+        self.lazy_extensions[name] = module
+
+    def _load(self, name: str) -> None:
+        """Imports the module of an extension when it is first needed."""
+        module = self.lazy_extensions.get(name)
+        if module is not None and self.loader is not None:
+            self.loader(module)
+
+    def get_extension(self, name: str) -> Optional["Extension"]:
+        if name not in self.extensions:
+            self._load(name)
+        return self.extensions.get(name)
 
 
 class Extension:
@@ -0,0 +1,333 @@
+import inspect
+import json
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from shutil import copyfile
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from rich import print
+from rich.table import Table
+
+from .base import ExtensionPackage
+from .cache import write_atomic
+from .chunks import Chunk
+from .pandoc import ConversionBroker
+from .report import Report
+
+if TYPE_CHECKING:
+    from .build_html import HTMLBuilder
+    from .core import Core
+
+# statistics of pytest-benchmark that results can be compared by
+METRICS = ["min", "median", "mean"]
+
+# methods of chunks that the extension benchmarks measure
+METHODS = ["to_html", "to_latex"]
+
+
+def load_results(path: Path, metric: str = "median") -> Dict[str, float]:
+    """Reads the results of a run of pytest-benchmark, stored with `--benchmark-json`.
+
+    Returns the seconds of each benchmark, by its full name.
+    """
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    return {
+        benchmark.get("fullname", benchmark["name"]): float(benchmark["stats"][metric])
+        for benchmark in data["benchmarks"]
+    }
+
+
+@dataclass
+class Comparison:
+    name: str
+    old: float
+    new: float
+
+    def get_change(self) -> float:
+        """Change of the time in percent, positive when the new run is slower."""
+        if self.old == 0:
+            return 0.0
+        return 100 * (self.new - self.old) / self.old
+
+    def is_regression(self, threshold: float) -> bool:
+        return self.get_change() > threshold
+
+
+def compare_results(
+    old_path: Path, new_path: Path, metric: str = "median"
+) -> List[Comparison]:
+    """Compares the benchmarks that are in both results, by their name."""
+    old = load_results(old_path, metric)
+    new = load_results(new_path, metric)
+    return [Comparison(name, old[name], new[name]) for name in old if name in new]
+
+
+def print_comparisons(comparisons: List[Comparison], threshold: float) -> None:
+    table = Table(title="Benchmarks", title_justify="left")
+    table.add_column("Benchmark")
+    table.add_column("Old ms", justify="right")
+    table.add_column("New ms", justify="right")
+    table.add_column("Change", justify="right")
+    for comparison in comparisons:
+        change = f"{comparison.get_change():+.1f}%"
+        if comparison.is_regression(threshold):
+            change = f"[red]{change} regression[/red]"
+        elif comparison.get_change() < -threshold:
+            change = f"[green]{change}[/green]"
+        table.add_row(
+            comparison.name,
+            f"{1000 * comparison.old:.3f}",
+            f"{1000 * comparison.new:.3f}",
+            change,
+        )
+    print(table)
+
+
+def has_to_latex(chunk: Chunk) -> bool:
+    return type(chunk).to_latex is not Chunk.to_latex
+
+
+def _to_latex(chunk: Chunk, builder: "HTMLBuilder", target_file_path: Path) -> Any:
+    # some extensions implement to_latex without the target file
+    if len(inspect.signature(chunk.to_latex).parameters) == 1:
+        return chunk.to_latex(builder)  # type: ignore
+    return chunk.to_latex(builder, target_file_path)
+
+
+@dataclass
+class ExtensionResult:
+    package: str
+    extension: str
+    method: str
+    chunks: int
+    # how often all chunks were rendered, and how long that took
+    rounds: int
+    seconds: float
+    # bytes allocated at most while rendering all chunks once
+    peak: int
+    # memory blocks allocated and not freed while rendering all chunks once
+    blocks: int
+
+    def get_name(self) -> str:
+        return f"{self.package}:{self.extension}:{self.method}"
+
+    def is_measured(self) -> bool:
+        """False if no chunks were rendered or no time was measured."""
+        return self.chunks > 0 and self.rounds > 0 and self.seconds > 0
+
+    def get_ops(self) -> Optional[float]:
+        """Chunks rendered per second."""
+        if not self.is_measured():
+            return None
+        return self.rounds * self.chunks / self.seconds
+
+    def get_us_per_chunk(self) -> Optional[float]:
+        if not self.is_measured():
+            return None
+        return 1e6 * self.seconds / (self.rounds * self.chunks)
+
+    def to_benchmark(self) -> Dict[str, Any]:
+        """An entry in the format of pytest-benchmark, so that `compare` works on it.
+
+        Only for measured results.
+        """
+        seconds = self.seconds / (self.rounds * self.chunks)
+        return {
+            "name": self.get_name(),
+            "fullname": self.get_name(),
+            "stats": {
+                "min": seconds,
+                "median": seconds,
+                "mean": seconds,
+                "ops": self.get_ops(),
+                "rounds": self.rounds,
+            },
+            "extra_info": {
+                "chunks": self.chunks,
+                "peak_per_chunk": self.peak / self.chunks,
+                "blocks_per_chunk": self.blocks / self.chunks,
+            },
+        }
+
+
+class ExtensionBench:
+    """Renders the examples of each extension in a loop, to see what its chunks cost.
+
+    The example-*.md files of an extension package are copied into the
+    input folder of the builder. Their chunks are grouped by the extension
+    they belong to, and rendered together with their asides until
+    `min_time` has passed. Pandoc conversions for HTML are only
+    requested, as in a build, where they run together once per page, so
+    that the numbers show the work of the extension itself. `to_latex` is
+    measured for extensions that implement it, and includes Pandoc. One
+    more round runs with tracemalloc, which slows it down too much to
+    time it.
+    """
+
+    def __init__(
+        self,
+        core: "Core",
+        builder: "HTMLBuilder",
+        report: Report,
+        min_time: float = 0.2,
+    ) -> None:
+        self.core = core
+        self.builder = builder
+        self.report = report
+        self.min_time = min_time
+
+    def _group_chunks(
+        self, package: ExtensionPackage, names: Sequence[str]
+    ) -> Dict[str, List[Chunk]]:
+        # copies, since some extensions write files next to the pages
+        folder = self.builder.input_path / package.folder.name
+        folder.mkdir(parents=True, exist_ok=True)
+        for example in package.get_examples():
+            copyfile(example, folder / example.name)
+        groups: Dict[str, List[Chunk]] = {}
+        for chunk in self.core.parse_examples(ExtensionPackage(folder), folder, set()):
+            extension = chunk.get_extension()
+            if extension is None:
+                continue
+            name = extension.get_name()
+            if len(names) == 0 or package.folder.name in names or name in names:
+                groups.setdefault(name, []).append(chunk)
+        return groups
+
+    def _render(self, chunks: Sequence[Chunk], method: str, target: Path) -> None:
+        # the conversions are not resolved, a page would do that once for all
+        self.builder.set_broker(ConversionBroker())
+        try:
+            for chunk in chunks:
+                if method == "to_html":
+                    chunk.to_html(self.builder, target)
+                    for aside in chunk.asides:
+                        aside.to_html(self.builder, target)
+                else:
+                    _to_latex(chunk, self.builder, target)
+        finally:
+            self.builder.set_broker(None)
+
+    def _measure(self, render: Callable[[], None]) -> Tuple[int, float, int, int]:
+        # icons and the like are loaded on first use
+        render()
+        rounds = 0
+        start = perf_counter()
+        while True:
+            render()
+            rounds += 1
+            seconds = perf_counter() - start
+            if seconds >= self.min_time:
+                break
+        tracemalloc.start()
+        try:
+            before = tracemalloc.take_snapshot()
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            render()
+            _, peak = tracemalloc.get_traced_memory()
+            after = tracemalloc.take_snapshot()
+        finally:
+            tracemalloc.stop()
+        # without the memory of the first snapshot
+        own = [tracemalloc.Filter(False, tracemalloc.__file__)]
+        blocks = sum(
+            stat.count_diff
+            for stat in after.filter_traces(own).compare_to(
+                before.filter_traces(own), "lineno"
+            )
+        )
+        return rounds, seconds, peak - current, blocks
+
+    def run(self, names: Sequence[str] = ()) -> List[ExtensionResult]:
+        """Measures the extensions with the given names or packages, or all."""
+        self.core.load_all_extensions()
+        results: List[ExtensionResult] = []
+        for package in sorted(
+            self.core.extension_packages.values(), key=lambda p: p.folder.name
+        ):
+            if len(names) > 0 and not (
+                package.folder.name in names
+                or any(e.get_name() in names for e in package.extensions)
+            ):
+                continue
+            target = self.builder.output_path / package.folder.name / "example.html"
+            for name, chunks in sorted(self._group_chunks(package, names).items()):
+                for method in METHODS:
+                    if method == "to_latex":
+                        chunks = [chunk for chunk in chunks if has_to_latex(chunk)]
+                        if len(chunks) == 0:
+                            continue
+                    try:
+                        rounds, seconds, peak, blocks = self._measure(
+                            lambda: self._render(chunks, method, target)
+                        )
+                    except Exception as e:
+                        self.report.warning(
+                            f"Could not measure {method} of {name} in {package.folder.name}. ({e})"
+                        )
+                        continue
+                    results.append(
+                        ExtensionResult(
+                            package.folder.name,
+                            name,
+                            method,
+                            len(chunks),
+                            rounds,
+                            seconds,
+                            peak,
+                            blocks,
+                        )
+                    )
+        return results
+
+
+def print_extension_results(results: Sequence[ExtensionResult]) -> None:
+    table = Table(title="Extensions", title_justify="left")
+    table.add_column("Package")
+    table.add_column("Extension")
+    table.add_column("Method")
+    table.add_column("Chunks", justify="right")
+    table.add_column("Ops/s", justify="right")
+    table.add_column("µs/chunk", justify="right")
+    table.add_column("Peak KiB/chunk", justify="right")
+    table.add_column("Blocks/chunk", justify="right")
+    for result in results:
+        if not result.is_measured():
+            table.add_row(
+                result.package,
+                result.extension,
+                result.method,
+                str(result.chunks),
+                *(["n/a"] * 4),
+            )
+            continue
+        table.add_row(
+            result.package,
+            result.extension,
+            result.method,
+            str(result.chunks),
+            f"{result.get_ops():.0f}",
+            f"{result.get_us_per_chunk():.1f}",
+            f"{result.peak / result.chunks / 1024:.1f}",
+            f"{result.blocks / result.chunks:.0f}",
+        )
+    print(table)
+
+
+def save_extension_results(results: Sequence[ExtensionResult], path: Path) -> None:
+    write_atomic(
+        json.dumps(
+            {
+                "benchmarks": [
+                    result.to_benchmark() for result in results if result.is_measured()
+                ]
+            },
+            indent=1,
+        )
+        + "\n",
+        path,
+    )
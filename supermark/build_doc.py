@@ -52,6 +52,7 @@ class DocBuilder(Builder):
     ) -> None:
         self.target_folder.mkdir(exist_ok=True)
         self.copy_docs()
+        self.core.load_all_extensions()
         # extensions_used = self.find_used_extensions()
 
         # Overview page
@@ -125,13 +126,7 @@ class DocBuilder(Builder):
         self,
         extension: Extension,
     ) -> Sequence[Chunk]:
-        example_chunks: List[Chunk] = []
-        for example in extension.get_examples():
-            chunks = self.core.parse_file(example, input_path=self.input_path)
-            if chunks is not None:
-                for c in chunks:
-                    example_chunks.append(c)
-        return example_chunks
+        return self.core.parse_examples(extension, self.input_path)
 
     def _build_example(
         self, extension: Extension, example: Path, index: int, md: List[str]
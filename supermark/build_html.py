@@ -1,19 +1,43 @@
-from concurrent.futures import ThreadPoolExecutor
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Sequence, Set, TYPE_CHECKING
-from shutil import copyfile
+from time import time_ns
+from typing import (
+    Any,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    TYPE_CHECKING,
+)
 
+from rich import print
 from rich.progress import BarColumn, Progress
 
+from .assets import AssetBundler
 from .breadcrumbs import Breadcrumbs
+from .cache import CACHE_FOLDER, RenderCache
+from .depgraph import DependencyGraph
+from .dimensions import DimensionIndex
+from .icons import use_sprites
+from .images import ImageIndex
+from .links import LinkIndex
+from .sync import ResourceSync, SyncSettings
+from .variants import ImagePipeline, ImageSettings
+from .build_worker import PageJob, PageResult, WorkerSetup, init_worker, process_page
 from .chunks import Builder, Chunk, MarkdownChunk, YAMLDataChunk
-from .pagemap import Folder
+from .pagemap import Folder, find_title
+from .pandoc import ConversionBroker
 from .report import Report
 from .utils import add_notnone, get_relative_path, reverse_path, write_file
 from .write_html import div, main_and_aside
 
 if TYPE_CHECKING:
     from .base import Extension
+    from .core import Core
 
 
 class HTMLBuilder(Builder):
@@ -28,6 +52,12 @@ class HTMLBuilder(Builder):
         abort_draft: bool = True,
         verbose: bool = False,
         reformat: bool = False,
+        jobs: Optional[int] = None,
+        executor: str = "thread",
+        use_cache: bool = True,
+        explain: bool = False,
+        profile: bool = False,
+        trace: bool = False,
     ) -> None:
         super().__init__(
             input_path,
@@ -40,13 +70,39 @@ class HTMLBuilder(Builder):
             verbose,
             reformat,
         )
-        breadcrumbs_path = input_path / Path("breadcrumbs.txt")
+        self.jobs = jobs
+        self.executor = executor
+        self.profile.enabled = profile
+        self.profile.tracing = trace
+        self.use_cache = use_cache
+        self.render_cache: Optional[RenderCache] = None
+        self.explain = explain
+        # icons as references to a sheet of symbols on each page, see [icons]
+        self.icon_sprites = False
+        # titles of the pages parsed in this build, for the page map
+        self.page_titles: Dict[Path, Optional[str]] = {}
+        self.dependency_graph = DependencyGraph(
+            self.base_path / CACHE_FOLDER / "deps.json"
+        )
+        self.link_index = LinkIndex(self.base_path / CACHE_FOLDER / "links.json")
+        self.resource_sync: Optional[ResourceSync] = None
+        self.bundler = AssetBundler(self.output_path)
+        self.dimension_index = DimensionIndex(
+            self.base_path / CACHE_FOLDER / "dimensions.json"
+        )
+        self.image_index = ImageIndex(
+            self.input_path, self.base_path / CACHE_FOLDER / "images.json"
+        )
+        self.load_breadcrumbs()
+
+    def load_breadcrumbs(self) -> None:
+        breadcrumbs_path = self.input_path / Path("breadcrumbs.txt")
         if breadcrumbs_path.exists():
             self.breadcrumbs: Breadcrumbs = Breadcrumbs(self.report, breadcrumbs_path)
             self.report.info(f"Breadcrumbs exist in {breadcrumbs_path}")
         else:
             # old format
-            breadcrumbs_path = input_path / Path("breadcrumbs.yaml")
+            breadcrumbs_path = self.input_path / Path("breadcrumbs.yaml")
             if breadcrumbs_path.exists():
                 self.breadcrumbs: Breadcrumbs = Breadcrumbs(
                     self.report, breadcrumbs_path
@@ -58,6 +114,77 @@ class HTMLBuilder(Builder):
                 )
                 self.breadcrumbs: Breadcrumbs = Breadcrumbs(self.report, None)
 
+    def set_report(self, report: Report) -> None:
+        """Replaces the report, to keep the builder and its core for another build."""
+        self.report = report
+        self.breadcrumbs.report = report
+        self.core.report = report
+        self.core.url_checker.report = report
+
+    def set_core(self, core: "Core") -> None:
+        super().set_core(core)
+        if self.use_cache:
+            self.render_cache = RenderCache(self.base_path / CACHE_FOLDER, core)
+        icon_settings = core.config.get("icons")
+        if isinstance(icon_settings, dict):
+            self.icon_sprites = bool(icon_settings.get("sprites", False))
+        settings = ImageSettings.from_config(core.config, self.report)
+        if settings.responsive:
+            if ImagePipeline.is_available():
+                self.image_pipeline = ImagePipeline(
+                    self.base_path / CACHE_FOLDER, settings
+                )
+            else:
+                self.report.info("Install Pillow to create responsive images.")
+
+    def _chunk_to_html(
+        self,
+        chunk: Chunk,
+        target_file_path: Path,
+        to_cache: List[Tuple[str, str]],
+    ) -> str:
+        if not self.profile.is_active():
+            return self._render_chunk(chunk, target_file_path, to_cache)
+        start = time_ns()
+        html = self._render_chunk(chunk, target_file_path, to_cache)
+        end = time_ns()
+        seconds = (end - start) / 1e9
+        self.profile.add("steps", "render", seconds)
+        self.profile.add("chunk_types", chunk.get_chunk_type(), seconds)
+        extension = chunk.get_extension()
+        if extension is not None:
+            self.profile.add("extensions", extension.get_name(), seconds)
+        self.profile.add_span(
+            chunk.get_chunk_type(),
+            "chunk",
+            start,
+            end,
+            {"line": chunk.raw_chunk.start_line_number},
+        )
+        return html
+
+    def _render_chunk(
+        self,
+        chunk: Chunk,
+        target_file_path: Path,
+        to_cache: List[Tuple[str, str]],
+    ) -> str:
+        if self.render_cache is None:
+            return chunk.to_html(self, target_file_path)
+        key = self.render_cache.get_key(chunk)
+        if key is None:
+            return chunk.to_html(self, target_file_path)
+        html = self.render_cache.get(key)
+        if html is None:
+            messages = chunk.raw_chunk.messages
+            html = chunk.to_html(self, target_file_path)
+            # chunks that report something are not cached, so that their
+            # messages show up again in the next build
+            if html is not None and chunk.raw_chunk.messages == messages:
+                # stored once the conversions of the page are resolved
+                to_cache.append((key, html))
+        return html
+
     def _transform_page_to_html(
         self,
         chunks: Sequence[Chunk],
@@ -69,19 +196,49 @@ class HTMLBuilder(Builder):
         js: str,
     ) -> str:
         for tag in ["content", "css", "js", "rel_path"]:
-            if "{" + tag + "}" not in template:
+            if (
+                "{" + tag + "}" not in template
+                and "{" + tag + "_bundle}" not in template
+            ):
                 self.report.warning(
                     "The template does not contain insertion tag {" + tag + "}"
                 )
+        content = self._main_html_stream_new(chunks, source_file_path, target_file_path)
+        with self.profile.measure("template"):
+            return self._fill_template(
+                template, content, source_file_path, report, css, js
+            )
+
+    def _fill_template(
+        self,
+        template: str,
+        content: str,
+        source_file_path: Path,
+        report: Report,
+        css: str,
+        js: str,
+    ) -> str:
+        rel_path = reverse_path(self.input_path, source_file_path)
+        css_bundle = ""
+        js_bundle = ""
+        # templates that refer to bundles get the assets as files, not inline
+        if "{css_bundle}" in template:
+            css_bundle = rel_path + self.bundler.get_bundle(css, ".css")
+            css = ""
+        if "{js_bundle}" in template:
+            js_bundle = rel_path + self.bundler.get_bundle(js, ".js")
+            js = ""
+        if self.icon_sprites:
+            content = use_sprites(content)
         try:
             return template.format_map(
                 {
-                    "content": self._main_html_stream_new(
-                        chunks, source_file_path, target_file_path
-                    ),
+                    "content": content,
                     "css": css,
                     "js": js,
-                    "rel_path": reverse_path(self.input_path, source_file_path),
+                    "css_bundle": css_bundle,
+                    "js_bundle": js_bundle,
+                    "rel_path": rel_path,
                     "page_source": source_file_path.relative_to(self.input_path),
                 }
             )
@@ -181,45 +338,119 @@ class HTMLBuilder(Builder):
         target_file_path: Path,
     ) -> str:
         content: List[str] = []
+        to_cache: List[Tuple[str, str]] = []
+        # chunks request their Pandoc conversions from the broker, which
+        # converts them all together once the page is complete
+        broker = ConversionBroker(self.profile)
+        self.set_broker(broker)
+        try:
+            margin_top = "mt-5"
+            if self.breadcrumbs.has_breadcrumbs(source_file_path):
+                content.append(self.breadcrumbs.get_html(source_file_path, self))
+                margin_top = "mt-2"
 
-        margin_top = "mt-5"
-        if self.breadcrumbs.has_breadcrumbs(source_file_path):
-            content.append(self.breadcrumbs.get_html(source_file_path, self))
-            margin_top = "mt-2"
-
-        sections = self._group_chunks_into_sections(chunks)
-        for section in sections:
-            content.append(f'<section class="{margin_top} mb-5 py-3">')
-            for chunk in section:
-                content.append(
-                    main_and_aside(
-                        chunk.to_html(self, target_file_path),
-                        [
-                            aside.to_html(self, target_file_path)
-                            for aside in chunk.asides
-                        ],
+            sections = self._group_chunks_into_sections(chunks)
+            for section in sections:
+                content.append(f'<section class="{margin_top} mb-5 py-3">')
+                for chunk in section:
+                    content.append(
+                        main_and_aside(
+                            self._chunk_to_html(chunk, target_file_path, to_cache),
+                            [
+                                self._chunk_to_html(aside, target_file_path, to_cache)
+                                for aside in chunk.asides
+                            ],
+                        )
                     )
-                )
-            content.append("</section>")
-        return "\n".join(content)
+                content.append("</section>")
+        finally:
+            self.set_broker(None)
+        html = broker.resolve("\n".join(content))
+        if self.render_cache is not None:
+            for key, chunk_html in to_cache:
+                self.render_cache.put(key, broker.resolve(chunk_html))
+        return html
+
+    def get_page_name(self, source_file_path: Path) -> str:
+        """The name of a page in local links, like `sub/page.html`."""
+        return str(source_file_path.relative_to(self.input_path).with_suffix(".html"))
+
+    def _display_path(self, path: Path) -> str:
+        try:
+            return str(path.relative_to(self.base_path))
+        except ValueError:
+            return str(path)
+
+    def _get_rebuild_reason(
+        self, source_file_path: Path, target_file_path: Path
+    ) -> Optional[str]:
+        """Returns why a page needs to be built, or None if it is up to date."""
+        if self.rebuild_all_pages:
+            return "all pages are rebuilt"
+        if not target_file_path.is_file():
+            return "output does not exist"
+        changed = self.dependency_graph.get_changed(source_file_path)
+        if changed is None:
+            return "no dependencies recorded"
+        if len(changed) > 0:
+            return "changed " + ", ".join(self._display_path(p) for p in changed)
+        return None
+
+    def _collect_dependencies(
+        self,
+        source_file_path: Path,
+        chunks: Sequence[Chunk],
+        extensions_used: Set["Extension"],
+    ) -> Set[Path]:
+        dependencies: Set[Path] = {source_file_path}
+        if isinstance(self.template_file, Path):
+            dependencies.add(self.template_file)
+        if self.core.config.file is not None:
+            dependencies.add(self.core.config.file)
+        if self.breadcrumbs.path is not None:
+            dependencies.add(self.breadcrumbs.path)
+        for chunk in chunks:
+            dependencies |= chunk.get_dependencies()
+        dependencies |= self.core.assets.get_files(extensions_used)
+        return dependencies
 
-    def _create_target(
+    def _render_file(
         self,
         source_file_path: Path,
         target_file_path: Path,
-        template_file_path: Path,
-        overwrite: bool,
-    ) -> bool:
-        if not target_file_path.is_file():
-            return True
-        if overwrite:
-            return True
-        if not template_file_path.is_file():
-            return target_file_path.stat().st_mtime < source_file_path.stat().st_mtime
-        else:
-            return (
-                target_file_path.stat().st_mtime < source_file_path.stat().st_mtime
-            ) or (target_file_path.stat().st_mtime < template_file_path.stat().st_mtime)
+        input_path: Path,
+        template: str,
+        extensions_used: Set["Extension"],
+        dependencies: Set[Path],
+    ) -> Optional[str]:
+        start = time_ns()
+        try:
+            # files included via ref: are added to the dependencies
+            chunks = self.parse_file(
+                source_file_path, input_path, extensions_used, dependencies
+            )
+            if chunks is not None:
+                dependencies |= self._collect_dependencies(
+                    source_file_path, chunks, extensions_used
+                )
+                self.page_titles[source_file_path] = find_title(chunks)
+            if not chunks:
+                # TODO warn that the page is empty, and therefore nothing is written
+                return None
+            return self._transform_page_to_html(
+                chunks,
+                template,
+                source_file_path,
+                target_file_path,
+                self.report,
+                self.core.get_css(extensions_used),
+                self.core.get_js(extensions_used),
+            )
+        finally:
+            end = time_ns()
+            page = self.get_page_name(source_file_path)
+            self.profile.add("pages", page, (end - start) / 1e9)
+            self.profile.add_span(page, "page", start, end)
 
     def _process_file(
         self,
@@ -229,23 +460,73 @@ class HTMLBuilder(Builder):
         template: str,
     ):
         extensions_used: Set[Extension] = set()
-        chunks = self.parse_file(source_file_path, input_path, extensions_used)
-        if not chunks:
-            # TODO warn that the page is empty, and therefore nothing is written
-            return
-
-        html = self._transform_page_to_html(
-            chunks,
-            template,
+        dependencies: Set[Path] = set()
+        html = self._render_file(
             source_file_path,
             target_file_path,
-            self.report,
-            self.core.get_css(extensions_used),
-            self.core.get_js(extensions_used),
+            input_path,
+            template,
+            extensions_used,
+            dependencies,
         )
-        write_file(html, target_file_path, self.report)
+        self.dependency_graph.record(source_file_path, dependencies)
+        if html is None:
+            return
+        self.link_index.add_page(self.get_page_name(source_file_path), html)
+        with self.profile.measure("write"):
+            write_file(html, target_file_path, self.report)
         self.report.info("Translated", path=target_file_path)
 
+    def _merge_page_result(self, result: PageResult) -> None:
+        """Takes over the outcome of a page built in a worker process."""
+        for entry in result.report_entries:
+            self.report.add_entry(entry)
+        for chunk_type, count in result.chunk_counts.items():
+            self.chunk_counts[chunk_type] = self.chunk_counts.get(chunk_type, 0) + count
+        for name in result.extensions_used:
+            extension = self.core.get_extension(name)
+            if extension is not None:
+                self.extensions_used.add(extension)
+        for url, locations in result.urls.items():
+            self.core.url_checker.add_locations(url, locations)
+        self.dependency_graph.record(result.source_file_path, result.dependencies)
+        self.page_titles.update(result.titles)
+        self.profile.merge(result.profile)
+        self.profile.add_events(result.trace)
+        if self.image_pipeline is not None:
+            for job in result.image_jobs:
+                self.image_pipeline.add_job(job)
+        if result.html is None:
+            return
+        self.link_index.add_page(
+            self.get_page_name(result.source_file_path), result.html
+        )
+        with self.profile.measure("write"):
+            write_file(result.html, result.target_file_path, self.report)
+        self.report.info("Translated", path=result.target_file_path)
+
+    def _create_executor(self, template: str) -> Executor:
+        if self.executor == "process":
+            self.report.info("Using process pool.")
+            setup = WorkerSetup(
+                self.input_path,
+                self.output_path,
+                self.base_path,
+                self.template_file,
+                template,
+                self.abort_draft,
+                self.verbose,
+                self.reformat,
+                self.use_cache,
+                self.profile.enabled,
+                self.profile.tracing,
+            )
+            return ProcessPoolExecutor(
+                max_workers=self.jobs, initializer=init_worker, initargs=(setup,)
+            )
+        self.report.info("Using threadpool.")
+        return ThreadPoolExecutor(max_workers=self.jobs)
+
     def _default_html_template(self) -> str:
         html: List[str] = []
         html.append('<head><title></title><style type="text/css">{css}</style></head>')
@@ -280,7 +561,14 @@ class HTMLBuilder(Builder):
 
     def build(
         self,
+        only: Optional[Set[Path]] = None,
     ) -> None:
+        """Builds all pages that changed. With `only`, just these pages are considered."""
+        with self.profile.span("build", "build"):
+            self._build(only)
+
+    def _build(self, only: Optional[Set[Path]]) -> None:
+        start = time_ns()
         template = self._load_html_template(self.template_file, self.report)
         jobs: List[Dict[str, Any]] = []
         files = list(
@@ -288,15 +576,28 @@ class HTMLBuilder(Builder):
                 "**/*.md",
             )
         )
+        self.link_index.set_pages(self.get_page_name(file) for file in files)
+        if only is not None:
+            files = [file for file in files if file in only]
         self.output_path.mkdir(exist_ok=True, parents=True)
+        self.dependency_graph.reset_hashes()
+        # extensions may have changed since the last build, when watching
+        self.core.assets.clear()
+        self.bundler = AssetBundler(self.output_path)
+        scanned, total = self.image_index.update()
+        self.report.info(
+            f"Updated the image index, listed {scanned} of {total} folders."
+        )
+        # worker processes load the index from disk
+        self.image_index.save()
         for source_file_path in files:
             target_file_path = self.get_target_file(source_file_path)
-            if self._create_target(
-                source_file_path,
-                target_file_path,
-                self.template_file,
-                self.rebuild_all_pages,
-            ):
+            reason = self._get_rebuild_reason(source_file_path, target_file_path)
+            if reason is not None:
+                if self.explain:
+                    print(
+                        f"[bold]{self._display_path(source_file_path)}[/bold]: {reason}"
+                    )
                 target_file_path.parent.mkdir(exist_ok=True, parents=True)
                 jobs.append(
                     {
@@ -307,6 +608,9 @@ class HTMLBuilder(Builder):
                         "abort_draft": self.abort_draft,
                     }
                 )
+        end = time_ns()
+        self.profile.add("steps", "scan", (end - start) / 1e9)
+        self.profile.add_span("scan", "step", start, end)
         if len(files) == 0:
             self.report.conclude(
                 "No source files (*.md) detected. Searched in {}".format(
@@ -330,8 +634,7 @@ class HTMLBuilder(Builder):
                     jobs[0]["template"],
                 )
         else:
-            with ThreadPoolExecutor() as e:
-                self.report.info("Using threadpool.")
+            with self._create_executor(template) as e:
                 with Progress(
                     "[progress.description]{task.description}",
                     BarColumn(),
@@ -344,23 +647,41 @@ class HTMLBuilder(Builder):
                     )
                     futures = []
                     for job in jobs:
-                        future = e.submit(
-                            self._process_file,
-                            job["source_file_path"],
-                            job["target_file_path"],
-                            job["input_path"],
-                            job["template"],
-                        )
+                        if self.executor == "process":
+                            future = e.submit(
+                                process_page,
+                                PageJob(
+                                    job["source_file_path"], job["target_file_path"]
+                                ),
+                            )
+                        else:
+                            future = e.submit(
+                                self._process_file,
+                                job["source_file_path"],
+                                job["target_file_path"],
+                                job["input_path"],
+                                job["template"],
+                            )
                         future.add_done_callback(
                             lambda p: progress.update(task, advance=1.0)
                         )
                         futures.append(future)
                     for future in futures:
-                        future.result()
+                        result = future.result()
+                        if self.executor == "process":
+                            self._merge_page_result(result)
+        if self.image_pipeline is not None:
+            with self.profile.measure("images"):
+                copied = self.image_pipeline.finish(self.report)
+            if copied > 0:
+                self.report.info(f"Copied {copied} image variants.")
+        if only is None:
+            self.dependency_graph.prune(files)
+        self.dependency_graph.save()
+        self.link_index.save()
+        self.dimension_index.save()
 
     def _eligible_for_copy(self, file: Path) -> bool:
-        if file.is_dir():
-            return False
         if file.suffix in [".md"]:
             return False
         if file.name in ["breadcrumbs.txt", "breadcrumbs.yaml"]:
@@ -373,18 +694,35 @@ class HTMLBuilder(Builder):
             return False
         return True
 
+    def _find_resources(self, folder: Path) -> Iterator[Tuple[str, os.stat_result]]:
+        with os.scandir(folder) as entries:
+            for entry in entries:
+                path = Path(entry.path)
+                if entry.is_dir():
+                    yield from self._find_resources(path)
+                elif self._eligible_for_copy(path):
+                    yield path.relative_to(self.input_path).as_posix(), entry.stat()
+
     def copy_resources(self) -> None:
+        with self.profile.measure("resources"):
+            self._copy_resources()
+
+    def _copy_resources(self) -> None:
         self.report.info("Copying resources.")
-        for file in self.input_path.glob("**/*"):
-            if self._eligible_for_copy(file):
-                # print(file)
-                target = self.output_path / file.relative_to(self.input_path)
-                # print("  to " + target.as_posix())
-                copyfile(file, target)
-                #target = self.output_path / file.relative_to(self.input_path)
-                #target.parent.mkdir(exist_ok=True, parents=True)
-                #file.replace(target)
-                #self.report.info("Copied", path=target)
+        if self.resource_sync is None:
+            self.resource_sync = ResourceSync(
+                self.input_path,
+                self.output_path,
+                self.base_path / CACHE_FOLDER / "resources.json",
+                SyncSettings.from_config(self.core.config, self.report),
+            )
+        files = list(self._find_resources(self.input_path))
+        for file, _ in files:
+            self.link_index.add_file(file)
+        result = self.resource_sync.sync(files, self.report)
+        self.report.info(
+            f"Copied {result.copied} resources, {result.unchanged} were unchanged and {result.removed} removed."
+        )
 
     def _get_html_folder(
         self, folder: Folder, target_file_path: Path, html: List[str], indent: str = ""
@@ -0,0 +1,129 @@
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+
+from .report import Report, ReportEntry
+
+if TYPE_CHECKING:
+    from .base import Extension
+    from .build_html import HTMLBuilder
+    from .core import URLLocation
+    from .variants import VariantJob
+
+
+@dataclass
+class WorkerSetup:
+    """Everything a worker process needs to create its own builder and core."""
+
+    input_path: Path
+    output_path: Path
+    base_path: Path
+    template_file: Path
+    template: str
+    abort_draft: bool
+    verbose: bool
+    reformat: bool
+    use_cache: bool
+    profile: bool = False
+    trace: bool = False
+
+
+@dataclass
+class PageJob:
+    source_file_path: Path
+    target_file_path: Path
+
+
+@dataclass
+class PageResult:
+    source_file_path: Path
+    target_file_path: Path
+    html: Optional[str] = None
+    chunk_counts: Dict[str, int] = field(default_factory=dict)
+    extensions_used: List[str] = field(default_factory=list)
+    report_entries: List[ReportEntry] = field(default_factory=list)
+    urls: Dict[str, List["URLLocation"]] = field(default_factory=dict)
+    dependencies: List[Path] = field(default_factory=list)
+    titles: Dict[Path, Optional[str]] = field(default_factory=dict)
+    image_jobs: List["VariantJob"] = field(default_factory=list)
+    profile: Dict[str, Dict[str, Dict[str, Any]]] = field(default_factory=dict)
+    trace: List[Dict[str, Any]] = field(default_factory=list)
+
+
+# The builder of a worker process, created once by init_worker.
+_builder: Optional["HTMLBuilder"] = None
+
+
+def init_worker(setup: WorkerSetup) -> None:
+    global _builder
+    from .build_html import HTMLBuilder
+    from .core import Core
+
+    report = Report(verbose=setup.verbose)
+    core = Core(report=report)
+    builder = HTMLBuilder(
+        setup.input_path,
+        setup.output_path,
+        setup.base_path,
+        setup.template_file,
+        report,
+        rebuild_all_pages=True,
+        abort_draft=setup.abort_draft,
+        verbose=setup.verbose,
+        reformat=setup.reformat,
+        use_cache=setup.use_cache,
+        profile=setup.profile,
+        trace=setup.trace,
+    )
+    builder.set_core(core)
+    builder.template = setup.template
+    if builder.image_pipeline is not None:
+        # the parent process encodes the images
+        builder.image_pipeline.use_pool = False
+    _builder = builder
+
+
+def process_page(job: PageJob) -> PageResult:
+    assert _builder is not None, "Worker was not initialized."
+    builder = _builder
+    # every page gets a fresh report and fresh counters, so that the parent
+    # process can merge exactly what belongs to this page
+    report = Report(verbose=builder.verbose)
+    builder.report = report
+    builder.core.report = report
+    builder.core.url_checker.report = report
+    builder.core.url_checker.urls.clear()
+    builder.chunk_counts = {}
+    builder.page_titles = {}
+    builder.profile.clear()
+    extensions_used: Set["Extension"] = set()
+    dependencies: Set[Path] = set()
+    html = builder._render_file(
+        job.source_file_path,
+        job.target_file_path,
+        builder.input_path,
+        builder.template,
+        extensions_used,
+        dependencies,
+    )
+    return PageResult(
+        job.source_file_path,
+        job.target_file_path,
+        html=html,
+        chunk_counts=builder.chunk_counts,
+        extensions_used=[extension.get_name() for extension in extensions_used],
+        report_entries=report.messages,
+        urls={
+            url: list(locations)
+            for url, locations in builder.core.url_checker.urls.items()
+        },
+        dependencies=list(dependencies),
+        titles=builder.page_titles,
+        image_jobs=(
+            builder.image_pipeline.take_jobs()
+            if builder.image_pipeline is not None
+            else []
+        ),
+        profile=builder.profile.to_dict() if builder.profile.enabled else {},
+        trace=builder.profile.take_events(),
+    )
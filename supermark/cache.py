@@ -0,0 +1,108 @@
+import hashlib
+import inspect
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional
+
+import pypandoc
+
+if TYPE_CHECKING:
+    from .chunks import Chunk
+    from .core import Core
+
+CACHE_FOLDER = ".supermark-cache"
+
+
+def digest(*parts: str) -> str:
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(part.encode("utf-8", errors="surrogateescape"))
+        # separator, so that ("ab", "c") and ("a", "bc") differ
+        sha.update(b"\x00")
+    return sha.hexdigest()
+
+
+def write_atomic(content: str, target_file_path: Path) -> None:
+    """Writes a file so that concurrent readers never see half of it."""
+    target_file_path.parent.mkdir(parents=True, exist_ok=True)
+    temp = target_file_path.with_name(f"{target_file_path.name}.{os.getpid()}.tmp")
+    temp.write_text(content, encoding="utf-8", errors="surrogateescape")
+    os.replace(temp, target_file_path)
+
+
+def _pandoc_version() -> str:
+    try:
+        return str(pypandoc.get_pandoc_version())
+    except OSError:
+        return "none"
+
+
+class RenderCache:
+    """Content-addressed cache on disk for the HTML of chunks.
+
+    The key of a chunk is a digest of its source (see `Chunk.get_cache_source`),
+    its chunk and extension classes, the source code of their modules,
+    the Supermark version, the replacements and highlighter in config.toml
+    and the Pandoc version.
+    """
+
+    def __init__(self, folder: Path, core: "Core") -> None:
+        from . import __version__
+
+        self.folder = folder / "html"
+        replacements: Dict[str, Any] = (
+            core.config.replacements if core.config.replacements else {}
+        )
+        self.fingerprint = digest(
+            __version__,
+            json.dumps(replacements, sort_keys=True, default=str),
+            core.config.highlighter,
+            _pandoc_version(),
+        )
+        self.class_fingerprints: Dict[type, str] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def _class_fingerprint(self, clazz: type) -> str:
+        if clazz not in self.class_fingerprints:
+            try:
+                source = Path(inspect.getfile(clazz)).read_text(encoding="utf-8")
+            except (OSError, TypeError):
+                source = ""
+            self.class_fingerprints[clazz] = digest(clazz.__qualname__, source)
+        return self.class_fingerprints[clazz]
+
+    def get_key(self, chunk: "Chunk") -> Optional[str]:
+        source = chunk.get_cache_source()
+        if source is None:
+            return None
+        extension = chunk.get_extension()
+        return digest(
+            self.fingerprint,
+            self._class_fingerprint(type(chunk)),
+            "" if extension is None else self._class_fingerprint(type(extension)),
+            str(chunk.raw_chunk.path),
+            source,
+        )
+
+    def _get_path(self, key: str) -> Path:
+        return self.folder / key[:2] / key
+
+    def get(self, key: str) -> Optional[str]:
+        try:
+            html = self._get_path(key).read_text(
+                encoding="utf-8", errors="surrogateescape"
+            )
+            self.hits += 1
+            return html
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+
+    def put(self, key: str, html: str) -> None:
+        try:
+            write_atomic(html, self._get_path(key))
+        except OSError:
+            # the cache is only an optimization
+            pass
@@ -1,4 +1,6 @@
+import copy
 import hashlib
+import threading
 from abc import abstractmethod
 from enum import Enum
 from pathlib import Path
@@ -10,12 +12,22 @@ if TYPE_CHECKING:
 
 import regex as re
 import yaml
-from yaml.scanner import ScannerError
+
+try:
+    # the parser of libyaml is much faster, if it is installed
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader  # type: ignore
 
 from .base import Extension
-from .pandoc import convert, convert_code
+from .cache import digest
+from .dimensions import DimensionIndex
+from .images import ImageIndex
+from .pandoc import ConversionBroker, convert, convert_all, convert_code
+from .profiling import BuildProfile
 from .report import Report
 from .utils import has_class_tag
+from .variants import ImagePipeline
 from .write_html import div, aside
 import re
 from typing import List, Optional
@@ -49,6 +61,16 @@ class Builder:
         self.reformat = reformat
         self.chunk_counts: Dict[str, int] = {}
         self.extensions_used: Set[Extension] = set()
+        # holds the conversion broker of the page the current thread builds
+        self.local = threading.local()
+        # to find figures that were moved
+        self.image_index: Optional[ImageIndex] = None
+        # creates responsive variants of images
+        self.image_pipeline: Optional[ImagePipeline] = None
+        # knows the width and height of images
+        self.dimension_index = DimensionIndex(None)
+        # durations of the build, enabled with --profile
+        self.profile = BuildProfile()
 
     @abstractmethod
     def build(self):
@@ -59,6 +81,7 @@ class Builder:
         source_file_path: Path,
         input_path: Path,
         extensions_used: Set[Extension],
+        included_files: Optional[Set[Path]] = None,
     ) -> Optional[Sequence["Chunk"]]:
         chunks = self.core.parse_file(
             source_file_path,
@@ -66,6 +89,7 @@ class Builder:
             self.abort_draft,
             self.reformat,
             extensions_used,
+            included_files,
         )
         self.extensions_used = self.extensions_used.union(extensions_used)
         if chunks is not None:
@@ -74,6 +98,8 @@ class Builder:
 
     def set_core(self, core: "Core") -> None:
         self.core: "Core" = core
+        core.profile = self.profile
+        core.url_checker.profile = self.profile
 
     def _count_chunks(self, chunks: Sequence["Chunk"]):
         for chunk in chunks:
@@ -88,19 +114,42 @@ class Builder:
     def get_extensions_used(self) -> Set[Extension]:
         return self.extensions_used
 
+    def get_broker(self) -> Optional[ConversionBroker]:
+        return getattr(self.local, "broker", None)
+
+    def set_broker(self, broker: Optional[ConversionBroker]) -> None:
+        self.local.broker = broker
+
     def convert(
         self, source: str, target_format: str, source_format: str = "md"
     ) -> str:
-        return convert(source, target_format, self.core, source_format=source_format)
+        return convert(
+            source,
+            target_format,
+            self.core,
+            source_format=source_format,
+            broker=self.get_broker(),
+        )
+
+    def convert_all(
+        self, sources: Sequence[str], target_format: str, source_format: str = "md"
+    ) -> List[str]:
+        return convert_all(
+            sources,
+            target_format,
+            self.core,
+            source_format=source_format,
+            broker=self.get_broker(),
+        )
 
     def convert_code(self, source: str, target_format: str) -> str:
-        return convert_code(source, target_format)
+        return convert_code(source, target_format, broker=self.get_broker())
 
     def copy_resource(self, chunk: "RawChunk", resource_path: Path):
         if resource_path.exists():
             rel_path = resource_path.relative_to(self.input_path)
             target = self.output_path / rel_path
-            target.parent.mkdir(exist_ok=True)
+            target.parent.mkdir(exist_ok=True, parents=True)
             copyfile(resource_path, target)
 
 
@@ -151,12 +200,29 @@ class RawChunk:
             if has_class_tag(self.lines[0]):
                 self.tag = self.lines[0].strip().split(":")[1].lower()
         self.post_yaml = None
+        self.dictionary: Optional[Any] = None
+        self.yaml_parsed = False
+        self.yaml_error = False
+        self.yaml_message: Optional[str] = None
+        self.yaml_reported = False
+        # number of messages reported about this chunk
+        self.messages = 0
 
     def tell(self, message: str, level: int = 0):
+        self.messages += 1
         self.report.tell(
             message, level=level, line=self.start_line_number, path=self.path
         )
 
+    def copy(self, report: "Report") -> "RawChunk":
+        """A copy for another page. It shares the lines and the parsed YAML."""
+        chunk = copy.copy(self)
+        chunk.report = report
+        chunk.messages = 0
+        # errors in the YAML are reported for each page
+        chunk.yaml_reported = False
+        return chunk
+
     def get_tag(self):
         return self.tag
 
@@ -171,15 +237,29 @@ class RawChunk:
             return "empty"
         return self.lines[0]
 
-    def get_reference(self) -> Optional[Path]:
-        # TODO check if this is called too often
-        if self.type == RawChunkType.YAML:
+    def parse_yaml(self) -> None:
+        """Parses the content of a YAML chunk once, without reporting errors yet."""
+        if self.type == RawChunkType.YAML and not self.yaml_parsed:
+            self.yaml_parsed = True
             try:
-                self.dictionary = yaml.safe_load("".join(self.lines))
-                if self.dictionary is not None and "ref" in self.dictionary:
-                    return (self.path.parent / self.dictionary["ref"]).resolve()
-            except ScannerError as se:
-                self.report.error(f"Error parsing YAML {se}")
+                self.dictionary = yaml.load("".join(self.lines), Loader=SafeLoader)
+            except yaml.YAMLError as e:
+                self.yaml_error = True
+                self.yaml_message = f"Something is wrong with YAML section {e}"
+
+    def get_dictionary(self) -> Optional[Any]:
+        """The content of a YAML chunk. It is parsed only once, and errors
+        are reported only once."""
+        self.parse_yaml()
+        if self.yaml_message is not None and not self.yaml_reported:
+            self.yaml_reported = True
+            self.tell(self.yaml_message, Report.ERROR)
+        return self.dictionary
+
+    def get_reference(self) -> Optional[Path]:
+        dictionary = self.get_dictionary()
+        if isinstance(dictionary, dict) and "ref" in dictionary:
+            return (self.path.parent / dictionary["ref"]).resolve()
         return None
 
     def get_hash(self) -> str:
@@ -189,6 +269,12 @@ class RawChunk:
             self.hash = shake.hexdigest(3)
         return self.hash
 
+    def get_digest(self) -> str:
+        """Strong digest of the lines and the post-yaml section, unlike get_hash,
+        which is short and only meant for ids within a page."""
+        post_yaml = "" if self.post_yaml is None else "".join(self.post_yaml)
+        return digest(self.type.name, "".join(self.lines), post_yaml)
+
 
 class Chunk:
     """Base class for a chunk."""
@@ -261,35 +347,23 @@ class Chunk:
     def recode(self) -> str:
         raise NotImplementedError
 
-    def _make_link_relative(self, link: str) -> str:
-        if (
-            link.startswith("http://")
-            or link.startswith("https://")
-            or link.startswith("mailto:")
-        ):
-            return link
-
-        try:
-            return str(
-                (self.raw_chunk.path.parent / link)
-                .resolve()
-                .relative_to(self.raw_chunk.input_path)
-            )
-        except ValueError:
-            self.warning(f"Link {link} is not relative to {self.raw_chunk.input_path}")
-            # Can happen if a link is wrong and points out of the pages directory
-            print("link: " + link)
-            print("raw_chunk.input_path: " + str(self.raw_chunk.input_path))
-            print("raw_chunk.parent_path: " + str(self.raw_chunk.path.parent))
-            print("raw_chunk.path: " + str(self.raw_chunk.path))
-            print("resolved: " + str((self.raw_chunk.parent_path / link).resolve()))
-            # raise ValueError
-            return link
-
     @abstractmethod
     def add_used_extension(self, used_extensions: Set[Extension], core: Any):
         ...
 
+    def get_dependencies(self) -> Set[Path]:
+        """Files this chunk is built from."""
+        dependencies = {self.raw_chunk.path}
+        for aside in self.asides:
+            dependencies |= aside.get_dependencies()
+        return dependencies
+
+    def get_cache_source(self) -> Optional[str]:
+        """The source that determines the HTML of this chunk, used to cache it.
+        Chunks that have side effects during to_html or depend on other input
+        return None, so that they are always rendered."""
+        return self.raw_chunk.get_digest()
+
     @staticmethod
     def create_hash(content: str):
         shake = hashlib.shake_128()
@@ -361,11 +435,9 @@ class YAMLChunk(Chunk):
                 )
 
     def get_urls(self) -> Optional[Sequence[str]]:
+        # as written, the URL checker resolves them against the page
         if "link" in self.dictionary:
-            try:
-                return [str(self._make_link_relative(self.dictionary["link"]))]
-            except ValueError:
-                self.warning("Invalid link: " + self.dictionary["link"])
+            return [str(self.dictionary["link"])]
         return None
 
     def get(self, attribute: str) -> Optional[Any]:
@@ -527,8 +599,7 @@ class MarkdownChunk(Chunk):
 
     def get_urls(self) -> Optional[Sequence[str]]:
         link_pattern = r"\[.*?\]\((https?://[^\s]+|mailto:[^\s]+|[^)]+)\)"
-        matches = re.findall(link_pattern, self.get_content())
-        return [self._make_link_relative(link) if not link.startswith("mailto:") and not link.startswith("#") else link for link in matches]
+        return re.findall(link_pattern, self.get_content())
 
     def find_anchors(self) -> Sequence[str]:
         anchors: List[str] = []
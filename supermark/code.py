@@ -3,9 +3,11 @@ from typing import Any, Dict, List, Sequence
 
 from pygments import highlight
 from pygments.formatters import LatexFormatter
-from pygments.lexers import get_lexer_by_name
 
 from .chunks import Builder, Chunk, RawChunk
+from .highlight import get_lexer, highlight_html
+
+latex_formatter = LatexFormatter(linenos=False, verboptions="breaklines")
 
 
 class Code(Chunk):
@@ -56,21 +58,21 @@ class Code(Chunk):
         #     formatter = HtmlFormatter()
         #     output.append(highlight(self.code, lexer, formatter))
         #     return "\n".join(output)
-        return self.wrap_in_code_frame(
-            builder.convert_code(self.get_content(), target_format="html"), builder
-        )
+        html = None
+        if builder.core.config.highlighter == "pygments" and self.lang is not None:
+            html = highlight_html(self.code, self.lang)
+        if html is None:
+            # languages Pygments does not know are left to Pandoc
+            html = builder.convert_code(self.get_content(), target_format="html")
+        return self.wrap_in_code_frame(html, builder)
 
     def to_latex(self, builder: Builder) -> str:
         lexer = None
         if self.lang is not None:
-            try:
-                lexer = get_lexer_by_name(self.lang, stripall=True)
-            except Exception as e:
-                print(e)
+            lexer = get_lexer(self.lang)
         output: List[str] = []
         if lexer is not None:
-            formatter = LatexFormatter(linenos=False, verboptions="breaklines")
-            output.append(highlight(self.code, lexer, formatter))
+            output.append(highlight(self.code.strip(), lexer, latex_formatter))
         else:
             output.append(r"\begin{Verbatim}[breaklines]")
             output.append(self.code)
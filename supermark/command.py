@@ -1,8 +1,10 @@
 import sys
 from pathlib import Path
+from tempfile import TemporaryDirectory
+from time import perf_counter
 
 # from collections import namedtuple
-from typing import Any, List, Optional
+from typing import Any, List, Optional, Sequence
 
 import click
 
@@ -12,14 +14,25 @@ from rich import print
 from rich.pretty import pprint
 
 from . import __version__
+from .bench import (
+    METRICS,
+    ExtensionBench,
+    compare_results,
+    print_comparisons,
+    print_extension_results,
+    save_extension_results,
+)
 from .build_doc import DocBuilder
 from .build_html import HTMLBuilder
+from .cache import CACHE_FOLDER
 from .core import Core
 from .pandoc import print_pandoc_info
 
 # from .build_latex import build_latex
-from .report import Report
+from .report import ConsoleSink, JSONLinesSink, Report
 from .setup import setup_github_action
+from .synthetic import DEFAULT_MIX, SiteSpec, generate_site
+from .watch import build_continuously
 
 
 def logo(version: str) -> str:
@@ -166,6 +179,19 @@ def setup_paths(
     default=False,
     help="Write messages to a log file instead of standard output.",
 )
+@click.option(
+    "--log-json",
+    "log_json",
+    is_flag=True,
+    default=False,
+    help="Write messages as JSON lines to supermark.jsonl while building.",
+)
+@click.option(
+    "--stream",
+    is_flag=True,
+    default=False,
+    help="Print warnings and errors while building, not only at the end.",
+)
 @click.option(
     "-u",
     "--urls",
@@ -173,6 +199,49 @@ def setup_paths(
     default=False,
     help="Check external URLs for reachability.",
 )
+@click.option(
+    "-j",
+    "--jobs",
+    "jobs",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of pages built in parallel. Default depends on the number of cores.",
+)
+@click.option(
+    "--executor",
+    "executor",
+    type=click.Choice(["thread", "process"]),
+    default="thread",
+    help="Build pages in a pool of threads or of processes.",
+)
+@click.option(
+    "--no-cache",
+    "no_cache",
+    is_flag=True,
+    default=False,
+    help="Do not use the cache of rendered chunks in .supermark-cache.",
+)
+@click.option(
+    "--profile",
+    "profile",
+    is_flag=True,
+    default=False,
+    help="Print where the build spends its time, and write it to supermark-profile.json.",
+)
+@click.option(
+    "--trace",
+    "trace",
+    is_flag=True,
+    default=False,
+    help="Write a timeline of the build to supermark-trace.json, for Perfetto or chrome://tracing.",
+)
+@click.option(
+    "--explain",
+    "explain",
+    is_flag=True,
+    default=False,
+    help="Print why each page is rebuilt.",
+)
 def build(
     all: bool,
     verbose: bool,
@@ -184,8 +253,17 @@ def build(
     template: Optional[Path] = None,
     reformat: bool = False,
     log: bool = False,
+    log_json: bool = False,
+    stream: bool = False,
     urls: bool = False,
+    jobs: Optional[int] = None,
+    executor: str = "thread",
+    no_cache: bool = False,
+    explain: bool = False,
+    profile: bool = False,
+    trace: bool = False,
 ):
+    start = perf_counter()
     report = Report(verbose=verbose)
     core = Core(report=report, check_external_urls=urls)
     print(logo_2(__version__))
@@ -193,6 +271,10 @@ def build(
     report.info(f"Installed Python version: {sys.version}")
 
     path_setup = setup_paths(path, input, output, template, core)
+    if log_json:
+        report.add_sink(JSONLinesSink(path_setup.base / "supermark.jsonl"))
+    if stream:
+        report.add_sink(ConsoleSink(Report.WARNING))
 
     builder = HTMLBuilder(
         path_setup.input,
@@ -204,18 +286,41 @@ def build(
         abort_draft=not draft,
         verbose=verbose,
         reformat=reformat,
+        jobs=jobs,
+        executor=executor,
+        use_cache=not no_cache,
+        explain=explain,
+        profile=profile,
+        trace=trace,
     )
     builder.set_core(core)
     builder.build()
 
-    core.url_checker.check(path_setup.input)
-
     builder.copy_resources()
 
+    with builder.profile.measure("urls"):
+        core.url_checker.check(
+            path_setup.input, path_setup.base / CACHE_FOLDER, builder.link_index
+        )
+    builder.profile.add("steps", "total", perf_counter() - start)
+
+    if not continuous:
+        report.close_sinks()
     report.print()
+    if profile:
+        builder.profile.print_summary()
+        builder.profile.save(path_setup.base / "supermark-profile.json")
+    if trace:
+        builder.profile.save_trace(path_setup.base / "supermark-trace.json")
     if log:
         report.print_to_file(path_setup.base / "supermark.log")
-    else:
+    if continuous:
+        try:
+            # the sinks also get the entries of the rebuilds
+            build_continuously(builder, verbose, sinks=list(report.sinks))
+        finally:
+            report.close_sinks()
+    elif not log:
         if report.has_error():
             # beep(3)  # sad error
             ex = ClickException("Something is wrong.")
@@ -348,3 +453,145 @@ def clean(
                     html_file.unlink(missing_ok=True)
         else:
             pprint("No files found to delete.")
+
+
+@supermark.group(help="Benchmarks, for the development of Supermark.")
+def bench():
+    ...
+
+
+@bench.command(help="Create a synthetic site to benchmark builds with.")
+@click.argument("path", type=click.Path(file_okay=False, path_type=Path))
+@click.option(
+    "--pages",
+    "pages",
+    type=click.IntRange(min=1),
+    default=100,
+    help="Number of pages.",
+)
+@click.option(
+    "--depth",
+    "depth",
+    type=click.IntRange(min=0),
+    default=2,
+    help="Number of nested folders.",
+)
+@click.option(
+    "--chunks",
+    "chunks",
+    type=click.IntRange(min=0),
+    default=10,
+    help="Number of chunks per page.",
+)
+@click.option(
+    "--mix",
+    "mix",
+    help=f"Weights of the kinds of chunks, like markdown=4,table=1. Kinds are {', '.join(DEFAULT_MIX)}.",
+)
+@click.option("--seed", "seed", type=int, default=0, help="Seed of the random content.")
+def generate(
+    path: Path,
+    pages: int = 100,
+    depth: int = 2,
+    chunks: int = 10,
+    mix: Optional[str] = None,
+    seed: int = 0,
+):
+    spec = SiteSpec(pages=pages, depth=depth, chunks=chunks, seed=seed)
+    if mix is not None:
+        try:
+            spec.mix = SiteSpec.parse_mix(mix)
+        except ValueError as e:
+            raise click.BadParameter(str(e), param_hint="--mix")
+    input_path = generate_site(path, spec)
+    print(f"Created {pages} pages in {input_path}.")
+
+
+@bench.command(help="Compare two results of benchmarks and flag regressions.")
+@click.argument("old", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.argument("new", type=click.Path(exists=True, dir_okay=False, path_type=Path))
+@click.option(
+    "--threshold",
+    "threshold",
+    type=float,
+    default=10.0,
+    help="Percent a benchmark may get slower before it counts as regression.",
+)
+@click.option(
+    "--metric",
+    "metric",
+    type=click.Choice(METRICS),
+    default="median",
+    help="Statistic of the benchmarks to compare.",
+)
+def compare(old: Path, new: Path, threshold: float = 10.0, metric: str = "median"):
+    comparisons = compare_results(old, new, metric)
+    print_comparisons(comparisons, threshold)
+    regressions = [c for c in comparisons if c.is_regression(threshold)]
+    if len(regressions) > 0:
+        ex = ClickException(
+            f"{len(regressions)} of {len(comparisons)} benchmarks got slower by more than {threshold}%."
+        )
+        ex.exit_code = 1
+        raise ex
+
+
+@bench.command(
+    help="Render the examples of extensions in a loop, and measure their time and memory."
+)
+@click.argument("names", nargs=-1)
+@click.option(
+    "--time",
+    "min_time",
+    type=click.FloatRange(min=0),
+    default=0.2,
+    help="Seconds to render the examples of each extension.",
+)
+@click.option(
+    "--json",
+    "json_file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    help="Store the results as JSON, to compare them later.",
+)
+@click.option(
+    "--max-us",
+    "max_us",
+    type=float,
+    help="Fail if an extension needs more microseconds per chunk for to_html.",
+)
+def extensions(
+    names: Sequence[str],
+    min_time: float = 0.2,
+    json_file: Optional[Path] = None,
+    max_us: Optional[float] = None,
+):
+    report = Report()
+    core = Core(report=Report())
+    with TemporaryDirectory() as folder:
+        builder = HTMLBuilder(
+            Path(folder) / "examples",
+            Path(folder) / "out",
+            Path(folder),
+            Path(folder) / "page.html",
+            core.report,
+        )
+        builder.set_core(core)
+        results = ExtensionBench(core, builder, report, min_time).run(names)
+    print_extension_results(results)
+    report.print()
+    if json_file is not None:
+        save_extension_results(results, json_file)
+    if max_us is not None:
+        slow = [
+            result
+            for result in results
+            if result.method == "to_html"
+            and result.is_measured()
+            and result.get_us_per_chunk() > max_us
+        ]
+        if len(slow) > 0:
+            ex = ClickException(
+                f"Too slow: {', '.join(result.get_name() for result in slow)}."
+            )
+            ex.exit_code = 1
+            raise ex
@@ -3,6 +3,7 @@ from typing import Any, Optional
 
 import toml
 
+from .highlight import HIGHLIGHTERS
 from .report import Report
 
 
@@ -10,14 +11,26 @@ class Config:
     def __init__(self, report: Report) -> None:
         # read configuration file
         config_file = Path("config.toml")
+        self.replacements = {}
+        self.file: Optional[Path] = None
+        self.highlighter = "pandoc"
         if config_file.exists():
+            self.file = config_file.resolve()
             report.info("Found configuration file.", path=config_file)
             self.config = toml.load(config_file)
             if "replacements" in self.config:
                 self.replacements = self.config["replacements"]
+            if "code" in self.config and "highlighter" in self.config["code"]:
+                highlighter = self.config["code"]["highlighter"]
+                if highlighter in HIGHLIGHTERS:
+                    self.highlighter = highlighter
+                else:
+                    report.warning(
+                        f"Unknown code highlighter {highlighter}, use one of {', '.join(HIGHLIGHTERS)}.",
+                        path=config_file,
+                    )
         else:
             self.config = None
-            self.replacements = {}
 
     def has_config(self, key: str) -> bool:
         return self.config is not None and key in self.config
@@ -1,18 +1,26 @@
 import inspect
+import json
+import posixpath
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
 from importlib import import_module
 from pathlib import Path
-from typing import Any, DefaultDict, Dict, List, Optional, Sequence, Set
+from threading import RLock
+from typing import (
+    Any,
+    DefaultDict,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 import traceback
 
-import requests
 import rich
-import yaml
-from requests import Response
 from rich.progress import BarColumn, Progress
 from rich.tree import Tree
-from yaml.scanner import ScannerError
 
 from .chunks import (
     Chunk,
@@ -22,6 +30,7 @@ from .chunks import (
     RawChunkType,
     YAMLDataChunk,
 )
+from .assets import ExtensionAssets
 from .base import Extension, ExtensionPackage
 from .code import Code
 from .config import Config
@@ -34,22 +43,53 @@ from .extend import (
     YamlExtension,
     YamlExtensionPoint,
 )
-from .parse import parse
+from .links import LinkIndex
+from .parse import ReferenceCache, parse
+from .profiling import BuildProfile
 from .report import Report
+from .urlcheck import URLCheckEngine, URLCheckSettings, URLResult, URLResultStore
 from .utils import remove_empty_lines_begin_and_end, write_file
 
 
+URLLocation = Tuple[Path, int]
+
+EXTENSIONS_FOLDER = Path(__file__).parent / "extensions"
+
+# which module provides which extension, to import modules only when used
+MANIFEST_FILE = EXTENSIONS_FOLDER / "manifest.json"
+
+# prefixes of extension names -> name of their extension point
+NAME_PREFIXES = {"yaml": "yaml", "md": "paragraph", "table": "tableclass"}
+
+
 class URLChecker:
-    def __init__(self, check_external_urls: bool) -> None:
+    def __init__(
+        self,
+        check_external_urls: bool,
+        report: Report,
+        settings: Optional[URLCheckSettings] = None,
+    ) -> None:
         self.check_external_urls = check_external_urls
-        self.urls: DefaultDict[str, Set[Chunk]] = defaultdict(set)
-        self.local_links: Set[str] = set()
+        self.report = report
+        self.settings = settings if settings is not None else URLCheckSettings()
+        self.urls: DefaultDict[str, Set[URLLocation]] = defaultdict(set)
+        self.input_path: Optional[Path] = None
+        self.link_index = LinkIndex(None)
+        self.profile: Optional[BuildProfile] = None
 
     def look_at_chunk(self, chunk: Chunk) -> None:
         chunk_urls = chunk.get_urls()
         if chunk_urls is not None:
+            location = (chunk.raw_chunk.path, chunk.raw_chunk.start_line_number)
             for url in chunk_urls:
-                self.urls[url] |= {chunk}
+                self.urls[url].add(location)
+
+    def add_locations(self, url: str, locations: Sequence[URLLocation]) -> None:
+        self.urls[url].update(locations)
+
+    def _warn(self, message: str, locations: Set[URLLocation]) -> None:
+        for path, line in locations:
+            self.report.warning(message, path=path, line=line)
 
     def translate_status_code(self, status_code: int) -> str:
         status_codes = {
@@ -60,120 +100,132 @@ class URLChecker:
             401: "Unauthorized",
             403: "Forbidden",
             404: "Not Found",
+            429: "Too Many Requests",
             500: "Internal Server Error",
         }
         return status_codes.get(status_code, "Unknown")
 
-    def _execute_request(self, url: str) -> Response:
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
-        }
-        response = requests.get(url, headers=headers, allow_redirects=True)
-        return response
+    def _is_external(self, url: str) -> bool:
+        return url.startswith("http://") or url.startswith("https://")
+
+    def _check_result(self, result: URLResult, locations: Set[URLLocation]) -> None:
+        url = result.url
+        if result.error is not None:
+            self._warn(f"{url} is not reachable. {result.error}", locations)
+        elif not result.is_ok():
+            # 401 is not an error, it just means that the page is protected
+            # 404 is not an error, it just means that the page is not found
+            self._warn(
+                f"{url} is not reachable, status_code: {result.status_code} ({self.translate_status_code (result.status_code)})",
+                locations,
+            )
+
+    def _get_page(self, path: Path) -> Optional[str]:
+        if self.input_path is None:
+            return None
+        for input_path in [self.input_path, self.input_path.resolve()]:
+            try:
+                return str(path.relative_to(input_path).with_suffix(".html"))
+            except ValueError:
+                pass
+        return None
 
-    def _check_url(self, url: str, chunks: Set[Chunk]) -> None:
+    def _resolve(self, target: str, path: Path) -> str:
+        """The target of a link relative to the input folder, like in the link index."""
+        page = self._get_page(path)
+        if page is None:
+            return target
+        return posixpath.normpath(posixpath.join(posixpath.dirname(page), target))
+
+    def _check_url(self, url: str, locations: Set[URLLocation]) -> None:
         if url.startswith("mailto:"):
             return
         if url.startswith("#"):
+            # an anchor on the same page
+            for path, line in locations:
+                page = self._get_page(path)
+                if (
+                    page is not None
+                    and self.link_index.has_page(page)
+                    and not self.link_index.has_anchor(page, url[1:])
+                ):
+                    self.report.warning(
+                        f"Anchor {url} not found.", path=path, line=line
+                    )
             return
-        if url.startswith("http://") or url.startswith("https://"):
-            if self.check_external_urls:
-                try:
-                    response = self._execute_request(url)
-                    if response.status_code != 200:
-                        for chunk in chunks:
-                            # 401 is not an error, it just means that the page is protected
-                            # 404 is not an error, it just means that the page is not found
-                            chunk.warning(
-                                f"{url} is not reachable, status_code: {response.status_code} ({self.translate_status_code (response.status_code)})"
-                            )
-                except requests.exceptions.RequestException as e:
-                    for chunk in chunks:
-                        chunk.warning(f"{url} is not reachable. {type(e)}")
+        if self._is_external(url):
+            # external URLs are checked together, see check
             return
-
         else:
-            # Remove any anchor in the link first
-            if "#" in url:
-                base_url = url.split("#")[0]
-            else:
-                base_url = url
-            if base_url not in self.local_links:
-                for chunk in chunks:
-                    chunk.warning(f"{url} not found.")
+            target, _, anchor = url.partition("#")
+            for path, line in locations:
+                page = self._resolve(target, path)
+                if not self.link_index.has_target(page):
+                    self.report.warning(f"{url} not found.", path=path, line=line)
+                elif anchor and not self.link_index.has_anchor(page, anchor):
+                    self.report.warning(
+                        f"Anchor #{anchor} not found in {page}.", path=path, line=line
+                    )
 
     def check_all_urls(self) -> None:
-        for url, chunks in self.urls.items():
-            self._check_url(url, chunks)
-
-    def check(self, input_path: Path) -> None:
-        # find all internal files to check local links
-        files = list(
-            input_path.glob(
-                "**/*.md",
-            )
+        for url, locations in self.urls.items():
+            self._check_url(url, locations)
+
+    def _create_link_index(self, input_path: Path) -> LinkIndex:
+        link_index = LinkIndex(None)
+        link_index.set_pages(
+            str(file.relative_to(input_path).with_suffix(".html"))
+            for file in input_path.glob("**/*.md")
+        )
+        # also accept links to PDFs
+        for file in input_path.glob("**/*.pdf"):
+            link_index.add_file(str(file.relative_to(input_path)))
+        return link_index
+
+    def check(
+        self,
+        input_path: Path,
+        cache_folder: Optional[Path] = None,
+        link_index: Optional[LinkIndex] = None,
+    ) -> None:
+        """Checks all collected URLs. Local links are looked up in the link index
+        of the build, which is only created here if there is none."""
+        self.input_path = input_path
+        self.link_index = (
+            link_index
+            if link_index is not None
+            else self._create_link_index(input_path)
+        )
+        self.check_all_urls()
+        if not self.check_external_urls:
+            return
+        external = [url for url in self.urls if self._is_external(url)]
+        store = URLResultStore(
+            None if cache_folder is None else cache_folder / "urls.json",
+            self.settings.ttl,
         )
-        for file in files:
-            self.local_links.add(
-                str(file.relative_to(input_path)).replace(".md", ".html")
+        engine = URLCheckEngine(self.settings, store, self.profile)
+        with Progress(
+            "[progress.description]{task.description}",
+            BarColumn(),
+            "[progress.percentage]{task.percentage:>3.0f}%",
+            transient=True,
+        ) as progress:
+            task = progress.add_task(
+                f"[orange]Checking {len(external)} URLs",
+                total=len(external),
             )
-        # Workaround for now, also accept links to PDFs
-        files = list(
-            input_path.glob(
-                "**/*.pdf",
+            results = engine.check_all(
+                external, lambda result: progress.update(task, advance=1.0)
             )
-        )
-        for file in files:
-            self.local_links.add(
-                str(file.relative_to(input_path))
+        for url in external:
+            self._check_result(results[url], self.urls[url])
+        cached = sum(1 for result in results.values() if result.cached)
+        if cached > 0:
+            self.report.info(
+                f"Skipped {cached} URLs that were reachable within the last {self.settings.ttl:.0f} seconds."
             )
 
-        with ThreadPoolExecutor() as e:
-            with Progress(
-                "[progress.description]{task.description}",
-                BarColumn(),
-                "[progress.percentage]{task.percentage:>3.0f}%",
-                transient=True,
-            ) as progress:
-                task = progress.add_task(
-                    f"[orange]Checking {len(self.urls)} URLs",
-                    total=len(self.urls),
-                )
-                futures = []
-                for url, chunks in self.urls.items():
-                    future = e.submit(
-                        self._check_url,
-                        url,
-                        chunks,
-                    )
-                    future.add_done_callback(
-                        lambda p: progress.update(task, advance=1.0)
-                    )
-                    futures.append(future)
-                for future in futures:
-                    future.result()
-
-
-class ImageFileLocator:
-    def get_graphic_files(self, dirs, extensions):
-        file_map = {}
-        for dir in dirs:
-            p = Path(dir)
-            for ext in extensions:
-                for file in p.rglob(f"*.{ext}"):
-                    file_map[file.name] = file
-        return file_map
-
-    def __init__(self, dirs, report: Report) -> None:
-        self.report = report
-        file_extensions = ["png", "jpg", "svg"]
-        self.graphic_files = self.get_graphic_files(dirs, file_extensions)
-
-    def lookup(self, path: Path) -> Optional[Path]:
-        if path.name in self.graphic_files:
-            return self.graphic_files[path.name]
-        return None
-
 
 class Core:
     def __init__(self, report: Report, check_external_urls: bool = False) -> None:
@@ -181,6 +233,9 @@ class Core:
         self.config = Config(report)
         self.extension_packages: Dict[str, ExtensionPackage] = {}
         self.extension_points: Dict[str, ExtensionPoint] = {}
+        self.loaded_modules: Set[str] = set()
+        self.modules_lock = RLock()
+        self.manifest = self._read_manifest()
         self.yaml_extension_point: YamlExtensionPoint = self._register(
             YamlExtensionPoint()
         )
@@ -192,15 +247,59 @@ class Core:
         )
         self._load_extensions()
         self.collect_urls = True
-        self.url_checker = URLChecker(check_external_urls=check_external_urls)
-        self.image_file_locator = None  # ImageFileLocator(report)
+        self.url_checker = URLChecker(
+            check_external_urls=check_external_urls,
+            report=report,
+            settings=URLCheckSettings.from_config(self.config, report),
+        )
+        self.reference_cache = ReferenceCache()
+        self.assets = ExtensionAssets()
+        # the profile of the builder, see --profile
+        self.profile = BuildProfile()
+
+    def _read_manifest(self) -> Dict[str, Any]:
+        try:
+            with open(MANIFEST_FILE, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _get_extension_folders(self) -> List[Path]:
+        return sorted(
+            folder
+            for folder in EXTENSIONS_FOLDER.iterdir()
+            if folder.is_dir() and not folder.name.startswith("__")
+        )
 
     def _load_extensions(self):
-        for file in (Path(__file__).parent / "extensions").glob("*"):
-            if file.is_dir():
-                self._register_module(f"supermark.extensions.{file.name}")
+        """Registers the extensions of the manifest, to be imported when first used.
+
+        Folders that are not in the manifest, because they were added
+        after it was created, are imported right away.
+        """
+        in_manifest = set(self.manifest.get("modules", []))
+        for extension_point in self.extension_points.values():
+            extension_point.loader = self._register_module
+            for entry in self.manifest.get(extension_point.name, []):
+                module = f"supermark.extensions.{entry['module']}"
+                for name in entry["names"]:
+                    extension_point.add_lazy_extension(name, module)
+        for folder in self._get_extension_folders():
+            if folder.name not in in_manifest:
+                self._register_module(f"supermark.extensions.{folder.name}")
+
+    def load_all_extensions(self) -> None:
+        for folder in self._get_extension_folders():
+            self._register_module(f"supermark.extensions.{folder.name}")
 
     def _register_module(self, name: str):
+        with self.modules_lock:
+            if name in self.loaded_modules:
+                return
+            self.loaded_modules.add(name)
+            self._import_module(name)
+
+    def _import_module(self, name: str):
         try:
             module = import_module(name, package=None)
             if module is None:
@@ -290,28 +389,25 @@ class Core:
                     raw, tag, page_variables, report, used_extensions=used_extensions
                 )
         elif chunk_type == RawChunkType.YAML:
-            try:
-                temp: Any = yaml.safe_load("".join(raw.lines))
-                if isinstance(temp, dict):
-                    dictionary: Dict[str, Any] = temp
-                    if "type" in dictionary:
-                        return self.yaml_extension_point.cast_yaml(
-                            raw,
-                            dictionary["type"],
-                            dictionary,
-                            page_variables,
-                            used_extensions=used_extensions,
-                        )
-                    else:
-                        data_chunk = YAMLDataChunk(raw, dictionary, page_variables)
-                        try:
-                            page_variables.update(data_chunk.dictionary)
-                        except ValueError as e:
-                            print(e)
-                        return data_chunk
-            except ScannerError as se:
-                raw.report.error(f"Something is wrong with YAML section {se}")
-            else:
+            temp: Any = raw.get_dictionary()
+            if isinstance(temp, dict):
+                dictionary: Dict[str, Any] = temp
+                if "type" in dictionary:
+                    return self.yaml_extension_point.cast_yaml(
+                        raw,
+                        dictionary["type"],
+                        dictionary,
+                        page_variables,
+                        used_extensions=used_extensions,
+                    )
+                else:
+                    data_chunk = YAMLDataChunk(raw, dictionary, page_variables)
+                    try:
+                        page_variables.update(data_chunk.dictionary)
+                    except ValueError as e:
+                        print(e)
+                    return data_chunk
+            elif not raw.yaml_error:
                 raw.report.error("Something is wrong with the YAML section.")
             return None
         elif chunk_type == RawChunkType.HTML:
@@ -382,9 +478,19 @@ class Core:
         input_path: Path,
         report: Report,
         used_extensions: Optional[Set[Extension]] = None,
+        included_files: Optional[Set[Path]] = None,
     ):
-        raw_chunks = parse(lines, source_file_path, input_path, report)
-        chunks = self.cast(raw_chunks, report, used_extensions=used_extensions)
+        with self.profile.measure("parse"):
+            raw_chunks = parse(
+                lines,
+                source_file_path,
+                input_path,
+                report,
+                self.reference_cache,
+                included_files=included_files,
+            )
+        with self.profile.measure("cast"):
+            chunks = self.cast(raw_chunks, report, used_extensions=used_extensions)
         # TODO not sure if we first arrange asides and then group or vice versa
         return self.group_chunks(self.arrange_assides(chunks))
 
@@ -395,12 +501,18 @@ class Core:
         abort_draft: bool = False,
         reformat: bool = False,
         used_extensions: Optional[Set[Extension]] = None,
+        included_files: Optional[Set[Path]] = None,
     ) -> Optional[Sequence[Chunk]]:
         with open(source_file_path, encoding="utf-8") as file:
             lines = file.readlines()
             # report.tell("{}".format(source_file_path), Report.INFO)
             chunks = self.parse_lines(
-                lines, source_file_path, input_path, self.report, used_extensions
+                lines,
+                source_file_path,
+                input_path,
+                self.report,
+                used_extensions,
+                included_files,
             )
             # TODO do this in async
             if reformat:
@@ -416,26 +528,27 @@ class Core:
 
             return chunks
 
+    def parse_examples(
+        self,
+        extension: Union[Extension, ExtensionPackage],
+        input_path: Path,
+        used_extensions: Optional[Set[Extension]] = None,
+    ) -> List[Chunk]:
+        """The chunks of the example-*.md files of an extension or extension package."""
+        example_chunks: List[Chunk] = []
+        for example in extension.get_examples():
+            chunks = self.parse_file(
+                example, input_path=input_path, used_extensions=used_extensions
+            )
+            if chunks is not None:
+                example_chunks.extend(chunks)
+        return example_chunks
+
     def get_css(self, used_extensions: Set[Extension]) -> str:
-        all_css: str = ""
-        folders: Set[str] = set()
-        for extension in sorted(list(used_extensions), key=lambda e: e.folder):
-            if extension.folder.name not in folders:
-                folders.add(extension.folder.name)
-                css = extension.get_css()
-                if css:
-                    all_css += f"/* === {extension.folder.name} === */\n"
-                    all_css += css + "\n\n"
-        return all_css
+        return self.assets.get_css(used_extensions)
 
     def get_js(self, used_extensions: Set[Extension]) -> str:
-        all_js: str = ""
-        folders: Set[str] = set()
-        for extension in sorted(list(used_extensions), key=lambda e: e.folder):
-            if extension.folder.name not in folders:
-                folders.add(extension.folder.name)
-                all_js += extension.get_js() + "\n"
-        return all_js
+        return self.assets.get_js(used_extensions)
 
     def info(self):
         tree = Tree("Supermark Extensions")
@@ -443,15 +556,53 @@ class Core:
             ep_tree = tree.add(extension_point.name)
             for extension in extension_point.extensions.values():
                 ep_tree.add(str(extension))
+            # extensions that are not imported, from the manifest
+            for entry in self.manifest.get(extension_point.name, []):
+                if f"supermark.extensions.{entry['module']}" not in self.loaded_modules:
+                    ep_tree.add(
+                        "Extension at " + str(EXTENSIONS_FOLDER / entry["module"])
+                    )
         rich.print(tree)
 
+    def get_extension(self, name: str) -> Optional[Extension]:
+        """Returns an extension by its name, like yaml/figure, importing it if needed."""
+        prefix, _, key = name.partition("/")
+        if prefix not in NAME_PREFIXES:
+            return None
+        return self.extension_points[NAME_PREFIXES[prefix]].get_extension(key)
+
     def get_all_extensions(self) -> Sequence[Extension]:
+        self.load_all_extensions()
         extensions: List[Extension] = []
         for extension_point in self.extension_points.values():
             for extension in extension_point.extensions.values():
                 extensions.append(extension)
         return extensions
 
+    def create_manifest(self) -> Dict[str, Any]:
+        """Imports all extensions and lists the names under which they are found."""
+        manifest: Dict[str, Any] = {
+            "modules": [folder.name for folder in self._get_extension_folders()]
+        }
+        for extension in self.get_all_extensions():
+            extension_point = extension.extension_point
+            primary = extension.get_name().partition("/")[2]
+            extra_names = [
+                name
+                for name, other in getattr(
+                    extension_point, "extensions_with_extra_tags", {}
+                ).items()
+                if other is extension and name != primary
+            ]
+            manifest.setdefault(extension_point.name, []).append(
+                {"module": extension.folder.name, "names": [primary, *extra_names]}
+            )
+        for extension_point in self.extension_points:
+            manifest.get(extension_point, []).sort(
+                key=lambda entry: (entry["module"], entry["names"][0])
+            )
+        return manifest
+
 
 """
    Chunk  |- HTML
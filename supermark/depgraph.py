@@ -0,0 +1,94 @@
+import hashlib
+import json
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Set
+
+from .cache import write_atomic
+
+MISSING = "missing"
+
+
+class DependencyGraph:
+    """Records for each page the files it was built from, with their content hashes.
+
+    A page is rebuilt when one of its dependencies changed since the
+    last build. The graph is stored as JSON, so that it survives between builds.
+    """
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.pages: Dict[str, Dict[str, str]] = {}
+        self.hashes: Dict[Path, str] = {}
+        self.lock = Lock()
+        try:
+            with open(path, encoding="utf-8") as file:
+                self.pages = json.load(file)
+        except (OSError, ValueError):
+            self.pages = {}
+
+    def reset_hashes(self) -> None:
+        """Forget the hashes computed so far, needed when files may have changed."""
+        with self.lock:
+            self.hashes = {}
+
+    def get_file_hash(self, path: Path) -> str:
+        with self.lock:
+            if path in self.hashes:
+                return self.hashes[path]
+        try:
+            file_hash = hashlib.sha256(path.read_bytes()).hexdigest()
+        except OSError:
+            file_hash = MISSING
+        with self.lock:
+            self.hashes[path] = file_hash
+        return file_hash
+
+    def get_changed(self, source_file_path: Path) -> Optional[List[Path]]:
+        """Returns the dependencies of a page that changed since the last build,
+        or None if nothing is known about the page."""
+        with self.lock:
+            dependencies = self.pages.get(str(source_file_path))
+        if dependencies is None:
+            return None
+        return [
+            Path(dependency)
+            for dependency, file_hash in dependencies.items()
+            if self.get_file_hash(Path(dependency)) != file_hash
+        ]
+
+    def record(self, source_file_path: Path, dependencies: Iterable[Path]) -> None:
+        recorded = {
+            str(dependency.resolve()): self.get_file_hash(dependency)
+            for dependency in sorted(set(dependencies))
+        }
+        with self.lock:
+            self.pages[str(source_file_path)] = recorded
+
+    def get_dependents(self, path: Path) -> Set[Path]:
+        """All pages that depend on the given file."""
+        key = str(path.resolve())
+        with self.lock:
+            return {
+                Path(page)
+                for page, dependencies in self.pages.items()
+                if key in dependencies
+            }
+
+    def prune(self, source_file_paths: Iterable[Path]) -> None:
+        """Removes pages that do not exist anymore."""
+        keep = {str(path) for path in source_file_paths}
+        with self.lock:
+            self.pages = {
+                page: dependencies
+                for page, dependencies in self.pages.items()
+                if page in keep
+            }
+
+    def save(self) -> None:
+        with self.lock:
+            content = json.dumps(self.pages, indent=1, sort_keys=True)
+        try:
+            write_atomic(content, self.path)
+        except OSError:
+            pass
@@ -0,0 +1,189 @@
+import json
+import re
+import struct
+from pathlib import Path
+from threading import Lock
+from typing import BinaryIO, Dict, Optional, Tuple
+
+from .cache import write_atomic
+
+Dimensions = Tuple[int, int]
+
+# JPEG markers that start a frame and contain its size, all except DHT, JPG and DAC
+SOF_MARKERS = set(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+svg_tag_pattern = re.compile(rb"<svg\b[^>]*>", re.DOTALL)
+svg_attribute_pattern = re.compile(
+    rb'\s(width|height|viewBox)\s*=\s*["\']([^"\']*)["\']'
+)
+svg_length_pattern = re.compile(rb"^\s*([0-9.]+)\s*(px)?\s*$")
+
+
+def _png_dimensions(file: BinaryIO) -> Optional[Dimensions]:
+    header = file.read(24)
+    if len(header) < 24 or header[12:16] != b"IHDR":
+        return None
+    return struct.unpack(">II", header[16:24])
+
+
+def _gif_dimensions(file: BinaryIO) -> Optional[Dimensions]:
+    header = file.read(10)
+    if len(header) < 10:
+        return None
+    return struct.unpack("<HH", header[6:10])
+
+
+def _exif_orientation(data: bytes) -> Optional[int]:
+    if not data.startswith(b"Exif\x00\x00"):
+        return None
+    tiff = data[6:]
+    byte_order = {b"II": "<", b"MM": ">"}.get(tiff[:2])
+    if byte_order is None or len(tiff) < 8:
+        return None
+    offset = struct.unpack(byte_order + "I", tiff[4:8])[0]
+    if offset + 2 > len(tiff):
+        return None
+    count = struct.unpack(byte_order + "H", tiff[offset : offset + 2])[0]
+    for index in range(count):
+        entry = offset + 2 + index * 12
+        if entry + 12 > len(tiff):
+            return None
+        tag = struct.unpack(byte_order + "H", tiff[entry : entry + 2])[0]
+        if tag == 0x0112:
+            return struct.unpack(byte_order + "H", tiff[entry + 8 : entry + 10])[0]
+    return None
+
+
+def _jpeg_dimensions(file: BinaryIO) -> Optional[Dimensions]:
+    if file.read(2) != b"\xff\xd8":
+        return None
+    orientation = None
+    while True:
+        byte = file.read(1)
+        while byte == b"\xff":
+            # padding before the marker
+            byte = file.read(1)
+        if len(byte) == 0:
+            return None
+        marker = byte[0]
+        length_bytes = file.read(2)
+        if len(length_bytes) < 2:
+            return None
+        length = struct.unpack(">H", length_bytes)[0]
+        if marker in SOF_MARKERS:
+            data = file.read(5)
+            if len(data) < 5:
+                return None
+            height, width = struct.unpack(">HH", data[1:5])
+            if orientation in [5, 6, 7, 8]:
+                # browsers turn the image, as its EXIF data says
+                return height, width
+            return width, height
+        if marker == 0xE1 and orientation is None:
+            orientation = _exif_orientation(file.read(length - 2))
+        else:
+            file.seek(length - 2, 1)
+        # markers without length, like SOI or RST, do not appear before the frame
+
+
+def _svg_dimensions(file: BinaryIO) -> Optional[Dimensions]:
+    # the svg element is at the beginning, after an optional prolog and comments
+    match = svg_tag_pattern.search(file.read(8192))
+    if match is None:
+        return None
+    attributes = dict(svg_attribute_pattern.findall(match.group(0)))
+    width = svg_length_pattern.match(attributes.get(b"width", b""))
+    height = svg_length_pattern.match(attributes.get(b"height", b""))
+    if width is not None and height is not None:
+        return round(float(width.group(1))), round(float(height.group(1)))
+    view_box = attributes.get(b"viewBox", b"").replace(b",", b" ").split()
+    if len(view_box) == 4:
+        return round(float(view_box[2])), round(float(view_box[3]))
+    return None
+
+
+READERS = {
+    ".png": _png_dimensions,
+    ".gif": _gif_dimensions,
+    ".jpg": _jpeg_dimensions,
+    ".jpeg": _jpeg_dimensions,
+    ".svg": _svg_dimensions,
+}
+
+
+def read_dimensions(path: Path) -> Optional[Dimensions]:
+    """Reads width and height of an image from its header, without decoding it."""
+    reader = READERS.get(path.suffix.lower())
+    if reader is None:
+        return None
+    try:
+        with open(path, "rb") as file:
+            dimensions = reader(file)
+    except (OSError, ValueError, struct.error):
+        return None
+    if dimensions is None or dimensions[0] <= 0 or dimensions[1] <= 0:
+        return None
+    return dimensions
+
+
+class DimensionIndex:
+    """Width and height of the images used in pages, by path and modification time.
+
+    Stored as JSON in the cache folder, so that images are only read again
+    when they change.
+    """
+
+    def __init__(self, path: Optional[Path]) -> None:
+        self.path = path
+        # image -> (modification time, width, height), with 0 for images without size
+        self.images: Dict[str, Tuple[int, int, int]] = {}
+        self.lock = Lock()
+        if path is not None:
+            try:
+                with open(path, encoding="utf-8") as file:
+                    self.images = {
+                        image: tuple(entry) for image, entry in json.load(file).items()
+                    }
+            except (OSError, ValueError, AttributeError, TypeError):
+                self.images = {}
+
+    def get_dimensions(self, image: Path) -> Optional[Dimensions]:
+        try:
+            mtime = image.stat().st_mtime_ns
+        except OSError:
+            return None
+        key = str(image)
+        with self.lock:
+            entry = self.images.get(key)
+        if entry is None or entry[0] != mtime:
+            dimensions = read_dimensions(image) or (0, 0)
+            entry = (mtime, *dimensions)
+            with self.lock:
+                self.images[key] = entry
+        if entry[1] == 0:
+            return None
+        return entry[1], entry[2]
+
+    def get_attributes(self, image: Path) -> str:
+        """The attributes for an img element, so that it loads lazily without layout shift."""
+        dimensions = self.get_dimensions(image)
+        size = (
+            ""
+            if dimensions is None
+            else f'width="{dimensions[0]}" height="{dimensions[1]}" '
+        )
+        return size + 'loading="lazy" decoding="async"'
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self.lock:
+            content = json.dumps(
+                {image: list(entry) for image, entry in self.images.items()},
+                indent=1,
+                sort_keys=True,
+            )
+        try:
+            write_atomic(content, self.path)
+        except OSError:
+            pass
@@ -85,6 +85,8 @@ class YamlExtensionPoint(ChunkExtensionPoint):
     ) -> Optional[YAMLChunk]:
         if "/" in type:
             type = type.split("/")[0]
+        if type not in self.extensions_with_extra_tags:
+            self._load(type)
         if type in self.extensions_with_extra_tags:
             extension = self.extensions_with_extra_tags[type]
             if used_extensions is not None:
@@ -133,6 +135,8 @@ class TableClassExtensionPoint(ExtensionPoint):
     def get_table_class(
         self, type: str, used_extensions: Optional[Set[Extension]] = None
     ) -> Optional[TableClassExtension]:
+        if type not in self.extensions:
+            self._load(type)
         if type in self.extensions:
             extension = self.extensions[type]
             if used_extensions is not None:
@@ -194,6 +198,8 @@ class ParagraphExtensionPoint(ChunkExtensionPoint):
         report: Report,
         used_extensions: Optional[Set[Extension]] = None,
     ) -> Optional[MarkdownChunk]:
+        if tag not in self.extensions_with_extra_tags:
+            self._load(tag)
         if tag in self.extensions_with_extra_tags:
             extension = self.extensions_with_extra_tags[tag]
             if used_extensions is not None:
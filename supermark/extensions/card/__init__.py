@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Set
 
 from ... import (
     Builder,
@@ -9,7 +9,9 @@ from ... import (
     YamlExtension,
     YAMLGroupChunk,
     get_placeholder_uri_str,
+    is_placeholder,
 )
+from ...cache import digest
 
 
 class CardExtension(YamlExtension):
@@ -50,6 +52,21 @@ class CardGroup(YAMLGroupChunk):
     def finish(self):
         ...
 
+    def get_dependencies(self) -> Set[Path]:
+        dependencies = super().get_dependencies()
+        for chunk in self.chunks:
+            dependencies |= chunk.get_dependencies()
+        return dependencies
+
+    def get_cache_source(self) -> Optional[str]:
+        sources: List[str] = []
+        for chunk in self.chunks:
+            source = chunk.get_cache_source()
+            if source is None:
+                return None
+            sources.append(source)
+        return digest(super().get_cache_source(), *sources)
+
     def to_html(self, builder: Builder, target_file_path: Path) -> Optional[str]:
         html: List[str] = []
         columns = self.dictionary["columns"] if "columns" in self.dictionary else 2
@@ -100,6 +117,30 @@ class Card(YAMLChunk):
     def get_group(self) -> Any:
         return CardGroup(self.raw_chunk, {"type": "cards"}, self.page_variables)
 
+    def get_cache_source(self) -> Optional[str]:
+        if self.dictionary["type"] == "card/person":
+            # copies the image during to_html
+            return None
+        return super().get_cache_source()
+
+    def _get_image_path(self) -> Optional[Path]:
+        image = self.dictionary.get("image", "")
+        if (
+            self.dictionary["type"] != "card/person"
+            or image == ""
+            or is_placeholder(image)
+        ):
+            return None
+        return (self.raw_chunk.path.parent / Path(image)).resolve()
+
+    def get_dependencies(self) -> Set[Path]:
+        dependencies = super().get_dependencies()
+        image_path = self._get_image_path()
+        if image_path is not None:
+            # its size is part of the HTML
+            dependencies.add(image_path)
+        return dependencies
+
     def _placeholder(self, src: str) -> str:
         if src.startswith("_placeholder"):
             return get_placeholder_uri(80, 80)
@@ -118,9 +159,15 @@ class Card(YAMLChunk):
             '<div class="card border-0 person-card h-100" style="max-width: 540px;">'
         )
         html.append('    <div class="row g-0">')
+        file_path = (self.raw_chunk.path.parent / Path(img)).resolve()
+        attributes = ""
+        if file_path.exists():
+            attributes = " " + builder.dimension_index.get_attributes(file_path)
+        elif not is_placeholder(img):
+            attributes = ' loading="lazy" decoding="async"'
         html.append('        <div class="col-md-3">')
         html.append(
-            f'            <img src="{get_placeholder_uri_str(img)}" class="img-fluid" alt="Photo of {name}">'
+            f'            <img src="{get_placeholder_uri_str(img)}"{attributes} class="img-fluid" alt="Photo of {name}">'
         )
         html.append("        </div>")
         html.append('        <div class="col-md-9">')
@@ -137,7 +184,6 @@ class Card(YAMLChunk):
         html.append("        </div>")
         html.append("</div>")
 
-        file_path = (self.raw_chunk.path.parent / Path(img)).resolve()
         if file_path.exists():
             builder.copy_resource(self.raw_chunk, file_path)
 
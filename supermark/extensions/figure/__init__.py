@@ -1,6 +1,5 @@
 from pathlib import Path
-from typing import Any, Dict, Optional, List
-from shutil import copyfile
+from typing import Any, Dict, Optional, List, Set
 
 from ... import (
     Builder,
@@ -12,6 +11,7 @@ from ... import (
     is_placeholder,
     get_placeholder_uri_str,
 )
+from ...variants import ResponsiveImage
 
 
 class FigureExtension(YamlExtension):
@@ -62,34 +62,63 @@ class Figure(YAMLChunk):
                 ),
             )
 
+    def get_cache_source(self) -> Optional[str]:
+        # copies the figure file during to_html
+        return None
+
+    def get_dependencies(self) -> Set[Path]:
+        dependencies = super().get_dependencies()
+        if self.file_path is not None:
+            # its size and variants are part of the HTML
+            dependencies.add(self.file_path)
+        return dependencies
+
     def _get_target_relative_path(
-        self, builder: Builder, target_file_path: Path
+        self, builder: Builder, target_file_path: Path, file_path: Optional[Path] = None
     ) -> str:
         # TODO this can be simplified
-        path = self.file_path.relative_to(builder.input_path)
+        if file_path is None:
+            file_path = self.file_path
+        path = file_path.relative_to(builder.input_path)
         target = builder.output_path / path
         return str(target.relative_to(target_file_path.parent))
 
+    def _get_variants(
+        self, builder: Builder, file_path: Optional[Path]
+    ) -> Optional[ResponsiveImage]:
+        if (
+            file_path is None
+            or builder.image_pipeline is None
+            or not file_path.exists()
+        ):
+            return None
+        return builder.image_pipeline.get_variants(
+            file_path,
+            builder.output_path / file_path.relative_to(builder.input_path),
+        )
+
+    def _find_file(self, builder: Builder) -> Path:
+        """The figure file, or the one the image index finds for it if it was moved.
+
+        The input folder is not changed, the page uses the found file.
+        """
+        if self.file_path.exists() or builder.image_index is None:
+            return self.file_path
+        other_file = builder.image_index.lookup(self.file_path)
+        if other_file is None or not other_file.exists():
+            return self.file_path
+        self.tell(
+            f"Figure file {str(self.file_path)} does not exist, using matching file {other_file}.",
+            level=self.WARNING,
+        )
+        return other_file.resolve()
+
     def to_html(self, builder: Builder, target_file_path: Path):
+        file_path = None
         if self.file_path is not None:
-            if not self.file_path.exists():
-                if builder.core.image_file_locator is not None:
-                    # try to find the file in another place
-                    other_file = builder.core.image_file_locator.lookup(self.file_path)
-                    if other_file is not None:
-                        target = (
-                            self.raw_chunk.path.parent / "figures" / self.file_path.name
-                        )
-                        if not target.exists():
-                            target.parent.mkdir(exist_ok=True)
-                            self.tell(
-                                f"Found matching file {other_file} and copied it to {target}.",
-                                level=self.WARNING,
-                            )
-                            copyfile(other_file, target)
-                            # TODO should we rewrite the source file path in the original chunk?
-            if self.file_path.exists():
-                builder.copy_resource(self.raw_chunk, self.file_path)
+            file_path = self._find_file(builder)
+            if file_path.exists():
+                builder.copy_resource(self.raw_chunk, file_path)
             else:
                 self.tell(
                     f"Figure file {str(self.file_path)} does not exist.",
@@ -98,8 +127,8 @@ class Figure(YAMLChunk):
 
         alt = self.dictionary.get("caption", "")
         src = None
-        if self.file_path is not None:
-            src = self._get_target_relative_path(builder, target_file_path)
+        if file_path is not None:
+            src = self._get_target_relative_path(builder, target_file_path, file_path)
         elif "link" in self.dictionary:
             src = self.dictionary["link"]
         elif self.placeholder:
@@ -108,9 +137,32 @@ class Figure(YAMLChunk):
         html.append('<figure class="figure">')
         if "link" in self.dictionary:
             html.append(f'  <a href="{self.dictionary["link"]}">')
-        html.append(
-            f'    <img src="{src}" class="figure-img img-fluid rounded" alt="{alt}">'
-        )
+        attributes = ' loading="lazy" decoding="async"'
+        if file_path is not None:
+            attributes = " " + builder.dimension_index.get_attributes(file_path)
+        elif self.placeholder:
+            # placeholders are part of the page
+            attributes = ""
+        variants = self._get_variants(builder, file_path)
+        if variants is None:
+            html.append(
+                f'    <img src="{src}"{attributes} class="figure-img img-fluid rounded" alt="{alt}">'
+            )
+        else:
+            html.append("    <picture>")
+            if variants.webp:
+                html.append(
+                    f'      <source type="image/webp" srcset="{variants.get_srcset(src, webp=True)}" sizes="{variants.sizes}">'
+                )
+            srcset = ""
+            if len(variants.widths) > 0:
+                srcset = (
+                    f' srcset="{variants.get_srcset(src)}" sizes="{variants.sizes}"'
+                )
+            html.append(
+                f'      <img src="{src}"{srcset}{attributes} class="figure-img img-fluid rounded" alt="{alt}">'
+            )
+            html.append("    </picture>")
         if "link" in self.dictionary:
             html.append("  </a>")
         # if "caption" in self.dictionary:
@@ -1,5 +1,5 @@
 from pathlib import Path
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from ... import Builder, ParagraphExtension, RawChunk, YAMLChunk, YamlExtension
 
@@ -46,6 +46,12 @@ class Hint(YAMLChunk):
             )
             self.hint = ""
 
+    def get_cache_source(self) -> Optional[str]:
+        if self.image_file is not None:
+            # copies the image during to_html
+            return None
+        return super().get_cache_source()
+
     def to_html(self, builder: Builder, target_file_path: Path):
         html: List[str] = []
         html.append(f'<button class="w3collapsible">{self.title}</button>')
@@ -1,10 +1,11 @@
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Set
+from typing import Any, Dict, List, Optional, Sequence, Set
 
 import wikitextparser as wtp
 from wikitextparser._table import Cell
 
 from ... import Builder, Chunk, RawChunk, YAMLChunk, YamlExtension
+from ...cache import digest
 from ...extend import Extension, TableClassExtension
 
 
@@ -42,6 +43,9 @@ class Table(YAMLChunk):
         else:
             self.div_class = None
 
+        self.file_path: Optional[Path] = None
+        self.parsed_table: Optional[wtp.Table] = None
+        self.table_parsed = False
         if self.has_post_yaml():
             self.table_raw = self.get_post_yaml()
         elif "file" in dictionary:
@@ -51,6 +55,7 @@ class Table(YAMLChunk):
                 file_path = (
                     raw_chunk.path.parent.parent / dictionary["file"]
                 ).resolve()
+            self.file_path = file_path
             if not file_path.exists():
                 self.error(f"Table file {file_path} does not exist.")
                 self.ok = False
@@ -61,6 +66,18 @@ class Table(YAMLChunk):
             self.error("Table must either refer to a file or have a post-yaml section.")
             self.ok = False
 
+    def get_dependencies(self) -> Set[Path]:
+        dependencies = super().get_dependencies()
+        if self.file_path is not None:
+            dependencies.add(self.file_path)
+        return dependencies
+
+    def get_cache_source(self) -> Optional[str]:
+        if not self.ok:
+            return None
+        # the table may come from a file
+        return digest(super().get_cache_source(), self.table_raw)
+
     def add_used_extension(self, used_extensions: Set[Extension], core: Any):
         if self.div_class is not None:
             self.table_extension: Optional[
@@ -73,17 +90,32 @@ class Table(YAMLChunk):
         else:
             self.table_extension = None
 
-    def _cell_to_html(
-        self, cell: str, source_format: str, empty_cell: str, builder: Builder
-    ) -> str:
-        if len(cell) == 0:
-            return empty_cell
-        elif source_format == "html":
-            return cell
-        else:
-            return builder.convert(
-                cell, target_format="html", source_format=source_format
+    def get_table(self) -> Optional[wtp.Table]:
+        """The first table in the source, parsed once for HTML and LaTeX."""
+        if not self.table_parsed:
+            tables = wtp.parse(self.table_raw).tables
+            self.parsed_table = tables[0] if len(tables) > 0 else None
+            self.table_parsed = True
+        return self.parsed_table
+
+    def _cells_to_html(
+        self,
+        cells: Sequence[str],
+        source_format: str,
+        empty_cell: str,
+        builder: Builder,
+    ) -> List[str]:
+        if source_format == "html":
+            return [empty_cell if len(cell) == 0 else cell for cell in cells]
+        # all cells of the table are converted in one pass
+        converted = iter(
+            builder.convert_all(
+                [cell for cell in cells if len(cell) > 0],
+                target_format="html",
+                source_format=source_format,
             )
+        )
+        return [empty_cell if len(cell) == 0 else next(converted) for cell in cells]
 
     def _cellwise_to_html(
         self, source_format: str, empty_cell: str, builder: Builder
@@ -104,14 +136,21 @@ class Table(YAMLChunk):
             return ""
 
         output: List[str] = []
-        parsed = wtp.parse(self.table_raw)
-        if len(parsed.tables) == 0:
+        table = self.get_table()
+        if table is None:
             self.error(
                 "No table found. The table must be the first table in the file. Maybe it is not formatted correctly?"
             )
-            print(parsed)
             return ""
-        rows = parsed.tables[0].cells(span=False)
+        rows = table.cells(span=False)
+        converted = iter(
+            self._cells_to_html(
+                [cell.value.strip() for row in rows for cell in row],
+                source_format,
+                empty_cell,
+                builder,
+            )
+        )
         if self.div_class:
             output.append(f'<table class="{self.div_class} table table-sm">')
         else:
@@ -119,9 +158,7 @@ class Table(YAMLChunk):
         for row in rows:
             output.append("<tr>")
             for cell in row:
-                c = self._cell_to_html(
-                    cell.value.strip(), source_format, empty_cell, builder
-                )
+                c = next(converted)
                 if cell.is_header:
                     output.append(
                         "<th"
@@ -185,8 +222,11 @@ class Table(YAMLChunk):
                   }"""
 
     def to_latex(self, builder: Builder) -> str:
-        parsed = wtp.parse(self.table_raw)
-        rows = parsed.tables[0].data()
+        table = self.get_table()
+        if table is None:
+            self.error("No table found.")
+            return ""
+        rows = table.data()
         rowspec = ""
         for _ in rows[0]:
             rowspec = rowspec + "L"
@@ -199,14 +239,15 @@ class Table(YAMLChunk):
             self.dictionary["format"] if "format" in self.dictionary else "mediawiki"
         )
 
+        converted = iter(
+            builder.convert_all(
+                [x for row in rows for x in row],
+                target_format="latex",
+                source_format=source_format,
+            )
+        )
         for row in rows:
-            resolved_row: List[str] = []
-            for x in row:
-                resolved_row.append(
-                    builder.convert(
-                        x, target_format="latex", source_format=source_format
-                    )
-                )
+            resolved_row: List[str] = [next(converted) for _ in row]
             latex.append("&".join(resolved_row) + "\\\\")
         latex.append("\\bottomrule")
         latex.append("\\end{tabulary}")
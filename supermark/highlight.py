@@ -0,0 +1,193 @@
+from functools import lru_cache
+from html import escape
+from typing import Dict, List, Optional, Tuple
+
+from pygments.lexer import Lexer
+from pygments.lexers import get_lexer_by_name
+from pygments.token import (
+    Comment,
+    Error,
+    Generic,
+    Keyword,
+    Name,
+    Number,
+    Operator,
+    Punctuation,
+    String,
+    _TokenType,
+)
+from pygments.util import ClassNotFound
+
+HIGHLIGHTERS = ["pygments", "pandoc"]
+
+# The classes of Pandoc's highlighter (skylighting), which code.css styles.
+# Token types that are not listed use the class of their parent.
+TOKEN_CLASSES = {
+    Keyword: "kw",
+    Keyword.Constant: "cn",
+    Keyword.Namespace: "im",
+    Keyword.Type: "dt",
+    Name.Attribute: "at",
+    Name.Builtin: "bu",
+    Name.Constant: "cn",
+    Name.Decorator: "at",
+    Name.Function: "fu",
+    Name.Tag: "kw",
+    Name.Variable: "va",
+    String: "st",
+    String.Char: "ch",
+    String.Doc: "do",
+    String.Escape: "sc",
+    String.Interpol: "ss",
+    String.Regex: "ss",
+    Number: "dv",
+    Number.Bin: "bn",
+    Number.Float: "fl",
+    Number.Hex: "bn",
+    Number.Oct: "bn",
+    Operator: "op",
+    Operator.Word: "kw",
+    Comment: "co",
+    Comment.Preproc: "pp",
+    Comment.PreprocFile: "pp",
+    Comment.Special: "cv",
+    Generic.Error: "er",
+    Generic.Heading: "fu",
+    Generic.Subheading: "fu",
+    Error: "er",
+}
+
+# Where the grammars of skylighting differ from the lexers of Pygments, by lexer name.
+# None means that skylighting marks these tokens with no class.
+LANGUAGE_TOKEN_CLASSES: Dict[str, Dict[_TokenType, Optional[str]]] = {
+    "bash": {Punctuation: "kw"},
+    "java": {Keyword.Constant: "kw", Punctuation: "op"},
+    "javascript": {Punctuation: "op"},
+    "python": {
+        Keyword.Constant: "va",
+        Name.Builtin.Pseudo: "va",
+        Name.Function: None,
+    },
+}
+
+# Punctuation that skylighting leaves without a class, by lexer name.
+UNMARKED = {
+    "javascript": {"(", ")", "[", "]", "{", "}"},
+    "python": {"."},
+}
+
+# Pygments has no token type for control flow, which skylighting marks as cf.
+CONTROL_FLOW = {
+    "break",
+    "case",
+    "catch",
+    "continue",
+    "default",
+    "do",
+    "done",
+    "elif",
+    "else",
+    "except",
+    "fi",
+    "finally",
+    "for",
+    "goto",
+    "if",
+    "raise",
+    "return",
+    "switch",
+    "then",
+    "throw",
+    "try",
+    "while",
+    "yield",
+}
+
+
+@lru_cache(maxsize=None)
+def get_lexer(lang: str) -> Optional[Lexer]:
+    """Returns the lexer for a language, or None if Pygments does not know it.
+
+    Lexers keep no state between calls of get_tokens, so one instance
+    per language is shared by all pages and threads.
+    """
+    try:
+        # keep empty lines at the beginning, like Pandoc does
+        return get_lexer_by_name(lang, stripnl=False, ensurenl=False)
+    except ClassNotFound:
+        return None
+
+
+@lru_cache(maxsize=None)
+def get_token_class(token_type: _TokenType, name: str = "") -> Optional[str]:
+    overrides = LANGUAGE_TOKEN_CLASSES.get(name, {})
+    while token_type is not None:
+        if token_type in overrides:
+            return overrides[token_type]
+        if token_type in TOKEN_CLASSES:
+            return TOKEN_CLASSES[token_type]
+        token_type = token_type.parent
+    return None
+
+
+def _escape(text: str) -> str:
+    return escape(text).replace("&#x27;", "&#39;")
+
+
+def highlight_html(code: str, lang: str) -> Optional[str]:
+    """Highlights code with the markup that Pandoc creates with `--highlight-style`.
+
+    Returns None if there is no lexer for the language.
+    """
+    code = code.rstrip("\n")
+    if lang == "":
+        return f"<pre><code>{_escape(code)}</code></pre>"
+    lexer = get_lexer(lang)
+    if lexer is None:
+        return None
+    name = lexer.aliases[0] if lexer.aliases else lang
+    # pieces of text with their class, per line
+    lines: List[List[Tuple[Optional[str], str]]] = [[]]
+    # with the last newline, which some lexers need to end a comment
+    for token_type, value in lexer.get_tokens(code + "\n"):
+        css_class = get_token_class(token_type, name)
+        if value in UNMARKED.get(name, ()):
+            css_class = None
+        elif css_class == "kw" and value in CONTROL_FLOW:
+            css_class = "cf"
+        elif css_class == "fl" and value.isdigit():
+            # some lexers, like the one for JavaScript, treat all numbers as floats
+            css_class = "dv"
+        for index, part in enumerate(value.split("\n")):
+            if index > 0:
+                lines.append([])
+            if part == "":
+                continue
+            line = lines[-1]
+            if len(line) > 0 and line[-1][0] == css_class:
+                # one span for neighbouring tokens of the same class
+                line[-1] = (css_class, line[-1][1] + part)
+            else:
+                line.append((css_class, part))
+    lines.pop()
+    html: List[str] = []
+    for number, line in enumerate(lines, start=1):
+        line_id = f"cb1-{number}"
+        html.append(
+            f'<span id="{line_id}"><a href="#{line_id}" aria-hidden="true" tabindex="-1"></a>'
+            + "".join(
+                (
+                    _escape(text)
+                    if css_class is None
+                    else f'<span class="{css_class}">{_escape(text)}</span>'
+                )
+                for css_class, text in line
+            )
+            + "</span>"
+        )
+    return (
+        f'<div class="sourceCode" id="cb1"><pre class="sourceCode {lang}">'
+        + f'<code class="sourceCode {name}">'
+        + "\n".join(html)
+        + "</code></pre></div>"
+    )
@@ -1,8 +1,25 @@
+import json
+import re
 import xml.etree.ElementTree as ET
 from pathlib import Path
-from typing import Dict, Optional
+from threading import Lock
+from typing import Dict, Optional, Tuple
+
+# the icons of bootstrap-icons.svg as svg elements, precompiled by write_icon_index
+INDEX_FILE = Path(__file__).parent / "data/bootstrap-icons.json"
 
 icons: Dict[str, str] = {}
+# (icon, size) -> svg with width and height
+sized_icons: Dict[Tuple[str, str], str] = {}
+icons_lock = Lock()
+
+# an icon as returned by get_icon, with the size and name of the icon
+icon_pattern = re.compile(
+    r'<svg (?:width="([^"]*)" height="[^"]*" )?xmlns="http://www.w3.org/2000/svg"'
+    r' class="bi bi-([\w-]+)"[^>]*>.*?</svg>',
+    re.DOTALL,
+)
+view_box_pattern = re.compile(r'viewBox="([^"]*)"')
 
 
 def load_bootstrap_icons():
@@ -47,16 +64,76 @@ def load_bootstrap_icons():
     # print(icons.keys())
 
 
+def load_icon_index():
+    """Loads the icons from the precompiled index, or from the SVG file without one."""
+    try:
+        with open(INDEX_FILE, encoding="utf-8") as file:
+            icons.update(json.load(file))
+    except (OSError, ValueError):
+        load_bootstrap_icons()
+
+
+def write_icon_index():
+    """Creates the index of icons, after bootstrap-icons.svg was updated."""
+    load_bootstrap_icons()
+    with open(INDEX_FILE, "w", encoding="utf-8") as file:
+        json.dump(icons, file, separators=(",", ":"), sort_keys=True)
+
+
 def get_icon(icon: str, size: Optional[str] = None) -> str:
     if len(icons) == 0:
-        load_bootstrap_icons()
+        with icons_lock:
+            if len(icons) == 0:
+                load_icon_index()
     if icon in icons:
         svg = icons[icon]
         if size is not None:
-            return svg.replace("xmlns=", f'width="{size}" height="{size}" xmlns=')
+            key = (icon, size)
+            if key not in sized_icons:
+                sized_icons[key] = svg.replace(
+                    "xmlns=", f'width="{size}" height="{size}" xmlns='
+                )
+            return sized_icons[key]
         return svg
 
     return ""
 
 
-load_bootstrap_icons()
+def _get_symbol(icon: str) -> str:
+    svg = icons[icon]
+    view_box = view_box_pattern.search(svg)
+    content = svg[svg.index(">") + 1 : svg.rindex("</svg>")]
+    view_box_attribute = "" if view_box is None else f' viewBox="{view_box.group(1)}"'
+    return f'<symbol id="bi-{icon}"{view_box_attribute}>{content}</symbol>'
+
+
+def use_sprites(html: str) -> str:
+    """Replaces the icons in a page by references to symbols, in a sheet at the start.
+
+    Each icon is then only included once per page, however often it is used.
+    """
+    used: Dict[str, str] = {}
+
+    def replace(match: re.Match) -> str:
+        size, icon = match.group(1), match.group(2)
+        if match.group(0) != get_icon(icon, size):
+            # an svg that looks like an icon, but was written by hand
+            return match.group(0)
+        if icon not in used:
+            used[icon] = _get_symbol(icon)
+        view_box = view_box_pattern.search(match.group(0))
+        attributes = "" if size is None else f'width="{size}" height="{size}" '
+        attributes += f'class="bi bi-{icon}"'
+        if view_box is not None:
+            attributes += f' viewBox="{view_box.group(1)}"'
+        return f'<svg {attributes}><use href="#bi-{icon}"/></svg>'
+
+    html = icon_pattern.sub(replace, html)
+    if len(used) == 0:
+        return html
+    sheet = (
+        '<svg xmlns="http://www.w3.org/2000/svg" style="display: none">'
+        + "".join(used.values())
+        + "</svg>\n"
+    )
+    return sheet + html
@@ -0,0 +1,210 @@
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from .cache import write_atomic
+
+IMAGE_SUFFIXES = [".jpeg", ".jpg", ".png", ".svg", ".gif"]
+
+# size, modification time in nanoseconds and content hash of an image
+ImageEntry = Tuple[int, int, str]
+
+
+def hash_file(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+class ImageIndex:
+    """All images in the input folder, to find figures that were moved or renamed.
+
+    For each folder, the index stores its modification time and its images
+    with their size and content hash. Renaming, adding or removing a file
+    changes the modification time of its folder, so an update only lists
+    the folders whose time changed and reuses everything else. Images
+    are hashed when they are first seen. (Editing an image does not change
+    the time of its folder, so its hash can be outdated, which only matters
+    when looking for a renamed copy of it.) The index is stored as JSON,
+    and keeps the hashes of images that disappeared, so that a figure
+    that points to an old path can be found under its new name.
+    """
+
+    def __init__(self, root: Path, path: Optional[Path]) -> None:
+        self.root = root
+        self.path = path
+        # folder relative to the root -> (modification time, subfolders, images)
+        self.folders: Dict[str, Tuple[int, List[str], Dict[str, ImageEntry]]] = {}
+        # images that disappeared -> (size, content hash)
+        self.removed: Dict[str, Tuple[int, str]] = {}
+        self.by_path: Dict[str, ImageEntry] = {}
+        self.by_name: Dict[str, List[str]] = {}
+        self.by_hash: Dict[str, List[str]] = {}
+        self.lock = Lock()
+        if path is not None:
+            try:
+                with open(path, encoding="utf-8") as file:
+                    data = json.load(file)
+                self.folders = {
+                    folder: (
+                        mtime,
+                        list(subfolders),
+                        {name: tuple(entry) for name, entry in images.items()},
+                    )
+                    for folder, (mtime, subfolders, images) in data["folders"].items()
+                }
+                self.removed = {
+                    image: tuple(entry) for image, entry in data["removed"].items()
+                }
+            except (OSError, ValueError, KeyError, TypeError, AttributeError):
+                self.folders = {}
+                self.removed = {}
+        self._index()
+
+    def _join(self, folder: str, name: str) -> str:
+        return name if folder == "" else f"{folder}/{name}"
+
+    def _scan_folder(
+        self, folder: str, mtime: int, to_hash: List[Tuple[str, str, int, int]]
+    ) -> None:
+        previous = self.folders.get(folder, (0, [], {}))[2]
+        subfolders: List[str] = []
+        images: Dict[str, ImageEntry] = {}
+        with os.scandir(self.root / folder) as entries:
+            for entry in entries:
+                if entry.name.startswith("."):
+                    continue
+                if entry.is_dir(follow_symlinks=False):
+                    subfolders.append(entry.name)
+                elif os.path.splitext(entry.name)[1].lower() in IMAGE_SUFFIXES:
+                    stat = entry.stat()
+                    old = previous.get(entry.name)
+                    if old is not None and old[:2] == (stat.st_size, stat.st_mtime_ns):
+                        images[entry.name] = old
+                    else:
+                        to_hash.append(
+                            (folder, entry.name, stat.st_size, stat.st_mtime_ns)
+                        )
+        self.folders[folder] = (mtime, sorted(subfolders), images)
+
+    def update(self) -> Tuple[int, int]:
+        """Brings the index up to date with the files on disk.
+
+        Returns the number of folders listed again, and of all folders.
+        """
+        with self.lock:
+            before = {
+                self._join(folder, name): (entry[0], entry[2])
+                for folder, (_, _, images) in self.folders.items()
+                for name, entry in images.items()
+            }
+            to_hash: List[Tuple[str, str, int, int]] = []
+            visited: List[str] = []
+            scanned = 0
+            pending = [""]
+            while len(pending) > 0:
+                folder = pending.pop()
+                try:
+                    mtime = os.stat(self.root / folder).st_mtime_ns
+                    if folder not in self.folders or self.folders[folder][0] != mtime:
+                        self._scan_folder(folder, mtime, to_hash)
+                        scanned += 1
+                except OSError:
+                    continue
+                visited.append(folder)
+                pending.extend(
+                    self._join(folder, name) for name in self.folders[folder][1]
+                )
+            self.folders = {folder: self.folders[folder] for folder in visited}
+            if len(to_hash) > 0:
+                paths = [
+                    str(self.root / self._join(folder, name))
+                    for folder, name, _, _ in to_hash
+                ]
+                with ThreadPoolExecutor() as executor:
+                    hashes = list(executor.map(self._hash_or_none, paths))
+                for (folder, name, size, mtime), file_hash in zip(to_hash, hashes):
+                    if file_hash is not None:
+                        self.folders[folder][2][name] = (size, mtime, file_hash)
+            self._index()
+            for image, entry in before.items():
+                if image not in self.by_path:
+                    self.removed[image] = entry
+            self.removed = {
+                image: entry
+                for image, entry in self.removed.items()
+                if image not in self.by_path
+            }
+            return scanned, len(self.folders)
+
+    def _hash_or_none(self, path: str) -> Optional[str]:
+        try:
+            return hash_file(path)
+        except OSError:
+            return None
+
+    def _index(self) -> None:
+        self.by_path = {}
+        self.by_name = {}
+        self.by_hash = {}
+        for folder in sorted(self.folders):
+            for name, entry in sorted(self.folders[folder][2].items()):
+                image = self._join(folder, name)
+                self.by_path[image] = entry
+                self.by_name.setdefault(name, []).append(image)
+                self.by_hash.setdefault(entry[2], []).append(image)
+
+    def _closest(self, images: List[str], image: str) -> str:
+        # the image with the longest common path, so that a copy
+        # next to the page wins over one in another part of the site
+        return max(
+            images,
+            key=lambda other: len(os.path.commonpath([other, image])),
+        )
+
+    def find_by_hash(self, file_hash: str) -> List[Path]:
+        with self.lock:
+            return [self.root / image for image in self.by_hash.get(file_hash, [])]
+
+    def find_by_name(self, name: str) -> List[Path]:
+        with self.lock:
+            return [self.root / image for image in self.by_name.get(name, [])]
+
+    def lookup(self, path: Path) -> Optional[Path]:
+        """Finds an image for a path that does not exist (anymore).
+
+        An image with the content that the path had in an earlier build is
+        preferred, otherwise an image with the same name is returned.
+        """
+        try:
+            image = path.resolve().relative_to(self.root.resolve()).as_posix()
+        except ValueError:
+            image = path.name
+        with self.lock:
+            candidates: List[str] = []
+            if image in self.removed:
+                candidates = self.by_hash.get(self.removed[image][1], [])
+            if len(candidates) == 0:
+                candidates = self.by_name.get(path.name, [])
+            if len(candidates) == 0:
+                return None
+            return self.root / self._closest(candidates, image)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self.lock:
+            content = json.dumps(
+                {"folders": self.folders, "removed": self.removed},
+                sort_keys=True,
+            )
+        try:
+            write_atomic(content, self.path)
+        except OSError:
+            pass
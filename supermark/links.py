@@ -0,0 +1,81 @@
+import json
+import re
+from pathlib import Path
+from threading import Lock
+from typing import Dict, Iterable, Optional, Set
+
+from .cache import write_atomic
+
+# ids of elements, and names of anchor elements, are targets of links
+anchor_pattern = re.compile(r'\sid="([^"]+)"|<a\s[^>]*?name="([^"]+)"')
+
+
+def find_anchor_ids(html: str) -> Set[str]:
+    return {id or name for id, name in anchor_pattern.findall(html)}
+
+
+class LinkIndex:
+    """All pages and files of the output, with the anchors that each page contains.
+
+    Pages are named by their path relative to the input folder, like
+    local links (`sub/page.html`). The anchors are collected from the HTML
+    of each page when it is built, and stored as JSON, so that pages that
+    are not rebuilt keep their anchors. For a page built before the index
+    existed, the anchors are unknown, and all anchors are accepted.
+    """
+
+    def __init__(self, path: Optional[Path]) -> None:
+        self.path = path
+        self.pages: Dict[str, Optional[Set[str]]] = {}
+        self.files: Set[str] = set()
+        self.lock = Lock()
+        if path is not None:
+            try:
+                with open(path, encoding="utf-8") as file:
+                    self.pages = {
+                        page: set(anchors) for page, anchors in json.load(file).items()
+                    }
+            except (OSError, ValueError, AttributeError, TypeError):
+                self.pages = {}
+
+    def set_pages(self, pages: Iterable[str]) -> None:
+        """Sets the pages of the site, keeping the anchors known for them."""
+        with self.lock:
+            self.pages = {page: self.pages.get(page) for page in pages}
+
+    def add_page(self, page: str, html: str) -> None:
+        anchors = find_anchor_ids(html)
+        with self.lock:
+            self.pages[page] = anchors
+
+    def add_file(self, file: str) -> None:
+        with self.lock:
+            self.files.add(file)
+
+    def has_target(self, target: str) -> bool:
+        return target in self.pages or target in self.files
+
+    def has_page(self, page: str) -> bool:
+        return page in self.pages
+
+    def has_anchor(self, page: str, anchor: str) -> bool:
+        anchors = self.pages.get(page)
+        return anchors is None or anchor in anchors
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        with self.lock:
+            content = json.dumps(
+                {
+                    page: sorted(anchors)
+                    for page, anchors in self.pages.items()
+                    if anchors is not None
+                },
+                indent=1,
+                sort_keys=True,
+            )
+        try:
+            write_atomic(content, self.path)
+        except OSError:
+            pass
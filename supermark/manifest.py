@@ -0,0 +1,25 @@
+"""Writes the manifest of the extensions, which tells the core which module
+provides an extension, so that modules are only imported when a page uses them,
+and the index of icons. Run it after adding an extension, changing the names
+of one, or updating bootstrap-icons.svg:
+
+    python3 -m supermark.manifest
+"""
+
+import json
+
+from .core import MANIFEST_FILE, Core
+from .icons import write_icon_index
+from .report import Report
+
+
+def write_manifest() -> None:
+    core = Core(Report())
+    with open(MANIFEST_FILE, "w", encoding="utf-8") as file:
+        json.dump(core.create_manifest(), file, indent=1)
+        file.write("\n")
+
+
+if __name__ == "__main__":
+    write_manifest()
+    write_icon_index()
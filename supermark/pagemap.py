@@ -1,12 +1,127 @@
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Sequence, Union
+from typing import Any, Dict, List, Optional, Sequence, Set, Union
 
-from .chunks import MarkdownChunk
+import yaml
+
+from .chunks import Chunk, MarkdownChunk, SafeLoader
 from .core import Core
+from .parse import (
+    ParserState,
+    code_start,
+    code_stop,
+    html_start,
+    html_stop,
+    is_empty,
+    yaml_start,
+    yaml_stop,
+)
 from .report import Report
 
 
+def find_title(chunks: Sequence[Chunk]) -> Optional[str]:
+    """The first heading of a page that is already parsed."""
+    for chunk in chunks:
+        if isinstance(chunk, MarkdownChunk):
+            for anchor in chunk.find_anchors():
+                return anchor.strip()
+    return None
+
+
+def _get_yaml_reference(source_file_path: Path, lines: List[str]) -> Optional[Path]:
+    if not any(line.startswith("ref:") for line in lines):
+        return None
+    try:
+        dictionary = yaml.load("".join(lines), Loader=SafeLoader)
+    except yaml.YAMLError:
+        return None
+    if isinstance(dictionary, dict) and "ref" in dictionary:
+        return (source_file_path.parent / dictionary["ref"]).resolve()
+    return None
+
+
+def scan_title(
+    source_file_path: Path, visited: Optional[Set[Path]] = None
+) -> Optional[str]:
+    """Finds the first heading of a page without parsing the whole page.
+
+    Reads the file only up to the first heading. It follows the states of
+    the parser, so headings within YAML sections, post-yaml sections,
+    code and HTML are skipped, and files included via ref: are scanned.
+    """
+    visited = set() if visited is None else visited
+    visited.add(source_file_path.resolve())
+    state = ParserState.MARKDOWN
+    empty_lines = 0
+    yaml_lines: List[str] = []
+    try:
+        with open(source_file_path, encoding="utf-8") as file:
+            for line in file:
+                s_line = line.strip()
+                if state == ParserState.MARKDOWN:
+                    if is_empty(s_line):
+                        empty_lines = empty_lines + 1
+                    elif yaml_start(s_line):
+                        state = ParserState.YAML
+                        yaml_lines = []
+                        empty_lines = 0
+                    elif code_start(s_line):
+                        state = ParserState.CODE
+                        empty_lines = 0
+                    elif html_start(s_line, empty_lines):
+                        state = ParserState.HTML
+                        empty_lines = 0
+                    elif line.startswith("# "):
+                        return line[2:].strip()
+                    else:
+                        empty_lines = 0
+                elif state == ParserState.YAML:
+                    if is_empty(s_line):
+                        empty_lines = empty_lines + 1
+                    if (empty_lines > 1) or yaml_stop(s_line):
+                        empty_lines = 0
+                        state = ParserState.AFTER_YAML
+                        reference = _get_yaml_reference(source_file_path, yaml_lines)
+                        if reference is not None and reference not in visited:
+                            title = scan_title(reference, visited)
+                            if title is not None:
+                                return title
+                    else:
+                        yaml_lines.append(line)
+                elif state == ParserState.AFTER_YAML:
+                    if is_empty(s_line):
+                        empty_lines = empty_lines + 1
+                        state = ParserState.MARKDOWN
+                    else:
+                        state = ParserState.AFTER_YAML_CONTENT
+                        empty_lines = 0
+                elif state == ParserState.AFTER_YAML_CONTENT:
+                    if is_empty(s_line):
+                        empty_lines = empty_lines + 1
+                        if empty_lines > 1:
+                            state = ParserState.MARKDOWN
+                    else:
+                        empty_lines = 0
+                elif state == ParserState.CODE:
+                    if code_stop(s_line):
+                        state = ParserState.MARKDOWN
+                elif state == ParserState.HTML:
+                    if is_empty(s_line):
+                        empty_lines = empty_lines + 1
+                    elif html_stop(empty_lines):
+                        # the line starts a markdown chunk
+                        state = ParserState.MARKDOWN
+                        empty_lines = 0
+                        if line.startswith("# "):
+                            return line[2:].strip()
+                    else:
+                        empty_lines = 0
+    except OSError:
+        pass
+    return None
+
+
 @dataclass
 class Folder:
     path: Path
@@ -106,14 +221,44 @@ class PageGroupPage(Page):
 
 
 class PageMapper:
-    def __init__(self, input_path: Path, core: Core, report: Report) -> None:
+    """The tree of folders and pages of a site, with their titles.
+
+    Titles that are already known, for instance from an HTML build, are not
+    scanned again.
+    """
+
+    def __init__(
+        self,
+        input_path: Path,
+        core: Core,
+        report: Report,
+        titles: Optional[Dict[Path, Optional[str]]] = None,
+    ) -> None:
         self.input_path = input_path
         self.core = core
         self.report = report
         self.root = Folder(input_path, is_root=True)
         self._scan_folder(self.root)
+        self.titles: Dict[Path, Optional[str]] = dict(titles) if titles else {}
+        self._scan_titles()
         self._visit_tree(self.root)
 
+    def _scan_titles(self) -> None:
+        paths: List[Path] = []
+
+        def collect(folder: Folder):
+            if folder.index_path is not None:
+                paths.append(folder.index_path)
+            paths.extend(page.path for page in folder.get_all_sub_pages())
+            for sub_folder in folder.folders:
+                collect(sub_folder)
+
+        collect(self.root)
+        paths = [path for path in paths if path not in self.titles]
+        with ThreadPoolExecutor() as executor:
+            for path, title in zip(paths, executor.map(scan_title, paths)):
+                self.titles[path] = title
+
     def get_page_group_id(self, file_name: str) -> Optional[str]:
         for prefix in ["teamwork", "preparation"]:
             if file_name.startswith(prefix + "-"):
@@ -169,11 +314,11 @@ class PageMapper:
         page.title = self.scan_page_for_main_anchor(page.path)
 
     def scan_page_for_main_anchor(self, source_file_path: Path) -> str:
-        for chunk in self.core.parse_file(source_file_path, True, False, None):
-            if isinstance(chunk, MarkdownChunk):
-                for anchor in chunk.find_anchors():
-                    return anchor.strip()
-        return "---"
+        if source_file_path in self.titles:
+            title = self.titles[source_file_path]
+        else:
+            title = scan_title(source_file_path)
+        return "---" if title is None else title
 
     def get_all_folders_with_index_paths(self) -> Sequence[Folder]:
         paths: List[Folder] = []
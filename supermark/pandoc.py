@@ -1,5 +1,6 @@
 import re
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Dict, List, Optional, Sequence, Tuple
+from uuid import uuid4
 
 import pypandoc
 from markdown_it import MarkdownIt
@@ -11,12 +12,15 @@ from .report import Report
 
 if TYPE_CHECKING:
     from .core import Core
+    from .profiling import BuildProfile
 
 
 md = MarkdownIt()
 
 pattern = re.compile("{{:.*?:}}")
 
+code_block_pattern = re.compile('(?<=["#])cb([0-9]+)(?=[-"])')
+
 
 def print_pandoc_info(report: Report):
     installed_pandoc_version = pypandoc.get_pandoc_version()
@@ -39,6 +43,7 @@ def convert(
     target_format: str,
     core: "Core",
     source_format: str = "md",
+    broker: Optional["ConversionBroker"] = None,
 ) -> str:
     if source_format == "md" and target_format == "html":
         result = str(md.render(source))
@@ -46,13 +51,38 @@ def convert(
             result = _replace_variables(result, core)
         return result
 
+    extra_args = _get_extra_args(source_format)
+    if broker is not None:
+        return broker.request(source, target_format, source_format, extra_args)
+    return _clean(
+        pypandoc.convert_text(
+            source, target_format, format=source_format, extra_args=extra_args
+        )
+    )
+
+
+def _get_extra_args(source_format: str) -> List[str]:
     if source_format == "mediawiki":
-        extra_args = ["--from", "mediawiki", "--to", "html"]
-    else:
-        extra_args = []
-    return pypandoc.convert_text(
-        source, target_format, format=source_format, extra_args=extra_args
-    ).strip()
+        return ["--from", "mediawiki", "--to", "html"]
+    return []
+
+
+def convert_all(
+    sources: Sequence[str],
+    target_format: str,
+    core: "Core",
+    source_format: str = "md",
+    broker: Optional["ConversionBroker"] = None,
+) -> List[str]:
+    """Converts several sources of the same format, with at most one Pandoc call."""
+    if (source_format == "md" and target_format == "html") or broker is not None:
+        return [
+            convert(source, target_format, core, source_format, broker)
+            for source in sources
+        ]
+    return convert_many(
+        sources, target_format, source_format, _get_extra_args(source_format)
+    )
 
 
 def _find_replacement(variable: str, core: "Core") -> Optional[str]:
@@ -83,13 +113,145 @@ def _replace_variables(input: str, core: "Core") -> str:
     return string
 
 
-def convert_code(source: str, target_format: str) -> str:
+def _clean(result: str) -> str:
+    # This reduced difference between Pandoc results from version 2.12 and newer versions.
+    return result.strip().replace('<pre\nclass="sourceCode', '<pre class="sourceCode')
+
+
+def convert_code(
+    source: str, target_format: str, broker: Optional["ConversionBroker"] = None
+) -> str:
     extra_args = ["--highlight-style", "pygments"]
+    if broker is not None:
+        return broker.request(source, target_format, "md", extra_args)
+    return _clean(
+        pypandoc.convert_text(source, target_format, format="md", extra_args=extra_args)
+    )
 
-    return (
-        pypandoc.convert_text(
-            source, target_format, format="md", extra_args=extra_args
-        ).strip()
-        # This reduced difference between Pandoc results from version 2.12 and newer versions.
-        .replace('<pre\nclass="sourceCode', '<pre class="sourceCode')
+
+def _convert_text(
+    source: str,
+    target_format: str,
+    source_format: str,
+    extra_args: Sequence[str],
+    profile: Optional["BuildProfile"],
+) -> str:
+    if profile is None:
+        return pypandoc.convert_text(
+            source, target_format, format=source_format, extra_args=list(extra_args)
+        )
+    with profile.measure("pandoc", format=source_format, characters=len(source)):
+        return pypandoc.convert_text(
+            source, target_format, format=source_format, extra_args=list(extra_args)
+        )
+
+
+def convert_many(
+    sources: Sequence[str],
+    target_format: str,
+    source_format: str = "md",
+    extra_args: Sequence[str] = (),
+    profile: Optional["BuildProfile"] = None,
+) -> List[str]:
+    """Converts several sources with a single Pandoc call.
+
+    The sources are joined into one document, separated by paragraphs with a
+    unique token, and the output is split at these tokens again. If the split
+    does not work out, for instance because a source has an unclosed block
+    that swallows a separator, each source is converted on its own.
+    """
+
+    def convert_each() -> List[str]:
+        return [
+            _clean(
+                _convert_text(source, target_format, source_format, extra_args, profile)
+            )
+            for source in sources
+        ]
+
+    if len(sources) < 2:
+        return convert_each()
+    token = "supermarksplit" + uuid4().hex
+    separator = (
+        f"\n\n<p>{token}</p>\n\n" if source_format == "html" else f"\n\n{token}\n\n"
     )
+    try:
+        output = _convert_text(
+            separator.join(sources), target_format, source_format, extra_args, profile
+        )
+    except RuntimeError:
+        return convert_each()
+    results = re.split(f"(?:<p>)?{token}(?:</p>)?", output)
+    if len(results) != len(sources):
+        return convert_each()
+    # Pandoc numbers code blocks (cb1, cb2, ...) through the whole document,
+    # but each source should get the same ids as when converted on its own
+    offset = 0
+    for index, result in enumerate(results):
+        numbers = {int(number) for number in code_block_pattern.findall(result)}
+        if offset > 0 and len(numbers) > 0:
+            results[index] = code_block_pattern.sub(
+                lambda match: f"cb{int(match.group(1)) - offset}", result
+            )
+        offset += len(numbers)
+    return [_clean(result) for result in results]
+
+
+ConversionKey = Tuple[str, str, Tuple[str, ...]]
+
+placeholder_pattern = re.compile("<!--supermark-conversion-([0-9]+)-->")
+
+
+class ConversionBroker:
+    """Collects the Pandoc conversions of a page, so that they run together.
+
+    `request` returns a placeholder, and `resolve` replaces the placeholders
+    with the results. All requests with the same source format, target format
+    and arguments are converted with one call of `convert_many`, which saves
+    the start-up time of Pandoc for each code block or table cell.
+    """
+
+    def __init__(self, profile: Optional["BuildProfile"] = None) -> None:
+        self.profile = profile
+        self.pending: Dict[ConversionKey, List[Tuple[int, str]]] = {}
+        self.results: Dict[int, str] = {}
+        self.count = 0
+
+    def request(
+        self,
+        source: str,
+        target_format: str,
+        source_format: str = "md",
+        extra_args: Sequence[str] = (),
+    ) -> str:
+        key = (source_format, target_format, tuple(extra_args))
+        self.pending.setdefault(key, []).append((self.count, source))
+        placeholder = f"<!--supermark-conversion-{self.count}-->"
+        self.count += 1
+        return placeholder
+
+    def flush(self) -> None:
+        for (
+            source_format,
+            target_format,
+            extra_args,
+        ), requests in self.pending.items():
+            results = convert_many(
+                [source for _, source in requests],
+                target_format,
+                source_format,
+                extra_args,
+                self.profile,
+            )
+            for (number, _), result in zip(requests, results):
+                self.results[number] = result
+        self.pending = {}
+
+    def resolve(self, html: str) -> str:
+        if len(self.pending) > 0:
+            self.flush()
+        if "<!--supermark-conversion-" not in html:
+            return html
+        return placeholder_pattern.sub(
+            lambda match: self.results.get(int(match.group(1)), match.group(0)), html
+        )
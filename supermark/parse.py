@@ -1,13 +1,13 @@
 from enum import Enum
 from pathlib import Path
-from typing import TYPE_CHECKING, List, Sequence
+from threading import Lock
+from typing import Dict, List, Optional, Sequence, Set, Tuple
 
+from .cache import digest
 from .chunks import RawChunk, RawChunkType
+from .report import Report
 from .utils import has_class_tag
 
-if TYPE_CHECKING:
-    from .report import Report
-
 
 class ParserState(Enum):
     MARKDOWN = 0
@@ -56,8 +56,32 @@ def code_stop(s_line: str) -> bool:
 
 
 def parse(
-    lines: List[str], path: Path, input_path: Path, report: "Report"
+    lines: List[str],
+    path: Path,
+    input_path: Path,
+    report: "Report",
+    references: Optional["ReferenceCache"] = None,
+    include_chain: Tuple[Path, ...] = (),
+    included_files: Optional[Set[Path]] = None,
 ) -> Sequence[RawChunk]:
+    """Splits lines into chunks, and replaces ref: chunks by the chunks of their files.
+
+    All files included via ref:, also indirectly, are added to `included_files`.
+    """
+    chunks = _split_into_chunks(lines, path, input_path, report)
+    return expand_reference_chunks(
+        chunks,
+        input_path,
+        report,
+        references,
+        include_chain + (path.resolve(),),
+        included_files,
+    )
+
+
+def _split_into_chunks(
+    lines: List[str], path: Path, input_path: Path, report: "Report"
+) -> List[RawChunk]:
     chunks: List[RawChunk] = []
     current_lines: List[str] = []
     empty_lines = 0
@@ -249,25 +273,91 @@ def parse(
         )
 
     # TODO remove chunks that turn out to be empty
-    chunks = [item for item in chunks if not item.is_empty()]
-    chunks = expand_reference_chunks(chunks, input_path, report)
-    return chunks
+    return [item for item in chunks if not item.is_empty()]
+
+
+class ReferenceCache:
+    """The raw chunks of files included via ref:, shared by all pages of a build.
+
+    Files are keyed by their resolved path and the hash of their content,
+    so a changed file is parsed again. The YAML of the cached chunks is
+    parsed when they are cached, and the copies for the pages share it.
+    The cached chunks are not expanded, because the files they refer to
+    may change independently.
+    """
+
+    def __init__(self) -> None:
+        self.files: Dict[Path, Tuple[str, List[RawChunk]]] = {}
+        self.lock = Lock()
+
+    def get_chunks(
+        self, path: Path, lines: List[str], input_path: Path, report: "Report"
+    ) -> List[RawChunk]:
+        content_hash = digest("".join(lines))
+        with self.lock:
+            entry = self.files.get(path)
+            if entry is None or entry[0] != content_hash:
+                chunks = _split_into_chunks(lines, path, input_path, report)
+                for chunk in chunks:
+                    chunk.parse_yaml()
+                entry = (content_hash, chunks)
+                self.files[path] = entry
+        return [chunk.copy(report) for chunk in entry[1]]
+
+
+def _format_chain(chain: Sequence[Path], input_path: Path) -> str:
+    def format(path: Path) -> str:
+        try:
+            return str(path.relative_to(input_path.resolve()))
+        except ValueError:
+            return str(path)
+
+    return " -> ".join(format(path) for path in chain)
 
 
 def expand_reference_chunks(
-    source_chunks: Sequence[RawChunk], input_path: Path, report: "Report"
+    source_chunks: Sequence[RawChunk],
+    input_path: Path,
+    report: "Report",
+    references: Optional[ReferenceCache] = None,
+    include_chain: Tuple[Path, ...] = (),
+    included_files: Optional[Set[Path]] = None,
 ) -> List[RawChunk]:
-    # TODO prevent cycles
     target_chunks: List[RawChunk] = []
     for source_chunk in source_chunks:
         path: Path | None = source_chunk.get_reference()
-        if path is not None:
-            with open(path, encoding="utf-8") as file:
-                lines = file.readlines()
-                chunks = parse(lines, path, input_path, report)
-                # TODO add all ele,emt sof chink but simpler
-                for c in chunks:
-                    target_chunks.append(c)
-        else:
+        if path is None:
             target_chunks.append(source_chunk)
+        elif path in include_chain:
+            source_chunk.tell(
+                "Reference cycle: "
+                + _format_chain(include_chain + (path,), input_path),
+                level=Report.ERROR,
+            )
+        else:
+            if included_files is not None:
+                # also when missing, so that the page is rebuilt once it exists
+                included_files.add(path)
+            try:
+                with open(path, encoding="utf-8") as file:
+                    lines = file.readlines()
+            except OSError:
+                source_chunk.tell(
+                    f"Referenced file {path} does not exist.", level=Report.ERROR
+                )
+                continue
+            if references is None:
+                chunks = _split_into_chunks(lines, path, input_path, report)
+            else:
+                chunks = references.get_chunks(path, lines, input_path, report)
+            target_chunks.extend(
+                expand_reference_chunks(
+                    chunks,
+                    input_path,
+                    report,
+                    references,
+                    include_chain + (path,),
+                    included_files,
+                )
+            )
     return target_chunks
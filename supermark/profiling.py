@@ -0,0 +1,210 @@
+import json
+import multiprocessing
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from time import time_ns
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from rich import print
+from rich.table import Table
+
+from .cache import write_atomic
+
+# the steps of a build, in the order they happen
+STEPS = [
+    "scan",
+    "parse",
+    "cast",
+    "render",
+    "pandoc",
+    "template",
+    "write",
+    "images",
+    "urls",
+    "resources",
+    "total",
+]
+
+# name of a table -> description in the summary
+TABLES = {
+    "steps": "Step",
+    "pages": "Page",
+    "chunk_types": "Chunk type",
+    "extensions": "Extension",
+}
+
+
+class BuildProfile:
+    """Where the time of a build goes, collected with `--profile` and `--trace`.
+
+    Durations are summed up per step of the build, per page, per chunk
+    type and per extension, together with the number of calls. With
+    tracing, each of them is also recorded as a span with its start,
+    duration, process and thread, in the Trace Event Format of Chrome,
+    which Perfetto and chrome://tracing show as a timeline. Pages built
+    in worker processes are profiled there and merged. When both are
+    disabled, measuring costs nothing.
+    """
+
+    def __init__(self, enabled: bool = False, tracing: bool = False) -> None:
+        self.enabled = enabled
+        self.tracing = tracing
+        self.lock = threading.Lock()
+        # table -> key -> [calls, seconds]
+        self.tables: Dict[str, Dict[str, List[float]]] = {table: {} for table in TABLES}
+        self.events: List[Dict[str, Any]] = []
+        # process and thread ids that got their names in the trace
+        self.threads: Set[Tuple[int, int]] = set()
+
+    def is_active(self) -> bool:
+        return self.enabled or self.tracing
+
+    def clear(self) -> None:
+        with self.lock:
+            for entries in self.tables.values():
+                entries.clear()
+            self.events = []
+
+    def add(self, table: str, key: str, seconds: float, calls: int = 1) -> None:
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.tables[table].setdefault(key, [0, 0.0])
+            entry[0] += calls
+            entry[1] += seconds
+
+    def add_span(
+        self,
+        name: str,
+        category: str,
+        start: int,
+        end: int,
+        args: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Records a span of the trace, with start and end in nanoseconds."""
+        if not self.tracing:
+            return
+        pid = os.getpid()
+        tid = threading.get_native_id()
+        event = {
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": start / 1000,
+            "dur": (end - start) / 1000,
+            "pid": pid,
+            "tid": tid,
+            "args": args or {},
+        }
+        with self.lock:
+            if (pid, tid) not in self.threads:
+                self.threads.add((pid, tid))
+                self.events.append(
+                    self._get_name_event(
+                        "process_name", pid, tid, multiprocessing.current_process().name
+                    )
+                )
+                self.events.append(
+                    self._get_name_event(
+                        "thread_name", pid, tid, threading.current_thread().name
+                    )
+                )
+            self.events.append(event)
+
+    def _get_name_event(self, kind: str, pid: int, tid: int, name: str):
+        return {"name": kind, "ph": "M", "pid": pid, "tid": tid, "args": {"name": name}}
+
+    @contextmanager
+    def span(self, name: str, category: str, **args: Any) -> Iterator[None]:
+        """A span of the trace that is not a step of the profile."""
+        if not self.tracing:
+            yield
+            return
+        start = time_ns()
+        try:
+            yield
+        finally:
+            self.add_span(name, category, start, time_ns(), args)
+
+    @contextmanager
+    def measure(self, step: str, **args: Any) -> Iterator[None]:
+        if not self.enabled and not self.tracing:
+            yield
+            return
+        start = time_ns()
+        try:
+            yield
+        finally:
+            end = time_ns()
+            self.add("steps", step, (end - start) / 1e9)
+            self.add_span(step, "step", start, end, args)
+
+    def take_events(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            events = self.events
+            self.events = []
+        return events
+
+    def add_events(self, events: List[Dict[str, Any]]) -> None:
+        with self.lock:
+            self.events.extend(events)
+
+    def save_trace(self, path: Path) -> None:
+        with self.lock:
+            content = json.dumps({"traceEvents": self.events, "displayTimeUnit": "ms"})
+        write_atomic(content, path)
+
+    def to_dict(self) -> Dict[str, Dict[str, Dict[str, Any]]]:
+        with self.lock:
+            return {
+                table: {
+                    key: {"calls": int(calls), "seconds": round(seconds, 6)}
+                    for key, (calls, seconds) in sorted(entries.items())
+                }
+                for table, entries in self.tables.items()
+            }
+
+    def merge(self, data: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        """Adds a profile from `to_dict`, for example of a worker process."""
+        for table, entries in data.items():
+            for key, entry in entries.items():
+                self.add(table, key, entry["seconds"], entry["calls"])
+
+    def save(self, path: Path) -> None:
+        write_atomic(json.dumps(self.to_dict(), indent=1) + "\n", path)
+
+    def _get_table(self, table: str, limit: int) -> Table:
+        with self.lock:
+            entries = list(self.tables[table].items())
+        if table == "steps":
+            entries.sort(
+                key=lambda entry: (
+                    STEPS.index(entry[0]) if entry[0] in STEPS else len(STEPS)
+                )
+            )
+        else:
+            entries.sort(key=lambda entry: entry[1][1], reverse=True)
+        shown = entries if table == "steps" else entries[:limit]
+        title = "Steps" if table == "steps" else f"Slowest {TABLES[table].lower()}s"
+        rich_table = Table(title=title, title_justify="left")
+        rich_table.add_column(TABLES[table])
+        rich_table.add_column("Calls", justify="right")
+        rich_table.add_column("Seconds", justify="right")
+        rich_table.add_column("Average ms", justify="right")
+        for key, (calls, seconds) in shown:
+            rich_table.add_row(
+                key,
+                str(int(calls)),
+                f"{seconds:.3f}",
+                f"{1000 * seconds / max(1, calls):.1f}",
+            )
+        if len(entries) > len(shown):
+            rich_table.add_row(f"... {len(entries) - len(shown)} more", "", "", "")
+        return rich_table
+
+    def print_summary(self, limit: int = 10) -> None:
+        for table in TABLES:
+            if len(self.tables[table]) > 0:
+                print(self._get_table(table, limit))
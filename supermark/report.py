@@ -1,8 +1,11 @@
+import json
 from pathlib import Path
-from typing import Dict, List, Optional
+from threading import Lock
+from typing import IO, Dict, List, Optional
 
 import indentation
 from colorama import Fore
+from rich import get_console
 from rich import print as pprint
 from rich.console import Console
 from rich.panel import Panel
@@ -12,7 +15,12 @@ COLOR_1 = Fore.LIGHTBLUE_EX
 COLOR_2 = Fore.LIGHTGREEN_EX
 
 
+LEVEL_NAMES = {1: "info", 2: "warning", 3: "error"}
+
+
 class ReportEntry:
+    __slots__ = ("message", "level", "path", "line", "conclusion")
+
     def __init__(
         self,
         message: str,
@@ -26,11 +34,8 @@ class ReportEntry:
         self.path = path
         self.line = line
         self.conclusion = conclusion
-        self.cwd = Path.cwd()
 
     def _path_to_string(self, path: Path) -> str:
-        # if path.is_relative_to(self.cwd):
-        #    return str(path.relative_to(self.cwd))
         return str(path)
 
     def get_hash(self) -> str:
@@ -64,8 +69,77 @@ class ReportEntry:
         s = s + Fore.WHITE + indentation.set(self.message, 1)
         return s
 
+    def to_dict(self) -> Dict[str, object]:
+        return {
+            "level": LEVEL_NAMES[self.level],
+            "message": self.message,
+            "path": None if self.path is None else str(self.path),
+            "line": self.line,
+        }
+
+
+class ReportSink:
+    """Receives the entries of a report while they are added, during the build."""
+
+    def __init__(self, level: int = 1) -> None:
+        # entries below this level are ignored
+        self.level = level
+
+    def write(self, entry: ReportEntry) -> None:
+        ...
+
+    def close(self) -> None:
+        pass
+
+
+class ConsoleSink(ReportSink):
+    """Prints entries as they happen, above progress bars."""
+
+    def write(self, entry: ReportEntry) -> None:
+        location = entry.get_styled_location()
+        get_console().print(
+            f"[bold]{LEVEL_NAMES[entry.level]}[/bold] {entry.message}"
+            + (f" {location}" if location else ""),
+            highlight=False,
+        )
+
+
+class FileSink(ReportSink):
+    def __init__(self, path: Path, level: int = 1) -> None:
+        super().__init__(level)
+        self.file: IO[str] = open(path, "w", encoding="utf-8")
+
+    def write(self, entry: ReportEntry) -> None:
+        self.file.write(self.format(entry) + "\n")
+        self.file.flush()
+
+    def format(self, entry: ReportEntry) -> str:
+        location = ""
+        if entry.path is not None:
+            location = f" ({entry.path}" + (
+                ")" if entry.line is None else f":{entry.line})"
+            )
+        return f"{LEVEL_NAMES[entry.level]}: {entry.message}{location}"
+
+    def close(self) -> None:
+        self.file.close()
+
+
+class JSONLinesSink(FileSink):
+    """Writes each entry as a JSON object on its own line."""
+
+    def format(self, entry: ReportEntry) -> str:
+        return json.dumps(entry.to_dict())
+
 
 class Report:
+    """Collects messages of a build, from any number of threads.
+
+    Entries are indexed by level and message while they are added, so
+    that printing groups them without scanning all of them again, and
+    are passed on to sinks, which write them out during the build.
+    """
+
     INFO = 1
     WARNING = 2
     ERROR = 3
@@ -73,12 +147,33 @@ class Report:
     def __init__(self, source_path: Optional[Path] = None, verbose: bool = False):
         self.source_path = source_path
         self.messages: List[ReportEntry] = []
+        # level -> message -> entries
+        self.index: Dict[int, Dict[str, List[ReportEntry]]] = {
+            level: {} for level in LEVEL_NAMES
+        }
         self.max_level = self.INFO
-        self.files = []
         self.conclusions: List[ReportEntry] = []
         self.warnings: int = 0
         self.errors: int = 0
         self.verbose = verbose
+        self.sinks: List[ReportSink] = []
+        self.lock = Lock()
+
+    def add_sink(self, sink: ReportSink) -> None:
+        with self.lock:
+            self.sinks.append(sink)
+
+    def close_sinks(self) -> None:
+        with self.lock:
+            for sink in self.sinks:
+                sink.close()
+            self.sinks = []
+
+    def get_entries(self, level: int) -> List[ReportEntry]:
+        with self.lock:
+            return [
+                entry for entries in self.index[level].values() for entry in entries
+            ]
 
     def get_max_level(self):
         return self.max_level
@@ -93,15 +188,20 @@ class Report:
         path: Optional[Path] = None,
         line: Optional[int] = None,
     ) -> None:
-        self.max_level = max(self.max_level, level)
-        entry = ReportEntry(message, level=level, path=path, line=line)
-        self.messages.append(entry)
-        if entry.path:
-            self.files.append(entry.path)
-        if level == Report.ERROR:
-            self.errors += 1
-        elif level == Report.WARNING:
-            self.warnings += 1
+        self.add_entry(ReportEntry(message, level=level, path=path, line=line))
+
+    def add_entry(self, entry: ReportEntry) -> None:
+        with self.lock:
+            self.max_level = max(self.max_level, entry.level)
+            self.messages.append(entry)
+            self.index[entry.level].setdefault(entry.get_hash(), []).append(entry)
+            if entry.level == Report.ERROR:
+                self.errors += 1
+            elif entry.level == Report.WARNING:
+                self.warnings += 1
+            for sink in self.sinks:
+                if entry.level >= sink.level:
+                    sink.write(entry)
 
     def info(
         self,
@@ -133,7 +233,8 @@ class Report:
         entry = ReportEntry(
             message, level=Report.INFO, path=None, line=None, conclusion=True
         )
-        self.conclusions.append(entry)
+        with self.lock:
+            self.conclusions.append(entry)
 
     def print_(self):
         for m in self.messages:
@@ -178,25 +279,24 @@ class Report:
             else [Report.ERROR, Report.WARNING]
         )
         hashes: Dict[str, Tree] = {}
+        with self.lock:
+            index = {level: dict(self.index[level]) for level in levels}
         for level in levels:
-            for entry in self.messages:
-                if entry.level == level:
-                    if entry.get_hash() in hashes:
-                        if entry.path is not None:
-                            hashes[entry.get_hash()].add(entry.get_styled_location())
-                    else:
-                        level_color = (
-                            "orange3"
-                            if level == Report.WARNING
-                            else "red1"
-                            if level == Report.ERROR
-                            else "dark_sea_green4"
-                        )
-                        hashes[entry.get_hash()] = tree.add(
-                            entry.message, style=f"bold {level_color}"
-                        )
-                        if entry.path is not None:
-                            hashes[entry.get_hash()].add(entry.get_styled_location())
+            level_color = (
+                "orange3"
+                if level == Report.WARNING
+                else "red1"
+                if level == Report.ERROR
+                else "dark_sea_green4"
+            )
+            for key, entries in index[level].items():
+                if key not in hashes:
+                    hashes[key] = tree.add(
+                        entries[0].message, style=f"bold {level_color}"
+                    )
+                for entry in entries:
+                    if entry.path is not None:
+                        hashes[key].add(entry.get_styled_location())
         return tree
 
     def print(self):
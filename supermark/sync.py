@@ -0,0 +1,233 @@
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from shutil import copyfile
+from threading import Lock
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from .cache import write_atomic
+from .config import Config
+from .images import hash_file
+from .report import Report
+
+SYNC_MODES = ["copy", "hardlink", "reflink"]
+
+# ioctl of Linux that shares the blocks of one file with another (copy-on-write)
+FICLONE = 0x40049409
+
+# size, modification time in nanoseconds and content hash (if known) of a source
+ManifestEntry = Tuple[int, int, Optional[str]]
+
+
+@dataclass
+class SyncSettings:
+    """Settings for copying resources, from the [resources] section of config.toml."""
+
+    # how files get into the output: copied, hard links or copy-on-write clones
+    mode: str = "copy"
+    # also compare content hashes, to skip files that were touched but not changed
+    checksum: bool = False
+
+    @staticmethod
+    def from_config(config: Config, report: Report) -> "SyncSettings":
+        settings = SyncSettings()
+        values = config.get("resources")
+        if not isinstance(values, dict):
+            return settings
+        if "mode" in values:
+            if values["mode"] in SYNC_MODES:
+                settings.mode = values["mode"]
+            else:
+                report.warning(
+                    f"Unknown mode {values['mode']} in section [resources], use one of {', '.join(SYNC_MODES)}.",
+                    path=config.file,
+                )
+        if "checksum" in values:
+            settings.checksum = bool(values["checksum"])
+        return settings
+
+
+@dataclass
+class SyncResult:
+    copied: int = 0
+    unchanged: int = 0
+    removed: int = 0
+    failed: int = 0
+
+
+def _reflink(source: Path, target: Path) -> None:
+    if not sys.platform.startswith("linux"):
+        raise OSError("Reflinks are only supported on Linux.")
+    import fcntl
+
+    with open(source, "rb") as source_file, open(target, "wb") as target_file:
+        fcntl.ioctl(target_file.fileno(), FICLONE, source_file.fileno())
+
+
+class ResourceSync:
+    """Keeps the resources in the output folder in sync with the input folder.
+
+    A manifest in the cache folder records the size, modification time and
+    (with checksums) the content hash of each source when it was last copied.
+    Only files that differ from their manifest entry or whose output is
+    missing are copied, in a pool of threads. Outputs whose source was
+    deleted since the last sync are removed. Existing outputs are replaced
+    and never written to, because with hard links they share their content
+    with the source.
+    """
+
+    def __init__(
+        self,
+        input_path: Path,
+        output_path: Path,
+        manifest_path: Optional[Path],
+        settings: SyncSettings,
+    ) -> None:
+        self.input_path = input_path
+        self.output_path = output_path
+        self.manifest_path = manifest_path
+        self.settings = settings
+        self.report = Report()
+        self.manifest: Dict[str, ManifestEntry] = {}
+        self.lock = Lock()
+        # modes that failed once, for example across devices, are not tried again
+        self.failed_modes: List[str] = []
+        if manifest_path is not None:
+            try:
+                with open(manifest_path, encoding="utf-8") as file:
+                    data = json.load(file)
+                self.manifest = {
+                    file: tuple(entry) for file, entry in data["files"].items()
+                }
+                if data["mode"] != settings.mode:
+                    # outputs of another mode are replaced, but still removed
+                    # when their source is deleted
+                    self.manifest = {file: (-1, -1, None) for file in self.manifest}
+            except (OSError, ValueError, KeyError, AttributeError, TypeError):
+                self.manifest = {}
+
+    def _is_unchanged(
+        self, file: str, stat: os.stat_result
+    ) -> Tuple[bool, ManifestEntry]:
+        entry = self.manifest.get(file)
+        if entry is not None and entry[:2] == (stat.st_size, stat.st_mtime_ns):
+            return os.path.exists(self.output_path / file), entry
+        file_hash = None
+        if self.settings.checksum:
+            file_hash = hash_file(str(self.input_path / file))
+            if entry is not None and entry[0] == stat.st_size and entry[2] == file_hash:
+                return (
+                    os.path.exists(self.output_path / file),
+                    (stat.st_size, stat.st_mtime_ns, file_hash),
+                )
+        return False, (stat.st_size, stat.st_mtime_ns, file_hash)
+
+    def _transfer(self, source: Path, target: Path) -> None:
+        target.parent.mkdir(parents=True, exist_ok=True)
+        if target.exists() or target.is_symlink():
+            target.unlink()
+        mode = self.settings.mode
+        if mode not in self.failed_modes:
+            try:
+                if mode == "hardlink":
+                    os.link(source, target)
+                    return
+                elif mode == "reflink":
+                    _reflink(source, target)
+                    return
+            except OSError as error:
+                with self.lock:
+                    if mode not in self.failed_modes:
+                        self.failed_modes.append(mode)
+                        self.report.warning(
+                            f"Cannot create a {mode} for {target}, copying files instead. ({error})"
+                        )
+                if target.exists():
+                    target.unlink()
+        copyfile(source, target)
+
+    def _sync_file(self, file: str, stat: os.stat_result) -> bool:
+        unchanged, entry = self._is_unchanged(file, stat)
+        if not unchanged:
+            self._transfer(self.input_path / file, self.output_path / file)
+        with self.lock:
+            self.manifest[file] = entry
+        return not unchanged
+
+    def _remove(self, file: str) -> None:
+        target = self.output_path / file
+        if target.exists():
+            target.unlink()
+        # remove folders that became empty, but never the output folder
+        folder = target.parent
+        while folder != self.output_path and self.output_path in folder.parents:
+            try:
+                folder.rmdir()
+            except OSError:
+                break
+            folder = folder.parent
+
+    def sync(
+        self, files: Iterable[Tuple[str, os.stat_result]], report: Report
+    ) -> SyncResult:
+        """Brings the given files, relative to the input folder, into the output.
+
+        The files come with their stat results, as listing them provides those.
+        """
+        self.report = report
+        result = SyncResult()
+        files = list(files)
+        with ThreadPoolExecutor() as executor:
+            futures = [
+                (file, executor.submit(self._sync_file, file, stat))
+                for file, stat in files
+            ]
+            for file, future in futures:
+                try:
+                    if future.result():
+                        result.copied += 1
+                    else:
+                        result.unchanged += 1
+                except OSError as error:
+                    result.failed += 1
+                    with self.lock:
+                        self.manifest.pop(file, None)
+                    self.report.error(
+                        f"Could not copy resource {file}.",
+                        path=self.input_path / file,
+                        exception=error,
+                    )
+        current = {file for file, _ in files}
+        for file in sorted(set(self.manifest) - current):
+            try:
+                self._remove(file)
+                result.removed += 1
+            except OSError as error:
+                self.report.warning(
+                    f"Could not remove {file}, its source was deleted. ({error})"
+                )
+            del self.manifest[file]
+        self.save()
+        return result
+
+    def save(self) -> None:
+        if self.manifest_path is None:
+            return
+        with self.lock:
+            content = json.dumps(
+                {
+                    "mode": self.settings.mode,
+                    "files": {
+                        file: list(entry) for file, entry in self.manifest.items()
+                    },
+                },
+                indent=1,
+                sort_keys=True,
+            )
+        try:
+            write_atomic(content, self.manifest_path)
+        except OSError:
+            pass
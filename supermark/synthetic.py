@@ -0,0 +1,194 @@
+import posixpath
+import random
+from dataclasses import dataclass, field
+from math import ceil
+from pathlib import Path
+from typing import Dict, List
+
+EXTENSIONS_FOLDER = Path(__file__).parent / "extensions"
+
+# kinds of chunks on synthetic pages -> how often they appear by default
+DEFAULT_MIX = {
+    "markdown": 4,
+    "extension": 2,
+    "table": 1,
+    "code": 1,
+    "ref": 1,
+    "figure": 1,
+}
+
+SNIPPETS = 10
+# figures per folder, since figures need to be in the folder of their page
+FIGURES = 2
+
+WORDS = (
+    "state machine protocol message sender receiver channel buffer timer "
+    "packet network layer design model system component interface test "
+    "student course lecture exercise task result report example solution"
+).split()
+
+LANGUAGES = {
+    "python": "def handle_{n}(message):\n    if message.kind == {n}:\n        return reply(message)\n    return None\n",
+    "java": "public int handle{n}(Message message) {{\n    return message.getKind() + {n};\n}}\n",
+    "bash": 'for file in pages/*.md; do\n    echo "$file {n}"\ndone\n',
+}
+
+
+@dataclass
+class SiteSpec:
+    """Size and content of a synthetic site, for benchmarks."""
+
+    pages: int = 100
+    # number of nested folders below the pages folder
+    depth: int = 2
+    chunks: int = 10
+    # kind of chunk -> weight, see DEFAULT_MIX
+    mix: Dict[str, int] = field(default_factory=lambda: dict(DEFAULT_MIX))
+    seed: int = 0
+
+    @staticmethod
+    def parse_mix(text: str) -> Dict[str, int]:
+        """Reads a mix like `markdown=4,table=1`. Kinds not mentioned do not appear."""
+        mix: Dict[str, int] = {}
+        for item in text.split(","):
+            kind, _, weight = item.partition("=")
+            kind = kind.strip()
+            if kind not in DEFAULT_MIX:
+                raise ValueError(
+                    f"Unknown kind of chunk {kind}, use one of {', '.join(DEFAULT_MIX)}."
+                )
+            mix[kind] = int(weight or 1)
+        return mix
+
+
+def load_extension_examples(folder: Path = EXTENSIONS_FOLDER) -> List[str]:
+    """The content of all example-*.md files of the extensions."""
+    return [
+        file.read_text(encoding="utf-8").strip()
+        for file in sorted(folder.glob("*/example-*.md"))
+    ]
+
+
+class SiteGenerator:
+    """Writes a synthetic site into a folder, with pages, snippets, figures and a template.
+
+    The pages are spread over a tree of folders of the given depth. Their
+    chunks are drawn from the mix: markdown with links to other pages,
+    the examples of the extensions, tables, code, references to shared
+    snippets and figures. The same spec always creates the same site.
+    """
+
+    def __init__(self, spec: SiteSpec) -> None:
+        self.spec = spec
+        self.random = random.Random(spec.seed)
+        self.examples = load_extension_examples()
+        self.page_names = self._get_page_names()
+
+    def _get_page_names(self) -> List[str]:
+        depth = max(0, self.spec.depth)
+        # pages per folder, and folders per folder
+        fanout = max(2, ceil(self.spec.pages ** (1 / (depth + 1))))
+        names: List[str] = []
+        for index in range(self.spec.pages):
+            folder = index // fanout
+            parts = [
+                f"part-{(folder // fanout ** level) % fanout}"
+                for level in reversed(range(depth))
+            ]
+            names.append(posixpath.join(*parts, f"page-{index}.md"))
+        return names
+
+    def _get_words(self, count: int) -> str:
+        return " ".join(self.random.choice(WORDS) for _ in range(count))
+
+    def _get_link(self, page: str) -> str:
+        target = self.random.choice(self.page_names)
+        href = posixpath.relpath(target, posixpath.dirname(page) or ".")
+        return f"[{self._get_words(2)}]({href[:-3]}.html)"
+
+    def _markdown(self, page: str) -> str:
+        lines = [f"## {self._get_words(3).capitalize()}", ""]
+        for _ in range(self.random.randint(1, 3)):
+            lines.append(
+                f"{self._get_words(12).capitalize()} *{self._get_words(2)}* and "
+                f"**{self._get_words(1)}**, see {self._get_link(page)}. "
+                f"{self._get_words(10).capitalize()}."
+            )
+            lines.append("")
+        lines.extend(f"- {self._get_words(5)}" for _ in range(3))
+        return "\n".join(lines)
+
+    def _extension(self, page: str) -> str:
+        return self.random.choice(self.examples)
+
+    def _table(self, page: str) -> str:
+        columns = self.random.randint(2, 5)
+        lines = ["| " + " | ".join(self._get_words(1) for _ in range(columns)) + " |"]
+        lines.append("|" + "---|" * columns)
+        for _ in range(self.random.randint(2, 8)):
+            lines.append(
+                "| " + " | ".join(self._get_words(2) for _ in range(columns)) + " |"
+            )
+        return "\n".join(lines)
+
+    def _code(self, page: str) -> str:
+        language = self.random.choice(sorted(LANGUAGES))
+        code = LANGUAGES[language].format(n=self.random.randint(0, 100))
+        return f"```{language}\n{code}```"
+
+    def _get_relative(self, page: str, file: str) -> str:
+        return posixpath.relpath(file, posixpath.dirname(page) or ".")
+
+    def _ref(self, page: str) -> str:
+        snippet = f"snippets/snippet-{self.random.randrange(SNIPPETS)}.txt"
+        return f"---\nref: {self._get_relative(page, snippet)}\n---"
+
+    def _figure(self, page: str) -> str:
+        return (
+            f"---\ntype: figure\nsource: figures/figure-{self.random.randrange(FIGURES)}.svg\n"
+            f'caption: "{self._get_words(6).capitalize()}."\n---'
+        )
+
+    def _page(self, page: str) -> str:
+        kinds = [kind for kind, weight in self.spec.mix.items() if weight > 0]
+        weights = [self.spec.mix[kind] for kind in kinds]
+        chunks = [f"# {self._get_words(3).capitalize()}"]
+        if len(kinds) > 0:
+            for kind in self.random.choices(kinds, weights, k=self.spec.chunks):
+                chunks.append(getattr(self, f"_{kind}")(page))
+        return "\n\n\n".join(chunks) + "\n"
+
+    def generate(self, base_path: Path) -> Path:
+        """Writes the site, and returns its folder of pages."""
+        input_path = base_path / "pages"
+        for index in range(SNIPPETS):
+            self._write(
+                input_path / "snippets" / f"snippet-{index}.txt",
+                f"{self._get_words(20).capitalize()}.\n\n\n:tip: {self._get_words(8)}.\n",
+            )
+        for folder in sorted({posixpath.dirname(page) for page in self.page_names}):
+            for index in range(FIGURES):
+                width = 200 + 100 * index
+                self._write(
+                    input_path / folder / "figures" / f"figure-{index}.svg",
+                    f'<svg xmlns="http://www.w3.org/2000/svg" width="{width}" height="100">'
+                    f'<rect width="{width}" height="100" fill="#ccc"/></svg>\n',
+                )
+        for page in self.page_names:
+            self._write(input_path / page, self._page(page))
+        self._write(
+            base_path / "templates" / "page.html",
+            '<html><head><style type="text/css">{css}</style></head>\n'
+            "<body>{content}<script>{js}</script></body></html>\n"
+            "<!-- {rel_path} -->\n",
+        )
+        return input_path
+
+    def _write(self, path: Path, content: str) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content, encoding="utf-8")
+
+
+def generate_site(base_path: Path, spec: SiteSpec) -> Path:
+    """Creates a synthetic site in `base_path`, and returns its folder of pages."""
+    return SiteGenerator(spec).generate(base_path)
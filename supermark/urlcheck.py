@@ -0,0 +1,261 @@
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, fields
+from pathlib import Path
+from threading import Lock
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from .cache import write_atomic
+from .config import Config
+from .report import Report
+
+if TYPE_CHECKING:
+    import requests
+
+    from .profiling import BuildProfile
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
+}
+
+# status codes that are worth another try
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+# status codes of servers that do not support HEAD, besides client errors
+HEAD_FAILURE_STATUS_CODES = [501]
+
+
+@dataclass
+class URLCheckSettings:
+    """Settings for checking external URLs, from the [urls] section of config.toml."""
+
+    # seconds to wait for a server
+    timeout: float = 10.0
+    # how often a failed request is repeated
+    retries: int = 2
+    # seconds before the first retry, doubled for each further retry
+    backoff: float = 0.5
+    # requests that run at the same time for one host
+    per_host: int = 4
+    # seconds between the start of two requests to the same host
+    interval: float = 0.1
+    # seconds that a reachable URL is not checked again
+    ttl: float = 24 * 60 * 60.0
+
+    @staticmethod
+    def from_config(config: Config, report: Report) -> "URLCheckSettings":
+        settings = URLCheckSettings()
+        values = config.get("urls")
+        if not isinstance(values, dict):
+            return settings
+        for field in fields(URLCheckSettings):
+            if field.name in values:
+                try:
+                    setattr(settings, field.name, field.type(values[field.name]))
+                except (TypeError, ValueError):
+                    report.warning(
+                        f"Setting {field.name} in section [urls] must be a number.",
+                        path=config.file,
+                    )
+        return settings
+
+
+@dataclass
+class URLResult:
+    url: str
+    status_code: Optional[int] = None
+    error: Optional[str] = None
+    # seconds the server asked us to wait, with status code 429
+    retry_after: Optional[float] = None
+    cached: bool = False
+
+    def is_ok(self) -> bool:
+        return self.status_code == 200
+
+    def is_retryable(self) -> bool:
+        return self.error is not None or self.status_code in RETRY_STATUS_CODES
+
+
+class URLResultStore:
+    """Remembers when URLs were reachable, so that they are skipped for a while.
+
+    Kept as JSON in the cache folder, to survive between builds.
+    """
+
+    def __init__(self, path: Optional[Path], ttl: float) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.checked: Dict[str, float] = {}
+        if path is not None:
+            try:
+                with open(path, encoding="utf-8") as file:
+                    self.checked = json.load(file)
+            except (OSError, ValueError):
+                self.checked = {}
+
+    def is_fresh(self, url: str) -> bool:
+        return url in self.checked and time.time() - self.checked[url] < self.ttl
+
+    def add(self, result: URLResult) -> None:
+        if result.is_ok() and not result.cached:
+            self.checked[result.url] = time.time()
+        elif not result.is_ok():
+            self.checked.pop(result.url, None)
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+        now = time.time()
+        checked = {
+            url: checked
+            for url, checked in self.checked.items()
+            if now - checked < self.ttl
+        }
+        try:
+            write_atomic(json.dumps(checked, indent=1, sort_keys=True), self.path)
+        except OSError:
+            pass
+
+
+def _parse_retry_after(value: Optional[str]) -> Optional[float]:
+    try:
+        return None if value is None else float(value)
+    except ValueError:
+        # a date instead of seconds
+        return None
+
+
+class URLCheckEngine:
+    """Checks URLs concurrently, with an asyncio loop that schedules the requests.
+
+    The requests themselves are made with one requests.Session per host, which
+    keeps connections alive, in a pool of threads. Each URL is first requested
+    with HEAD, and with GET (without downloading the body) if the server does
+    not accept HEAD. Requests to one host are limited in number and rate,
+    and failed requests are retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        settings: URLCheckSettings,
+        store: Optional[URLResultStore] = None,
+        profile: Optional["BuildProfile"] = None,
+    ) -> None:
+        self.settings = settings
+        self.store = store
+        self.profile = profile
+        self.sessions: Dict[str, "requests.Session"] = {}
+        self.sessions_lock = Lock()
+        self.semaphores: Dict[str, asyncio.Semaphore] = {}
+        self.next_request: Dict[str, float] = {}
+
+    def _get_session(self, host: str) -> "requests.Session":
+        # imported here, since most builds do not check external URLs
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        with self.sessions_lock:
+            if host not in self.sessions:
+                session = requests.Session()
+                session.headers.update(HEADERS)
+                adapter = HTTPAdapter(pool_maxsize=max(1, self.settings.per_host))
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[host] = session
+            return self.sessions[host]
+
+    def _request(self, url: str) -> URLResult:
+        if self.profile is None:
+            return self._fetch(url)
+        with self.profile.span(urlsplit(url).netloc, "url", url=url):
+            return self._fetch(url)
+
+    def _fetch(self, url: str) -> URLResult:
+        import requests
+
+        session = self._get_session(urlsplit(url).netloc)
+        timeout = self.settings.timeout
+        try:
+            response = session.head(url, allow_redirects=True, timeout=timeout)
+            if response.status_code in HEAD_FAILURE_STATUS_CODES or (
+                400 <= response.status_code < 500 and response.status_code != 429
+            ):
+                # many servers do not implement HEAD correctly
+                response = session.get(
+                    url, allow_redirects=True, timeout=timeout, stream=True
+                )
+                response.close()
+            return URLResult(
+                url,
+                status_code=response.status_code,
+                retry_after=_parse_retry_after(response.headers.get("Retry-After")),
+            )
+        except requests.exceptions.RequestException as e:
+            return URLResult(url, error=type(e).__name__)
+
+    async def _wait_for_turn(self, host: str) -> None:
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        start = max(now, self.next_request.get(host, now))
+        self.next_request[host] = start + self.settings.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _check(self, url: str, executor: ThreadPoolExecutor) -> URLResult:
+        if self.store is not None and self.store.is_fresh(url):
+            return URLResult(url, status_code=200, cached=True)
+        host = urlsplit(url).netloc
+        if host not in self.semaphores:
+            self.semaphores[host] = asyncio.Semaphore(max(1, self.settings.per_host))
+        loop = asyncio.get_running_loop()
+        async with self.semaphores[host]:
+            attempt = 0
+            while True:
+                await self._wait_for_turn(host)
+                result = await loop.run_in_executor(executor, self._request, url)
+                if not result.is_retryable() or attempt >= self.settings.retries:
+                    return result
+                delay = self.settings.backoff * 2**attempt
+                if result.retry_after is not None:
+                    delay = max(delay, min(result.retry_after, 60.0))
+                await asyncio.sleep(delay)
+                attempt += 1
+
+    async def _check_all(
+        self,
+        urls: Sequence[str],
+        on_result: Optional[Callable[[URLResult], Any]],
+    ) -> List[URLResult]:
+        hosts = {urlsplit(url).netloc for url in urls}
+        workers = max(1, min(64, len(hosts) * max(1, self.settings.per_host)))
+
+        async def check(url: str) -> URLResult:
+            result = await self._check(url, executor)
+            if on_result is not None:
+                on_result(result)
+            return result
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(await asyncio.gather(*[check(url) for url in urls]))
+
+    def check_all(
+        self,
+        urls: Sequence[str],
+        on_result: Optional[Callable[[URLResult], Any]] = None,
+    ) -> Dict[str, URLResult]:
+        # semaphores belong to the loop of one run
+        self.semaphores = {}
+        self.next_request = {}
+        try:
+            results = asyncio.run(self._check_all(urls, on_result))
+        finally:
+            for session in self.sessions.values():
+                session.close()
+            self.sessions = {}
+        if self.store is not None:
+            for result in results:
+                self.store.add(result)
+            self.store.save()
+        return {result.url: result for result in results}
@@ -0,0 +1,305 @@
+import multiprocessing
+import os
+import posixpath
+from concurrent.futures import Future, ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+from shutil import copyfile
+from threading import Lock
+from typing import Dict, List, Optional, Tuple
+
+from .config import Config
+from .images import hash_file
+from .report import Report
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None  # type: ignore
+
+RASTER_SUFFIXES = [".jpeg", ".jpg", ".png"]
+
+# EXIF orientations that turn an image by 90 degrees
+ROTATED_ORIENTATIONS = [5, 6, 7, 8]
+
+
+@dataclass
+class ImageSettings:
+    """Settings for responsive images, from the [images] section of config.toml."""
+
+    # create smaller variants and WebP versions of raster figures
+    responsive: bool = False
+    # widths of the variants in pixels, images are never scaled up
+    widths: List[int] = field(default_factory=lambda: [480, 960, 1600])
+    # also create WebP versions
+    webp: bool = True
+    # quality of JPEG and WebP variants, from 1 to 100
+    quality: int = 80
+    # the sizes attribute of images, how wide they are shown
+    sizes: str = "100vw"
+
+    @staticmethod
+    def from_config(config: Config, report: Report) -> "ImageSettings":
+        settings = ImageSettings()
+        values = config.get("images")
+        if not isinstance(values, dict):
+            return settings
+        try:
+            if "responsive" in values:
+                settings.responsive = bool(values["responsive"])
+            if "widths" in values:
+                settings.widths = sorted({int(width) for width in values["widths"]})
+            if "webp" in values:
+                settings.webp = bool(values["webp"])
+            if "quality" in values:
+                settings.quality = max(1, min(100, int(values["quality"])))
+            if "sizes" in values:
+                settings.sizes = str(values["sizes"])
+        except (TypeError, ValueError):
+            report.warning(
+                "Section [images] needs a list of numbers as widths, and a number as quality.",
+                path=config.file,
+            )
+        return settings
+
+
+def get_variant_name(name: str, width: Optional[int], webp: bool) -> str:
+    """Name of a variant of an image, placed next to the image in the output."""
+    stem, suffix = os.path.splitext(name)
+    if width is not None:
+        stem = f"{stem}-{width}w"
+    return stem + (".webp" if webp else suffix)
+
+
+@dataclass
+class VariantJob:
+    """The variants to create for one image, and where they go."""
+
+    source: Path
+    file_hash: str
+    # the copy of the image in the output, the variants are placed next to it
+    target: Path
+    widths: List[int]
+    webp: bool
+    quality: int
+
+    def get_files(self) -> List[Tuple[str, str]]:
+        """Returns the name of each variant in the cache and in the output."""
+        suffix = self.source.suffix.lower()
+        files: List[Tuple[str, str]] = []
+        for width in self.widths:
+            files.append(
+                (
+                    f"{width}-q{self.quality}{suffix}",
+                    get_variant_name(self.target.name, width, False),
+                )
+            )
+        if self.webp:
+            for webp_width in [*self.widths, None]:
+                files.append(
+                    (
+                        f"{webp_width or 'full'}-q{self.quality}.webp",
+                        get_variant_name(self.target.name, webp_width, True),
+                    )
+                )
+        return files
+
+
+def _save(image: "Image.Image", path: Path, quality: int) -> None:
+    temp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    if path.suffix == ".webp":
+        image.save(temp, format="WEBP", quality=quality, method=4)
+    elif path.suffix in [".jpg", ".jpeg"]:
+        image.convert("RGB").save(temp, format="JPEG", quality=quality, optimize=True)
+    else:
+        image.save(temp, format="PNG")
+    os.replace(temp, path)
+
+
+def encode_variants(job: VariantJob, folder: Path) -> None:
+    """Creates the variants of an image that are not yet in the cache folder.
+
+    Runs in a worker process.
+    """
+    folder.mkdir(parents=True, exist_ok=True)
+    missing = [
+        cache_name
+        for cache_name, _ in job.get_files()
+        if not (folder / cache_name).exists()
+    ]
+    if len(missing) == 0:
+        return
+    with Image.open(job.source) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ["RGB", "RGBA", "L", "LA"]:
+            image = image.convert("RGBA")
+        for cache_name in missing:
+            width = cache_name.split("-")[0]
+            if width == "full":
+                variant = image
+            else:
+                height = max(1, round(image.height * int(width) / image.width))
+                variant = image.resize((int(width), height), Image.LANCZOS)
+            _save(variant, folder / cache_name, job.quality)
+
+
+@dataclass
+class ResponsiveImage:
+    """The variants of an image, to create the srcset attributes of its markup."""
+
+    width: int
+    widths: List[int]
+    webp: bool
+    sizes: str
+
+    def get_srcset(self, src: str, webp: bool = False) -> str:
+        folder, name = posixpath.split(src)
+        candidates = [
+            f"{posixpath.join(folder, get_variant_name(name, width, webp))} {width}w"
+            for width in self.widths
+        ]
+        full = (
+            posixpath.join(folder, get_variant_name(name, None, True)) if webp else src
+        )
+        candidates.append(f"{full} {self.width}w")
+        return ", ".join(candidates)
+
+
+class ImagePipeline:
+    """Creates smaller variants and WebP versions of the raster images of figures.
+
+    Pages ask for the variants of their images while they are rendered.
+    This only reads the header of an image, so that the markup can list
+    the variants. The variants themselves are encoded in a pool of worker
+    processes, in parallel to the rendering, and stored in the cache under
+    the content hash of their image, so that no image is processed twice.
+    When the build is done, `finish` waits for the encoding and copies
+    the variants into the output.
+    """
+
+    def __init__(
+        self, cache_folder: Path, settings: ImageSettings, use_pool: bool = True
+    ) -> None:
+        self.folder = cache_folder / "images"
+        self.settings = settings
+        # worker processes of the page builder only collect the jobs
+        self.use_pool = use_pool
+        self.executor: Optional[ProcessPoolExecutor] = None
+        self.jobs: Dict[Path, VariantJob] = {}
+        self.futures: Dict[str, Future] = {}
+        # source and its size and modification time -> hash, width, height
+        self.headers: Dict[Tuple[Path, int, int], Tuple[str, int, int]] = {}
+        self.lock = Lock()
+
+    @staticmethod
+    def is_available() -> bool:
+        return Image is not None
+
+    def _read_header(self, source: Path) -> Tuple[str, int, int]:
+        stat = source.stat()
+        key = (source, stat.st_size, stat.st_mtime_ns)
+        with self.lock:
+            if key in self.headers:
+                return self.headers[key]
+        with Image.open(source) as image:
+            width, height = image.size
+            if image.getexif().get(0x0112) in ROTATED_ORIENTATIONS:
+                width, height = height, width
+        header = (hash_file(str(source)), width, height)
+        with self.lock:
+            self.headers[key] = header
+        return header
+
+    def get_variants(self, source: Path, target: Path) -> Optional[ResponsiveImage]:
+        """Returns the variants of an image copied to `target`, or None if there are none.
+
+        The variants are created in the background.
+        """
+        if source.suffix.lower() not in RASTER_SUFFIXES:
+            return None
+        try:
+            file_hash, width, _ = self._read_header(source)
+        except (OSError, ValueError, Image.DecompressionBombError):
+            return None
+        widths = [w for w in self.settings.widths if w < width]
+        if len(widths) == 0 and not self.settings.webp:
+            return None
+        self.add_job(
+            VariantJob(
+                source,
+                file_hash,
+                target,
+                widths,
+                self.settings.webp,
+                self.settings.quality,
+            )
+        )
+        return ResponsiveImage(width, widths, self.settings.webp, self.settings.sizes)
+
+    def add_job(self, job: VariantJob) -> None:
+        with self.lock:
+            self.jobs[job.target] = job
+            if not self.use_pool or job.file_hash in self.futures:
+                return
+            folder = self.folder / job.file_hash
+            if all((folder / name).exists() for name, _ in job.get_files()):
+                # no need to start the pool
+                future: Future = Future()
+                future.set_result(None)
+                self.futures[job.file_hash] = future
+                return
+            if self.executor is None:
+                # not forked, since the pool starts while threads render pages
+                self.executor = ProcessPoolExecutor(
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            try:
+                future = self.executor.submit(encode_variants, job, folder)
+            except RuntimeError as error:
+                # the pool broke, finish reports it for each image
+                future = Future()
+                future.set_exception(error)
+            self.futures[job.file_hash] = future
+
+    def take_jobs(self) -> List[VariantJob]:
+        with self.lock:
+            jobs = list(self.jobs.values())
+            self.jobs = {}
+        return jobs
+
+    def finish(self, report: Report) -> int:
+        """Waits for the variants and copies them into the output.
+
+        Returns the number of variants copied.
+        """
+        jobs = self.take_jobs()
+        copied = 0
+        failed = set()
+        for job in jobs:
+            if job.file_hash in failed:
+                continue
+            try:
+                self.futures[job.file_hash].result()
+            except Exception as error:
+                failed.add(job.file_hash)
+                report.warning(
+                    f"Could not create variants of image {job.source}. ({error})",
+                    path=job.source,
+                )
+                continue
+            for cache_name, name in job.get_files():
+                variant = self.folder / job.file_hash / cache_name
+                target = job.target.with_name(name)
+                if (
+                    not target.exists()
+                    or target.stat().st_size != variant.stat().st_size
+                ):
+                    target.parent.mkdir(parents=True, exist_ok=True)
+                    copyfile(variant, target)
+                    copied += 1
+        with self.lock:
+            self.futures = {}
+            if self.executor is not None:
+                self.executor.shutdown()
+                self.executor = None
+        return copied
@@ -0,0 +1,223 @@
+import os
+import time
+from pathlib import Path
+from threading import Condition
+from typing import TYPE_CHECKING, Dict, Optional, Sequence, Set, Tuple
+
+from rich import print
+
+from .config import Config
+from .report import Report, ReportSink
+
+if TYPE_CHECKING:
+    from .build_html import HTMLBuilder
+
+
+def _is_ignored(path: Path) -> bool:
+    # hidden files, and backup and swap files of editors
+    return path.name.startswith(".") or path.name.endswith("~")
+
+
+class SourceWatcher:
+    """Collects the files that changed in a set of watched paths.
+
+    Uses watchdog (inotify and friends) if it is installed, and polls
+    the file system otherwise. Bursts of changes, like when an editor saves
+    several files, are collected until no change happened for `debounce` seconds.
+    """
+
+    def __init__(
+        self,
+        paths: Sequence[Path],
+        ignore: Sequence[Path] = (),
+        debounce: float = 0.3,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.paths = [path.resolve() for path in paths if path.exists()]
+        # only ignore paths that do not contain what we watch, since the
+        # output folder may be the base folder of the input
+        self.ignore = [
+            ignored.resolve()
+            for ignored in ignore
+            if not any(
+                ignored.resolve() == path or ignored.resolve() in path.parents
+                for path in self.paths
+            )
+        ]
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.changes: Set[Path] = set()
+        self.last_change = 0.0
+        self.condition = Condition()
+        self.observer = None
+        try:
+            self._start_observer()
+        except ImportError:
+            self.snapshot = self._take_snapshot()
+
+    def _start_observer(self) -> None:
+        from watchdog.events import FileSystemEventHandler
+        from watchdog.observers import Observer
+
+        watcher = self
+
+        class Handler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                if event.is_directory:
+                    return
+                watcher._add_change(Path(os.fsdecode(event.src_path)))
+                dest_path = getattr(event, "dest_path", None)
+                if dest_path:
+                    watcher._add_change(Path(os.fsdecode(dest_path)))
+
+        self.observer = Observer()
+        for path in self.paths:
+            if path.is_dir():
+                self.observer.schedule(Handler(), str(path), recursive=True)
+            else:
+                # watch the folder of single files, like the template
+                self.observer.schedule(Handler(), str(path.parent), recursive=False)
+        self.observer.start()
+
+    def _is_watched(self, path: Path) -> bool:
+        if _is_ignored(path):
+            return False
+        for ignored in self.ignore:
+            if path == ignored or ignored in path.parents:
+                return False
+        for watched in self.paths:
+            if path == watched or watched in path.parents:
+                return True
+        return False
+
+    def _add_change(self, path: Path) -> None:
+        if not self._is_watched(path):
+            return
+        with self.condition:
+            self.changes.add(path)
+            self.last_change = time.monotonic()
+            self.condition.notify_all()
+
+    def _take_snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        snapshot: Dict[Path, Tuple[int, int]] = {}
+
+        def scan(folder: str):
+            try:
+                with os.scandir(folder) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            scan(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            snapshot[Path(entry.path)] = (
+                                stat.st_mtime_ns,
+                                stat.st_size,
+                            )
+            except OSError:
+                pass
+
+        for path in self.paths:
+            if path.is_dir():
+                scan(str(path))
+            elif path.is_file():
+                stat = path.stat()
+                snapshot[path] = (stat.st_mtime_ns, stat.st_size)
+        return snapshot
+
+    def _poll(self) -> None:
+        snapshot = self._take_snapshot()
+        for path in set(snapshot.keys()) | set(self.snapshot.keys()):
+            if snapshot.get(path) != self.snapshot.get(path):
+                self._add_change(path)
+        self.snapshot = snapshot
+
+    def wait_for_changes(self) -> Set[Path]:
+        """Blocks until files changed and no further change came in for a while."""
+        while True:
+            if self.observer is None:
+                time.sleep(self.poll_interval)
+                self._poll()
+            with self.condition:
+                if self.observer is not None and len(self.changes) == 0:
+                    self.condition.wait(timeout=self.poll_interval)
+                if len(self.changes) == 0:
+                    continue
+                quiet = time.monotonic() - self.last_change
+                if quiet < self.debounce:
+                    self.condition.wait(timeout=self.debounce - quiet)
+                    continue
+                changes = self.changes
+                self.changes = set()
+                return changes
+
+    def stop(self) -> None:
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer.join()
+
+
+def rebuild(
+    builder: "HTMLBuilder",
+    changes: Set[Path],
+    verbose: bool,
+    sinks: Sequence[ReportSink] = (),
+) -> Report:
+    """Rebuilds the pages affected by a set of changed files, with a warm core.
+
+    The sinks of the first build receive the entries of the rebuild as well.
+    """
+    report = Report(verbose=verbose)
+    for sink in sinks:
+        report.add_sink(sink)
+    builder.set_report(report)
+    core = builder.core
+    if core.config.file is not None and core.config.file in changes:
+        core.config = Config(report)
+        # the render cache depends on the replacements in the configuration
+        builder.set_core(core)
+    if any(path.name in ["breadcrumbs.txt", "breadcrumbs.yaml"] for path in changes):
+        builder.load_breadcrumbs()
+    input_path = builder.input_path.resolve()
+    pages: Set[Path] = set()
+    for path in changes:
+        if path.suffix == ".md" and input_path in path.parents:
+            pages.add(path)
+        # pages that include the file via ref:, or use it otherwise
+        pages |= builder.dependency_graph.get_dependents(path)
+    pages = {
+        builder.input_path / page.resolve().relative_to(input_path)
+        for page in pages
+        if page.exists() and input_path in page.resolve().parents
+    }
+    if len(pages) > 0:
+        builder.build(only=pages)
+    if any(path.suffix != ".md" and input_path in path.parents for path in changes):
+        builder.copy_resources()
+    return report
+
+
+def build_continuously(
+    builder: "HTMLBuilder",
+    verbose: bool,
+    watcher: Optional[SourceWatcher] = None,
+    sinks: Sequence[ReportSink] = (),
+) -> None:
+    paths = [builder.input_path]
+    if isinstance(builder.template_file, Path):
+        paths.append(builder.template_file)
+    if builder.core.config.file is not None:
+        paths.append(builder.core.config.file)
+    if watcher is None:
+        watcher = SourceWatcher(paths, ignore=[builder.output_path])
+    print(f"Watching {builder.input_path} for changes. Stop with Ctrl+C.")
+    try:
+        while True:
+            changes = watcher.wait_for_changes()
+            started = time.monotonic()
+            report = rebuild(builder, changes, verbose, sinks)
+            report.print()
+            print(f"Rebuilt in {time.monotonic() - started:.2f}s.")
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
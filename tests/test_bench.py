@@ -0,0 +1,84 @@
+import json
+import sys
+
+sys.path.insert(0, "../")
+
+from pathlib import Path
+
+from supermark import Core, HTMLBuilder, Report
+from supermark.bench import (
+    ExtensionBench,
+    ExtensionResult,
+    compare_results,
+    load_results,
+    print_extension_results,
+    save_extension_results,
+)
+from supermark.synthetic import SiteSpec, generate_site
+
+
+def test_synthetic_site(tmp_path: Path):
+    spec = SiteSpec(pages=30, depth=2, chunks=5, mix={"markdown": 1, "ref": 1})
+    input_path = generate_site(tmp_path / "a", spec)
+    pages = sorted(input_path.glob("**/*.md"))
+    assert len(pages) == 30
+    assert all(len(page.relative_to(input_path).parts) == 3 for page in pages)
+    assert "ref: " in "".join(page.read_text() for page in pages)
+    # the same spec creates the same site
+    other = generate_site(tmp_path / "b", spec)
+    assert [page.read_text() for page in pages] == [
+        page.read_text() for page in sorted(other.glob("**/*.md"))
+    ]
+
+
+def test_compare_results(tmp_path: Path):
+    def write(name: str, medians):
+        path = tmp_path / name
+        benchmarks = [
+            {"name": key, "fullname": key, "stats": {"median": median}}
+            for key, median in medians.items()
+        ]
+        path.write_text(json.dumps({"benchmarks": benchmarks}))
+        return path
+
+    old = write("old.json", {"parse": 1.0, "cast": 2.0, "gone": 1.0})
+    new = write("new.json", {"parse": 1.05, "cast": 3.0, "added": 1.0})
+    comparisons = {c.name: c for c in compare_results(old, new)}
+    assert set(comparisons) == {"parse", "cast"}
+    assert not comparisons["parse"].is_regression(10)
+    assert comparisons["cast"].is_regression(10)
+
+
+def test_extension_bench(tmp_path: Path):
+    report = Report()
+    core = Core(report=report)
+    builder = HTMLBuilder(
+        tmp_path / "examples",
+        tmp_path / "out",
+        tmp_path,
+        tmp_path / "page.html",
+        report,
+    )
+    builder.set_core(core)
+    results = ExtensionBench(core, builder, Report(), min_time=0).run(
+        ["button", "md/tip"]
+    )
+    assert {(r.package, r.extension, r.method) for r in results} == {
+        ("button", "yaml/button", "to_html"),
+        ("boxes", "md/tip", "to_html"),
+        ("boxes", "md/tip", "to_latex"),
+    }
+    assert all(r.rounds >= 1 and r.get_ops() > 0 for r in results)
+
+
+def test_unmeasured_results(tmp_path: Path):
+    results = [
+        ExtensionResult("boxes", "md/tip", "to_html", 2, 10, 0.5, 100, 4),
+        ExtensionResult("boxes", "md/tip", "to_latex", 0, 0, 0.0, 0, 0),
+        ExtensionResult("button", "yaml/button", "to_html", 1, 1, 0.0, 0, 0),
+    ]
+    assert results[0].get_us_per_chunk() == 25000
+    assert results[1].get_ops() is None and results[2].get_ops() is None
+    print_extension_results(results)
+    save_extension_results(results, tmp_path / "results.json")
+    assert list(load_results(tmp_path / "results.json")) == ["boxes:md/tip:to_html"]
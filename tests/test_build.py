@@ -0,0 +1,521 @@
+import json
+import struct
+import sys
+
+sys.path.insert(0, "../")
+
+from pathlib import Path
+
+import pytest
+
+from supermark import Core, HTMLBuilder, Report
+
+PAGES = {
+    "index.md": "# Welcome\n\nSome *text* with a [link](other.html).\n",
+    "other.md": "# Other\n\n---\ntype: lines\nlines: 2\n---\n\n\n:tip: A tip.\n",
+    "sub/page.md": "# Sub Page\n\n---\ntype: button\nurl: ../index.html\ntext: Home\n---\n",
+    "sub/refs.md": "# Refs\n\n---\nref: ../snippets/contact.txt\n---\n",
+    "snippets/contact.txt": "Contact us.\n",
+}
+
+
+def create_site(base_path: Path) -> Path:
+    input_path = base_path / "pages"
+    for name, content in PAGES.items():
+        path = input_path / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+    return input_path
+
+
+def build_site(input_path: Path, output_path: Path, **kwargs) -> HTMLBuilder:
+    report = Report()
+    builder = HTMLBuilder(
+        input_path,
+        output_path,
+        input_path.parent,
+        input_path.parent / "templates/page.html",
+        report,
+        **kwargs,
+    )
+    builder.set_core(Core(report=report))
+    builder.build()
+    return builder
+
+
+def test_process_pool(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    threads = build_site(input_path, tmp_path / "threads")
+    processes = build_site(
+        input_path, tmp_path / "processes", executor="process", jobs=2
+    )
+    for name in filter(lambda name: name.endswith(".md"), PAGES):
+        name = name.replace(".md", ".html")
+        assert (tmp_path / "threads" / name).read_text() == (
+            tmp_path / "processes" / name
+        ).read_text()
+    assert threads.get_chunk_counts() == processes.get_chunk_counts()
+    assert threads.page_titles == processes.page_titles
+    assert {e.get_name() for e in threads.get_extensions_used()} == {
+        e.get_name() for e in processes.get_extensions_used()
+    }
+
+
+def test_render_cache(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    cold = build_site(input_path, tmp_path / "cold")
+    assert cold.render_cache.hits == 0
+    warm = build_site(input_path, tmp_path / "warm")
+    assert warm.render_cache.misses == 0
+    assert (tmp_path / "cold/index.html").read_text() == (
+        tmp_path / "warm/index.html"
+    ).read_text()
+    (input_path / "index.md").write_text("# Welcome\n\nChanged text.\n")
+    edited = build_site(input_path, tmp_path / "edited")
+    assert edited.render_cache.misses == 1
+    assert "Changed text." in (tmp_path / "edited/index.html").read_text()
+
+
+def test_dependencies(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    output_path = tmp_path / "docs"
+    build_site(input_path, output_path, rebuild_all_pages=False)
+    builder = build_site(input_path, output_path, rebuild_all_pages=False)
+    for name in filter(lambda name: name.endswith(".md"), PAGES):
+        source = input_path / name
+        assert (
+            builder._get_rebuild_reason(source, builder.get_target_file(source)) is None
+        )
+    (input_path / "snippets/contact.txt").write_text("Call us.\n")
+    builder.dependency_graph.reset_hashes()
+    rebuild = [
+        name
+        for name in PAGES
+        if name.endswith(".md")
+        and builder._get_rebuild_reason(
+            input_path / name, builder.get_target_file(input_path / name)
+        )
+        is not None
+    ]
+    assert rebuild == ["sub/refs.md"]
+
+
+def test_nested_reference_dependencies(tmp_path: Path):
+    input_path = tmp_path / "pages"
+    input_path.mkdir()
+    (input_path / "page.md").write_text("# Page\n\n---\nref: a.md\n---\n")
+    (input_path / "a.md").write_text("---\nref: b.md\n---\n")
+    (input_path / "b.md").write_text("Contact us.\n")
+    (input_path / "c.md").write_text("Call us.\n")
+    output_path = tmp_path / "docs"
+    builder = build_site(input_path, output_path, rebuild_all_pages=False)
+    page = input_path / "page.md"
+    assert (
+        str((input_path / "a.md").resolve())
+        in builder.dependency_graph.pages[str(page)]
+    )
+    assert builder._get_rebuild_reason(page, builder.get_target_file(page)) is None
+    # a.md contributes no chunks of its own, but changes what page.md includes
+    (input_path / "a.md").write_text("---\nref: c.md\n---\n")
+    builder.dependency_graph.reset_hashes()
+    assert builder._get_rebuild_reason(page, builder.get_target_file(page)) is not None
+
+
+def test_image_dependencies(tmp_path: Path):
+    def png(width: int, height: int) -> bytes:
+        # enough of a PNG file for its size
+        return b"\x89PNG\r\n\x1a\n\x00\x00\x00\x0dIHDR" + struct.pack(
+            ">II", width, height
+        )
+
+    input_path = create_site(tmp_path)
+    (input_path / "cat.png").write_bytes(png(40, 30))
+    (input_path / "figure.md").write_text(
+        "# Figure\n\n---\ntype: figure\nsource: cat.png\n---\n"
+    )
+    (input_path / "card.md").write_text(
+        "# Card\n\n---\ntype: card/person\nname: Cat\nimage: cat.png\n---\n"
+    )
+    output_path = tmp_path / "docs"
+    build_site(input_path, output_path, rebuild_all_pages=False)
+    for name in ["figure.html", "card.html"]:
+        assert 'width="40" height="30"' in (output_path / name).read_text()
+    # only the image changes
+    (input_path / "cat.png").write_bytes(png(80, 60))
+    build_site(input_path, output_path, rebuild_all_pages=False)
+    for name in ["figure.html", "card.html"]:
+        assert 'width="80" height="60"' in (output_path / name).read_text()
+
+
+def test_yaml_parsed_once(tmp_path: Path, monkeypatch):
+    import supermark.chunks
+
+    loads = []
+    original = supermark.chunks.yaml.load
+
+    def load(stream, Loader):
+        loads.append(stream)
+        return original(stream, Loader=Loader)
+
+    monkeypatch.setattr(supermark.chunks.yaml, "load", load)
+    report = Report()
+    core = Core(report=report)
+    lines = [
+        "# Page\n",
+        "\n",
+        "---\ntype: button\nurl: index.html\ntext: Home\n---\n",
+        "\n\n",
+        "---\nref: other.md\n---\n",
+        "\n\n",
+        "---\ntype: [broken\n---\n",
+    ]
+    (tmp_path / "other.md").write_text("# Other\n")
+    chunks = core.parse_lines(
+        "".join(lines).splitlines(keepends=True), tmp_path / "page.md", tmp_path, report
+    )
+    assert len(loads) == 3
+    yaml_errors = [e for e in report.messages if "YAML section" in e.message]
+    assert len(yaml_errors) == 1
+    assert chunks[1].raw_chunk.dictionary["type"] == "button"
+
+
+def test_reference_cache(tmp_path: Path):
+    (tmp_path / "snippet.md").write_text("Contact us.\n")
+    (tmp_path / "a.md").write_text("# A\n\n---\nref: b.md\n---\n")
+    (tmp_path / "b.md").write_text("# B\n\n---\nref: a.md\n---\n")
+    report = Report()
+    core = Core(report=report)
+    page = ["# Page\n", "\n", "---\n", "ref: snippet.md\n", "---\n"]
+    for name in ["page1.md", "page2.md"]:
+        chunks = core.parse_lines(page, tmp_path / name, tmp_path, report)
+        assert chunks[-1].raw_chunk.path == (tmp_path / "snippet.md").resolve()
+    assert list(core.reference_cache.files) == [(tmp_path / "snippet.md").resolve()]
+    (tmp_path / "snippet.md").write_text("Call us.\n")
+    chunks = core.parse_lines(page, tmp_path / "page3.md", tmp_path, report)
+    assert chunks[-1].get_content().strip() == "Call us."
+
+    core.parse_lines(
+        ["---\n", "ref: a.md\n", "---\n"], tmp_path / "page.md", tmp_path, report
+    )
+    cycles = [e.message for e in report.messages if "cycle" in e.message]
+    assert cycles == ["Reference cycle: page.md -> a.md -> b.md -> a.md"]
+
+
+def test_reference_yaml_parsed_once(tmp_path: Path, monkeypatch):
+    import supermark.chunks
+
+    loaded = []
+    load = supermark.chunks.yaml.load
+
+    def counting_load(text, **kwargs):
+        loaded.append(text)
+        return load(text, **kwargs)
+
+    monkeypatch.setattr(supermark.chunks.yaml, "load", counting_load)
+    (tmp_path / "snippet.md").write_text(
+        "---\ntype: button\nurl: index.html\ntext: Home\n---\n\n\n"
+        "---\ntype: [broken\n---\n"
+    )
+    report = Report()
+    core = Core(report=report)
+    page = ["# Page\n", "\n", "---\n", "ref: snippet.md\n", "---\n"]
+    for index in range(5):
+        page_report = Report()
+        chunks = core.parse_lines(
+            page, tmp_path / f"page{index}.md", tmp_path, page_report
+        )
+        assert chunks[1].raw_chunk.dictionary["type"] == "button"
+        # each page still reports the error in the snippet
+        errors = [e for e in page_report.messages if "YAML section" in e.message]
+        assert len(errors) == 1
+    assert len([text for text in loaded if "type: button" in text]) == 1
+    assert len([text for text in loaded if "broken" in text]) == 1
+
+
+def test_page_titles(tmp_path: Path):
+    from supermark.pagemap import PageMapper, scan_title
+
+    page = tmp_path / "page.md"
+    page.write_text(
+        "---\ntitle: x\n---\n# Not in post-yaml\n\n\n"
+        "```\n# Not in code\n```\n\n# Title\n\n# Second\n"
+    )
+    assert scan_title(page) == "Title"
+    (tmp_path / "refs.md").write_text("---\nref: page.md\n---\n")
+    assert scan_title(tmp_path / "refs.md") == "Title"
+
+    input_path = create_site(tmp_path)
+    builder = build_site(input_path, tmp_path / "docs")
+    assert builder.page_titles[input_path / "sub/page.md"] == "Sub Page"
+    page_map = PageMapper(input_path, builder.core, builder.report)
+    assert page_map.titles == builder.page_titles
+    assert page_map.root.title is None
+    assert page_map.scan_page_for_main_anchor(input_path / "index.md") == "Welcome"
+
+
+def test_link_index(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    (input_path / "anchors.md").write_text(
+        '# Anchors\n\n\n<div id="here">Here</div>\n\n\n'
+        "[ok](anchors.html#here) [broken](anchors.html#gone) [local](#here)"
+        " [local broken](#nowhere) [page](sub/page.html) [missing](missing.html)\n"
+    )
+    output_path = tmp_path / "docs"
+    builder = build_site(input_path, output_path, rebuild_all_pages=False)
+    assert builder.link_index.has_anchor("anchors.html", "here")
+    assert not builder.link_index.has_anchor("anchors.html", "gone")
+
+    def check(builder: HTMLBuilder):
+        builder.core.url_checker.check(input_path, None, builder.link_index)
+        return sorted(
+            entry.message
+            for entry in builder.report.messages
+            if entry.path is not None and entry.path.name == "anchors.md"
+        )
+
+    expected = [
+        "Anchor #gone not found in anchors.html.",
+        "Anchor #nowhere not found.",
+        "missing.html not found.",
+    ]
+    assert check(builder) == expected
+    # pages that are not rebuilt keep their anchors from the stored index
+    builder = build_site(input_path, output_path, rebuild_all_pages=False)
+    assert builder.link_index.has_anchor("anchors.html", "here")
+    assert not builder.link_index.has_anchor("anchors.html", "gone")
+    assert builder.link_index.has_page("sub/page.html")
+
+
+def test_relative_links(tmp_path: Path, monkeypatch):
+    # with a relative input folder, as in config.toml
+    monkeypatch.chdir(tmp_path)
+    input_path = create_site(Path("."))
+    (input_path / "a.md").write_text('# A\n\n\n<div id="details">Details</div>\n')
+    (input_path / "sub" / "c.md").write_text(
+        "# C\n\n[up](../a.html) [details](../a.html#details) [gone](../a.html#gone)"
+        " [sibling](page.html) [wrong folder](a.html)\n"
+    )
+    builder = build_site(input_path, Path("docs"))
+    builder.core.url_checker.check(input_path, None, builder.link_index)
+    messages = sorted(
+        entry.message
+        for entry in builder.report.messages
+        if entry.path is not None and entry.path.name == "c.md"
+    )
+    assert messages == ["Anchor #gone not found in a.html.", "a.html not found."]
+
+
+def test_image_index(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    (input_path / "figures").mkdir()
+    (input_path / "figures" / "cat.png").write_bytes(b"cat")
+    (input_path / "sub" / "dog.png").write_bytes(b"dog")
+    (input_path / "figure.md").write_text(
+        "# Figure\n\n---\ntype: figure\nsource: figures/cat.png\n---\n"
+    )
+    output_path = tmp_path / "docs"
+    builder = build_site(input_path, output_path)
+    assert builder.image_index.find_by_name("dog.png") == [input_path / "sub/dog.png"]
+    # unchanged folders are not listed again
+    assert builder.image_index.update() == (0, 4)
+
+    # a renamed image is found by its content, and used without copying it
+    (input_path / "figures" / "cat.png").rename(input_path / "sub" / "kitten.png")
+    builder = build_site(input_path, output_path)
+    assert not (input_path / "figures" / "cat.png").exists()
+    assert 'src="sub/kitten.png"' in (output_path / "figure.html").read_text()
+    assert (output_path / "sub" / "kitten.png").read_bytes() == b"cat"
+    assert builder.image_index.lookup(input_path / "gone" / "dog.png") == (
+        input_path / "sub/dog.png"
+    )
+
+
+def test_moved_figure(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    (input_path / "img").mkdir()
+    (input_path / "img" / "cat.png").write_bytes(b"cat")
+    (input_path / "figure.md").write_text(
+        "# Figure\n\n---\ntype: figure\nsource: img/cat.png\n---\n"
+    )
+    output_path = tmp_path / "docs"
+    build_site(input_path, output_path)
+    (input_path / "img" / "cat.png").rename(input_path / "sub" / "cat.png")
+    builder = build_site(input_path, output_path)
+    html = (output_path / "figure.html").read_text()
+    assert 'src="sub/cat.png"' in html
+    assert not (input_path / "figures").exists()
+    assert not (input_path / "img" / "cat.png").exists()
+    figure_messages = [
+        entry.message
+        for entry in builder.report.messages
+        if entry.message.startswith("Figure file")
+    ]
+    assert len(figure_messages) == 1
+    assert "using matching file" in figure_messages[0]
+
+
+def test_resource_sync(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    (input_path / "files" / "deep").mkdir(parents=True)
+    (input_path / "files" / "deep" / "slides.pdf").write_bytes(b"slides")
+    (input_path / "files" / "code.zip").write_bytes(b"code")
+    output_path = tmp_path / "docs"
+    builder = build_site(input_path, output_path)
+
+    def copy_resources() -> str:
+        builder.copy_resources()
+        return builder.report.messages[-1].message
+
+    assert copy_resources() == "Copied 3 resources, 0 were unchanged and 0 removed."
+    assert (output_path / "files/deep/slides.pdf").read_bytes() == b"slides"
+    assert copy_resources() == "Copied 0 resources, 3 were unchanged and 0 removed."
+
+    (input_path / "files" / "code.zip").write_bytes(b"new code")
+    (input_path / "files" / "deep" / "slides.pdf").unlink()
+    # the manifest survives between builds
+    builder = build_site(input_path, output_path)
+    assert copy_resources() == "Copied 1 resources, 1 were unchanged and 1 removed."
+    assert (output_path / "files/code.zip").read_bytes() == b"new code"
+    assert not (output_path / "files/deep").exists()
+
+    # switching the mode replaces the outputs
+    builder.resource_sync = None
+    builder.core.config.config = {"resources": {"mode": "hardlink"}}
+    assert copy_resources() == "Copied 2 resources, 0 were unchanged and 0 removed."
+    assert (output_path / "files/code.zip").samefile(input_path / "files/code.zip")
+
+
+def test_responsive_images(tmp_path: Path, monkeypatch):
+    pytest.importorskip("PIL")
+    from PIL import Image
+
+    input_path = create_site(tmp_path)
+    Image.new("RGB", (1200, 600), "orange").save(input_path / "wide.png")
+    (input_path / "figures.md").write_text(
+        "# Figures\n\n---\ntype: figure\nsource: wide.png\n---\n"
+    )
+    # off by default
+    build_site(input_path, tmp_path / "plain")
+    assert "srcset" not in (tmp_path / "plain/figures.html").read_text()
+    assert not (tmp_path / "plain/wide-480w.png").exists()
+
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "config.toml").write_text("[images]\nresponsive = true\n")
+    Image.new("RGB", (1200, 600), "orange").save(input_path / "wide.png")
+    Image.new("RGB", (300, 300), "blue").save(input_path / "small.jpg")
+    (input_path / "figures.md").write_text(
+        "# Figures\n\n---\ntype: figure\nsource: wide.png\n---\n\n"
+        "---\ntype: figure\nsource: small.jpg\n---\n"
+    )
+    output_path = tmp_path / "docs"
+    build_site(input_path, output_path)
+    html = (output_path / "figures.html").read_text()
+    assert 'srcset="wide-480w.webp 480w, wide-960w.webp 960w, wide.webp 1200w"' in html
+    assert 'srcset="wide-480w.png 480w, wide-960w.png 960w, wide.png 1200w"' in html
+    assert '<source type="image/webp" srcset="small.webp 300w"' in html
+    assert '<img src="small.jpg" width="300" height="300" loading="lazy"' in html
+    with Image.open(output_path / "wide-480w.png") as image:
+        assert image.size == (480, 240)
+    assert (output_path / "small.webp").exists()
+
+    # the variants are encoded only once
+    cache = tmp_path / ".supermark-cache" / "images"
+    files = {file: file.stat().st_mtime_ns for file in cache.glob("*/*")}
+    assert len(files) == 6
+    build_site(input_path, tmp_path / "processes", executor="process", jobs=2)
+    assert (tmp_path / "processes" / "figures.html").read_text() == html
+    assert (tmp_path / "processes" / "wide-960w.webp").exists()
+    assert {file: file.stat().st_mtime_ns for file in cache.glob("*/*")} == files
+
+
+def test_asset_bundles(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    (tmp_path / "templates").mkdir()
+    (tmp_path / "templates" / "page.html").write_text(
+        '<html><head><link rel="stylesheet" href="{css_bundle}">'
+        '<script src="{js_bundle}"></script></head>'
+        "<body>{content}</body></html>"
+    )
+    output_path = tmp_path / "docs"
+    build_site(input_path, output_path)
+    bundles = sorted(file.name for file in output_path.glob("supermark.*"))
+    assert len(bundles) > 0
+    page = (output_path / "sub" / "page.html").read_text()
+    css = next(name for name in bundles if f'href="../{name}"' in page)
+    assert "/* === button === */" in (output_path / css).read_text()
+    assert "<style" not in page
+    # pages with other extensions get other bundles
+    index = (output_path / "index.html").read_text()
+    other = (output_path / "other.html").read_text()
+    assert index.split("<body>")[0] != other.split("<body>")[0]
+
+
+def test_extension_manifest(tmp_path: Path):
+    core = Core(report=Report())
+    # extensions are imported when a page uses them
+    assert len(core.extension_packages) == 0
+    input_path = create_site(tmp_path)
+    builder = build_site(input_path, tmp_path / "out", executor="process")
+    assert {extension.get_name() for extension in builder.extensions_used} >= {
+        "yaml/lines",
+        "yaml/button",
+        "md/tip",
+    }
+    assert set(builder.core.extension_packages) == {"lines", "button", "boxes"}
+    assert core.get_extension("yaml/figure") is not None
+    assert "figure" in core.extension_packages
+    # the manifest must be created again when extensions change
+    assert core.manifest == core.create_manifest()
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_profile(tmp_path: Path, executor: str):
+    input_path = create_site(tmp_path)
+    builder = build_site(input_path, tmp_path / "out", executor=executor, profile=True)
+    profile = builder.profile.to_dict()
+    assert set(profile["pages"]) == {
+        "index.html",
+        "other.html",
+        "sub/page.html",
+        "sub/refs.html",
+    }
+    assert {"scan", "parse", "cast", "render", "write"} <= set(profile["steps"])
+    assert profile["steps"]["parse"]["calls"] == 4
+    assert profile["extensions"]["yaml/button"]["calls"] == 1
+    assert profile["chunk_types"]["md"]["calls"] >= 4
+    # without --profile, nothing is measured
+    builder = build_site(input_path, tmp_path / "out2", executor=executor)
+    assert builder.profile.to_dict()["pages"] == {}
+
+
+@pytest.mark.parametrize("executor", ["thread", "process"])
+def test_trace(tmp_path: Path, executor: str):
+    input_path = create_site(tmp_path)
+    builder = build_site(input_path, tmp_path / "out", executor=executor, trace=True)
+    builder.profile.save_trace(tmp_path / "trace.json")
+    events = json.loads((tmp_path / "trace.json").read_text())["traceEvents"]
+    spans = [event for event in events if event["ph"] == "X"]
+    [build] = [span for span in spans if span["cat"] == "build"]
+    pages = [span for span in spans if span["cat"] == "page"]
+    assert {page["name"] for page in pages} == {
+        "index.html",
+        "other.html",
+        "sub/page.html",
+        "sub/refs.html",
+    }
+    for page in pages:
+        assert build["ts"] <= page["ts"]
+        assert page["ts"] + page["dur"] <= build["ts"] + build["dur"]
+    # chunks are nested in the span of their page, on the same thread
+    for chunk in [span for span in spans if span["cat"] == "chunk"]:
+        assert any(
+            page["pid"] == chunk["pid"]
+            and page["tid"] == chunk["tid"]
+            and page["ts"] <= chunk["ts"]
+            and chunk["ts"] + chunk["dur"] <= page["ts"] + page["dur"]
+            for page in pages
+        )
+    assert any(event["name"] == "thread_name" for event in events)
+    # without tracing, nothing is recorded
+    builder = build_site(input_path, tmp_path / "out2", executor=executor)
+    assert builder.profile.events == []
@@ -0,0 +1,87 @@
+import sys
+
+sys.path.insert(0, "../")
+
+import os
+import struct
+import zlib
+from pathlib import Path
+
+from supermark.dimensions import DimensionIndex, read_dimensions
+
+
+def png(width: int, height: int) -> bytes:
+    ihdr = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    return (
+        b"\x89PNG\r\n\x1a\n"
+        + struct.pack(">I", len(ihdr))
+        + b"IHDR"
+        + ihdr
+        + struct.pack(">I", zlib.crc32(b"IHDR" + ihdr))
+    )
+
+
+def jpeg(width: int, height: int, orientation: int = 1) -> bytes:
+    app0 = b"JFIF\x00\x01\x01\x00\x00\x01\x00\x01\x00\x00"
+    tiff = b"MM\x00\x2a\x00\x00\x00\x08" + struct.pack(
+        ">HHHIHH", 1, 0x0112, 3, 1, orientation, 0
+    )
+    app1 = b"Exif\x00\x00" + tiff
+    sof = struct.pack(">BHHB", 8, height, width, 3) + b"\x01\x22\x00" * 3
+    return (
+        b"\xff\xd8"
+        + b"\xff\xe0"
+        + struct.pack(">H", len(app0) + 2)
+        + app0
+        + b"\xff\xe1"
+        + struct.pack(">H", len(app1) + 2)
+        + app1
+        + b"\xff\xc2"
+        + struct.pack(">H", len(sof) + 2)
+        + sof
+    )
+
+
+def test_read_dimensions(tmp_path: Path):
+    images = {
+        "a.png": png(640, 480),
+        "b.jpg": jpeg(800, 600),
+        "c.jpeg": jpeg(800, 600, orientation=6),
+        "d.gif": b"GIF89a" + struct.pack("<HH", 32, 16) + b"\x00" * 10,
+        "e.svg": b'<?xml version="1.0"?>\n<!-- logo -->\n<svg xmlns="http://www.w3.org/2000/svg"\n viewBox="0 0 120.5 60">',
+        "f.svg": b'<svg width="100px" height="50" viewBox="0 0 10 5">',
+        "g.svg": b'<svg width="100%" height="100%" viewBox="0,0,30,20">',
+        "h.png": b"not a png",
+        "i.webp": b"RIFF",
+    }
+    for name, content in images.items():
+        (tmp_path / name).write_bytes(content)
+    assert {name: read_dimensions(tmp_path / name) for name in images} == {
+        "a.png": (640, 480),
+        "b.jpg": (800, 600),
+        "c.jpeg": (600, 800),
+        "d.gif": (32, 16),
+        "e.svg": (120, 60),
+        "f.svg": (100, 50),
+        "g.svg": (30, 20),
+        "h.png": None,
+        "i.webp": None,
+    }
+
+
+def test_dimension_index(tmp_path: Path):
+    image = tmp_path / "a.png"
+    image.write_bytes(png(64, 32))
+    index = DimensionIndex(tmp_path / "dimensions.json")
+    assert index.get_attributes(image) == (
+        'width="64" height="32" loading="lazy" decoding="async"'
+    )
+    index.save()
+    index = DimensionIndex(tmp_path / "dimensions.json")
+    assert index.images[str(image)][1:] == (64, 32)
+    image.write_bytes(png(128, 32))
+    os.utime(image, ns=(0, 10**9))
+    assert index.get_dimensions(image) == (128, 32)
+    assert index.get_attributes(tmp_path / "missing.png") == (
+        'loading="lazy" decoding="async"'
+    )
@@ -0,0 +1,56 @@
+import sys
+
+sys.path.insert(0, "../")
+
+import pytest
+
+from supermark.highlight import get_lexer, highlight_html
+from supermark.pandoc import convert_code
+
+
+def test_highlight_html():
+    html = highlight_html("\nimport os\nif x:\n    return '<b>'\n", "python")
+    assert html.startswith(
+        '<div class="sourceCode" id="cb1"><pre class="sourceCode python">'
+        '<code class="sourceCode python">'
+    )
+    assert html.count('<span id="cb1-') == 4
+    assert '<span class="im">import</span> os' in html
+    assert '<span class="cf">return</span>' in html
+    assert '<span class="st">&#39;&lt;b&gt;&#39;</span>' in html
+    assert highlight_html("<x>\n", "") == "<pre><code>&lt;x&gt;</code></pre>"
+
+
+def test_unknown_language():
+    assert get_lexer("no-such-language") is None
+    assert highlight_html("x", "no-such-language") is None
+    assert get_lexer("js") is get_lexer("js")
+
+
+PANDOC_SAMPLES = {
+    "python": (
+        "import os\n\ndef count(path, limit=10):\n    # files below the limit\n"
+        "    total = 0x1F + 1.5\n    for name in os.listdir(path):\n"
+        "        if len(name) < limit and name != 'x':\n"
+        "            total += 1\n    return None\n"
+    ),
+    "javascript": (
+        "let x = 1;\nconst names = ['a', \"b\"];\n// a comment\n"
+        "for (let i = 0; i < names; i++) {\n  if (x === 0x1F) {\n"
+        "    return 1.5;\n  }\n}\n"
+    ),
+    "java": (
+        "public class Counter {\n  private int count = 0;\n  // a comment\n"
+        "  public void add(int x) {\n    if (x > 0x1F && x != 1.5) {\n"
+        "      count += x;\n    }\n    return;\n  }\n}\n"
+    ),
+    "bash": 'for f in a b; do\n  echo "$f"\ndone\nexport Y=$HOME\n# a comment\n',
+}
+
+
+@pytest.mark.parametrize("lang", PANDOC_SAMPLES)
+def test_same_as_pandoc(lang: str):
+    code = PANDOC_SAMPLES[lang]
+    assert highlight_html(code, lang) == (
+        convert_code(f"```{lang}\n{code}```", "html").strip()
+    )
@@ -1,7 +1,39 @@
 import sys
 
 sys.path.insert(0, "../")
-from supermark.icons import load_bootstrap_icons
+import json
+
+from supermark.icons import (
+    INDEX_FILE,
+    get_icon,
+    icons,
+    load_bootstrap_icons,
+    use_sprites,
+)
 
 print("f")
-load_bootstrap_icons()
\ No newline at end of file
+load_bootstrap_icons()
+
+
+def test_icon_index():
+    # the index must be created again when bootstrap-icons.svg changes
+    with open(INDEX_FILE, encoding="utf-8") as file:
+        assert json.load(file) == icons
+    icon = get_icon("arrow-left-short", size="16")
+    assert icon.startswith('<svg width="16" height="16" xmlns=')
+    assert get_icon("arrow-left-short", size="16") is icon
+    assert get_icon("no-such-icon") == ""
+
+
+def test_sprites():
+    icon = get_icon("arrow-left-short", size="16")
+    html = "<p>" + icon * 3 + get_icon("alarm") + "</p>"
+    sprites = use_sprites(html)
+    assert len(sprites) < len(html)
+    assert sprites.count('<symbol id="bi-arrow-left-short"') == 1
+    assert sprites.count('<use href="#bi-arrow-left-short"/>') == 3
+    assert '<symbol id="bi-alarm" viewBox="0 0 16 16">' in sprites
+    assert use_sprites("<p>No icons</p>") == "<p>No icons</p>"
+    # svg elements that are not icons stay as they are
+    changed = icon.replace("<path", '<circle r="1"/><path')
+    assert use_sprites(changed) == changed
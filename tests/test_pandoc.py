@@ -0,0 +1,51 @@
+import sys
+
+sys.path.insert(0, "../")
+
+from supermark.pandoc import (
+    ConversionBroker,
+    convert,
+    convert_all,
+    convert_code,
+    convert_many,
+)
+
+CODE = [
+    "```python\ndef f(x):\n    return x\n```",
+    "```java\nint x = 1;\nint y = 2;\n```",
+    "```\nplain\n```",
+]
+
+
+def test_convert_many():
+    expected = [convert_code(source, "html") for source in CODE]
+    assert convert_many(CODE, "html", "md", ["--highlight-style", "pygments"]) == (
+        expected
+    )
+    cells = ["''bold''", "* item", "[[link]]"]
+    args = ["--from", "mediawiki", "--to", "html"]
+    assert convert_many(cells, "html", "mediawiki", args) == [
+        convert_many([cell], "html", "mediawiki", args)[0] for cell in cells
+    ]
+
+
+def test_broker():
+    broker = ConversionBroker()
+    placeholders = [convert_code(source, "html", broker=broker) for source in CODE]
+    assert all(placeholder.startswith("<!--") for placeholder in placeholders)
+    html = broker.resolve("\n".join(placeholders))
+    assert html == "\n".join(convert_code(source, "html") for source in CODE)
+    # resolving again uses the results of the first round
+    assert broker.resolve(placeholders[1]) == convert_code(CODE[1], "html")
+
+
+def test_convert_all():
+    cells = ["''bold''", "", "* item"]
+    assert convert_all(cells, "html", None, source_format="mediawiki") == [
+        convert(cell, "html", None, source_format="mediawiki") for cell in cells
+    ]
+    # markdown is converted in-process
+    assert convert_all(["*a*", "b"], "html", None) == [
+        "<p><em>a</em></p>\n",
+        "<p>b</p>\n",
+    ]
@@ -0,0 +1,43 @@
+import sys
+
+sys.path.insert(0, "../")
+
+import json
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from supermark.report import JSONLinesSink, Report, ReportEntry
+
+
+def test_concurrent_entries():
+    report = Report()
+
+    def add(index: int):
+        report.info("Translated", path=Path(f"page-{index}.md"))
+        if index % 10 == 0:
+            report.warning("Something is off.", path=Path(f"page-{index}.md"), line=2)
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(add, range(1000)))
+    assert len(report.messages) == 1100
+    assert report.warnings == 100
+    assert list(report.index[Report.INFO]) == ["Translated"]
+    assert len(report.get_entries(Report.WARNING)) == 100
+    # one branch per message, with the locations below it
+    tree = report._get_tree(verbose=True)
+    assert len(tree.children) == 2
+    assert len(tree.children[1].children) == 1000
+
+
+def test_json_lines_sink(tmp_path: Path):
+    report = Report()
+    report.add_sink(JSONLinesSink(tmp_path / "log.jsonl", level=Report.WARNING))
+    report.info("Not written.")
+    report.warning("A warning.", path=Path("page.md"), line=3)
+    report.add_entry(ReportEntry("An error.", Report.ERROR))
+    report.close_sinks()
+    lines = (tmp_path / "log.jsonl").read_text().splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"level": "warning", "message": "A warning.", "path": "page.md", "line": 3},
+        {"level": "error", "message": "An error.", "path": None, "line": None},
+    ]
@@ -0,0 +1,115 @@
+import sys
+
+sys.path.insert(0, "../")
+
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List
+
+import pytest
+
+from supermark.urlcheck import URLCheckEngine, URLCheckSettings, URLResultStore
+
+
+class Handler(BaseHTTPRequestHandler):
+    requests: List[str] = []
+    active = 0
+    max_active = 0
+    lock = threading.Lock()
+    failures: Dict[str, int] = {}
+
+    def _respond(self, body: bool) -> None:
+        with Handler.lock:
+            Handler.requests.append(f"{self.command} {self.path}")
+            Handler.active += 1
+            Handler.max_active = max(Handler.max_active, Handler.active)
+        try:
+            if self.path.startswith("/slow"):
+                time.sleep(0.1)
+                status = 200
+            elif self.path == "/missing":
+                status = 404
+            elif self.path == "/nohead" and self.command == "HEAD":
+                status = 405
+            elif self.path == "/flaky" and Handler.failures.get(self.path, 0) < 2:
+                Handler.failures[self.path] = Handler.failures.get(self.path, 0) + 1
+                status = 503
+            else:
+                status = 200
+            self.send_response(status)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            if body:
+                self.wfile.write(b"ok")
+        finally:
+            with Handler.lock:
+                Handler.active -= 1
+
+    def do_HEAD(self):
+        self._respond(body=False)
+
+    def do_GET(self):
+        self._respond(body=True)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    Handler.requests = []
+    Handler.active = 0
+    Handler.max_active = 0
+    Handler.failures = {}
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_check_urls(server: str):
+    engine = URLCheckEngine(URLCheckSettings(backoff=0.01, interval=0.0))
+    results = engine.check_all(
+        [f"{server}/ok", f"{server}/missing", f"{server}/nohead", f"{server}/flaky"]
+    )
+    assert results[f"{server}/ok"].is_ok()
+    assert results[f"{server}/missing"].status_code == 404
+    assert results[f"{server}/nohead"].is_ok()
+    assert results[f"{server}/flaky"].is_ok()
+    assert "HEAD /ok" in Handler.requests
+    assert "GET /ok" not in Handler.requests
+    assert "GET /nohead" in Handler.requests
+    assert Handler.requests.count("HEAD /flaky") == 3
+
+
+def test_limits(server: str):
+    settings = URLCheckSettings(per_host=2, interval=0.0, timeout=5.0)
+    urls = [f"{server}/slow{i}" for i in range(8)]
+    results = URLCheckEngine(settings).check_all(urls)
+    assert all(result.is_ok() for result in results.values())
+    assert Handler.max_active <= 2
+
+    results = URLCheckEngine(URLCheckSettings(timeout=0.01, retries=0)).check_all(
+        [f"{server}/slow"]
+    )
+    assert results[f"{server}/slow"].error is not None
+
+
+def test_result_store(server: str, tmp_path: Path):
+    settings = URLCheckSettings(retries=0)
+    urls = [f"{server}/ok", f"{server}/missing"]
+    store = URLResultStore(tmp_path / "urls.json", settings.ttl)
+    URLCheckEngine(settings, store).check_all(urls)
+    Handler.requests = []
+    store = URLResultStore(tmp_path / "urls.json", settings.ttl)
+    results = URLCheckEngine(settings, store).check_all(urls)
+    assert results[f"{server}/ok"].cached
+    assert not results[f"{server}/missing"].is_ok()
+    assert Handler.requests == ["HEAD /missing", "GET /missing"]
+    # expired results are checked again
+    store = URLResultStore(tmp_path / "urls.json", ttl=0.0)
+    assert not URLCheckEngine(settings, store).check_all(urls)[f"{server}/ok"].cached
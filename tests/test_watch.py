@@ -0,0 +1,50 @@
+import sys
+
+sys.path.insert(0, "../")
+
+from pathlib import Path
+
+from supermark.report import JSONLinesSink
+from supermark.watch import SourceWatcher, rebuild
+
+from test_build import build_site, create_site
+
+
+def test_rebuild_dependents(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    output_path = tmp_path / "docs"
+    builder = build_site(input_path, output_path, rebuild_all_pages=False)
+    index = output_path / "index.html"
+    refs = output_path / "sub/refs.html"
+    index_mtime = index.stat().st_mtime_ns
+
+    snippet = input_path / "snippets/contact.txt"
+    snippet.write_text("Call us.\n")
+    rebuild(builder, {snippet.resolve()}, verbose=False)
+    assert "Call us." in refs.read_text()
+    assert index.stat().st_mtime_ns == index_mtime
+
+
+def test_rebuild_sinks(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    builder = build_site(input_path, tmp_path / "docs", rebuild_all_pages=False)
+    sink = JSONLinesSink(tmp_path / "supermark.jsonl")
+    page = input_path / "index.md"
+    page.write_text("# Welcome\n\n---\ntype: [broken\n---\n")
+    try:
+        rebuild(builder, {page.resolve()}, verbose=False, sinks=[sink])
+    finally:
+        sink.close()
+    assert "YAML section" in (tmp_path / "supermark.jsonl").read_text()
+
+
+def test_watcher(tmp_path: Path):
+    input_path = create_site(tmp_path)
+    watcher = SourceWatcher([input_path], debounce=0.1, poll_interval=0.1)
+    try:
+        (input_path / "index.md").write_text("# Changed\n")
+        (input_path / ".index.md.swp").write_text("ignored")
+        changes = watcher.wait_for_changes()
+    finally:
+        watcher.stop()
+    assert changes == {(input_path / "index.md").resolve()}